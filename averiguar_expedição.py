@@ -1,10 +1,390 @@
 import pandas as pd
 import numpy as np
 import os
+import sys
+import io
+import argparse
+import glob
+import codecs
+import json
+import re
+import unicodedata
+import sqlite3
+import hashlib
+import time
+import threading
+import contextlib
+import multiprocessing
+import tempfile
+import cProfile
+import pstats
+import tracemalloc
 from pathlib import Path
 from datetime import datetime
-from openpyxl import Workbook
-from openpyxl.styles import PatternFill, Font
+from copy import copy
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from xml.etree.ElementTree import iterparse
+from pandas.io.parsers import TextParser
+from openpyxl import Workbook, load_workbook, __version__ as VERSAO_OPENPYXL
+from openpyxl.utils.datetime import from_excel, from_ISO8601
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import PatternFill, Font, Border, Side, Alignment
+from openpyxl.utils import get_column_letter
+
+# Com pyarrow as operações de texto das versões colunares rodam em C++;
+# sem ele o pandas cai para o laço em Python, mas o resultado é o mesmo
+try:
+    import pyarrow
+    TIPO_TEXTO_COLUNAR = 'string[pyarrow]'
+except ImportError:
+    pyarrow = None
+    TIPO_TEXTO_COLUNAR = object
+
+# psutil mede a memória do processo em qualquer sistema; sem ele o pico vem
+# do resource (só Unix)
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# O XlsxWriter grava o relatório bem mais rápido; sem ele fica o openpyxl
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+
+# Verbosidade das mensagens: erros e avisos sempre aparecem, o progresso
+# só no nível normal e os detalhes (colunas, amostras, blocos) no detalhado
+NIVEL_SILENCIOSO = 0
+NIVEL_NORMAL = 1
+NIVEL_DETALHADO = 2
+NIVEL_LOG = NIVEL_NORMAL
+
+def definir_verbosidade(nivel):
+    """
+    Define o nível das mensagens mostradas
+    """
+    global NIVEL_LOG
+    NIVEL_LOG = nivel
+
+@contextlib.contextmanager
+def verbosidade(nivel):
+    """
+    Troca o nível das mensagens enquanto o bloco executa
+    """
+    anterior = NIVEL_LOG
+    definir_verbosidade(nivel)
+    try:
+        yield
+    finally:
+        definir_verbosidade(anterior)
+
+# Mensagens de threads diferentes não se misturam na mesma linha
+_TRAVA_SAIDA = threading.Lock()
+
+def mostrar(mensagem, nivel=NIVEL_NORMAL):
+    """
+    Mostra a mensagem se o nível dela estiver ativo
+    """
+    if NIVEL_LOG >= nivel:
+        with _TRAVA_SAIDA:
+            print(mensagem)
+
+def _megabytes(quantidade_bytes):
+    """
+    Converte bytes em MB com uma casa (None se a medida não existe)
+    """
+    return None if quantidade_bytes is None else round(quantidade_bytes / 1024 ** 2, 1)
+
+def _texto_memoria(megabytes):
+    """
+    Texto do pico de memória (em MB) para as mensagens de progresso
+    """
+    return 'pico de memória indisponível' if megabytes is None else f'pico {megabytes:,.1f} MB'
+
+class MonitorMemoria:
+    """
+    Acompanha o pico de memória (RSS) do processo enquanto está ativo.
+    Com psutil amostra a memória em uma thread; sem ele usa o pico do
+    processo informado pelo sistema (só em Unix), que não volta a baixar
+    """
+    def __init__(self, intervalo=0.01):
+        self.intervalo = intervalo
+        self.pico = None
+        self._parar = threading.Event()
+        self._thread = None
+    
+    def __enter__(self):
+        if psutil is not None:
+            processo = psutil.Process()
+            self.pico = processo.memory_info().rss
+            self._thread = threading.Thread(target=self._amostrar, args=(processo,), daemon=True)
+            self._thread.start()
+        return self
+    
+    def _amostrar(self, processo):
+        while not self._parar.wait(self.intervalo):
+            self.pico = max(self.pico, processo.memory_info().rss)
+    
+    def __exit__(self, *exc):
+        if self._thread is not None:
+            self._parar.set()
+            self._thread.join()
+            self.pico = max(self.pico, psutil.Process().memory_info().rss)
+        elif resource is not None:
+            # ru_maxrss vem em KB no Linux e em bytes no macOS
+            pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            self.pico = pico if sys.platform == 'darwin' else pico * 1024
+        return False
+
+class Instrumentacao:
+    """
+    Registra tempo de relógio, tempo de CPU, linhas de entrada e saída e pico
+    de memória de cada etapa de uma execução. Opcionalmente captura um
+    cProfile ou um tracemalloc da execução inteira
+    """
+    def __init__(self, perfil=None):
+        self.perfil = perfil
+        self.etapas = []
+        self.captura = None
+        self.economia_memoria = {}
+        self._local = threading.local()
+        self._profiler = None
+        self._inicio = None
+        self._inicio_cpu = None
+        self.segundos = None
+        self.cpu_segundos = None
+    
+    def iniciar(self):
+        self._inicio = time.perf_counter()
+        self._inicio_cpu = time.process_time()
+        if self.perfil == 'cprofile':
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        elif self.perfil == 'tracemalloc':
+            tracemalloc.start(10)
+    
+    def finalizar(self):
+        if self.perfil == 'cprofile':
+            self._profiler.disable()
+            saida = io.StringIO()
+            pstats.Stats(self._profiler, stream=saida).sort_stats('cumulative').print_stats(30)
+            self.captura = {'tipo': 'cprofile', 'funcoes': saida.getvalue().splitlines()}
+        elif self.perfil == 'tracemalloc':
+            atual, pico = tracemalloc.get_traced_memory()
+            maiores = tracemalloc.take_snapshot().statistics('lineno')[:20]
+            tracemalloc.stop()
+            self.captura = {
+                'tipo': 'tracemalloc',
+                'pico_alocado_mb': _megabytes(pico),
+                'maiores_alocacoes': [str(estatistica) for estatistica in maiores]
+            }
+        self.segundos = time.perf_counter() - self._inicio
+        self.cpu_segundos = time.process_time() - self._inicio_cpu
+    
+    @property
+    def _pilha(self):
+        # Cada thread tem a sua pilha: etapas que rodam ao mesmo tempo em
+        # threads diferentes não entram uma no nome da outra
+        if not hasattr(self._local, 'pilha'):
+            self._local.pilha = []
+        return self._local.pilha
+    
+    @contextlib.contextmanager
+    def etapa(self, nome, linhas_entrada=None):
+        """
+        Mede o bloco como uma etapa; etapas dentro de etapas recebem o nome
+        composto (ler_csv/detectar_perfil). O dicionário devolvido aceita
+        linhas_entrada e linhas_saida
+        """
+        medida = {
+            'etapa': '/'.join(self._pilha + [nome]),
+            'inicio_segundos': round(time.perf_counter() - self._inicio, 4) if self._inicio else 0.0,
+            'linhas_entrada': linhas_entrada,
+            'linhas_saida': None
+        }
+        self._pilha.append(nome)
+        inicio = time.perf_counter()
+        inicio_cpu = time.process_time()
+        try:
+            with MonitorMemoria() as monitor:
+                yield medida
+        finally:
+            self._pilha.pop()
+            medida['segundos'] = round(time.perf_counter() - inicio, 4)
+            medida['cpu_segundos'] = round(time.process_time() - inicio_cpu, 4)
+            medida['pico_memoria_mb'] = _megabytes(monitor.pico)
+            self.etapas.append(medida)
+            mostrar(f"   ⏱️ {medida['etapa']}: {medida['segundos']:.3f}s ({_texto_memoria(medida['pico_memoria_mb'])})", NIVEL_DETALHADO)
+    
+    def resumo(self, **informacoes):
+        """
+        Dicionário da execução pronto para gravar em JSON
+        """
+        return {
+            'data': datetime.now().isoformat(timespec='seconds'),
+            **informacoes,
+            'segundos': round(self.segundos, 4) if self.segundos is not None else None,
+            'cpu_segundos': round(self.cpu_segundos, 4) if self.cpu_segundos is not None else None,
+            'etapas': sorted(self.etapas, key=lambda medida: medida['inicio_segundos']),
+            'economia_memoria': self.economia_memoria,
+            'captura': self.captura
+        }
+    
+    def gravar(self, caminho, **informacoes):
+        """
+        Grava o resumo em JSON (e o cProfile completo em .prof ao lado)
+        """
+        with open(caminho, 'w', encoding='utf-8') as arquivo:
+            json.dump(self.resumo(**informacoes), arquivo, ensure_ascii=False, indent=2, default=str)
+        if self._profiler is not None:
+            self._profiler.dump_stats(os.path.splitext(caminho)[0] + '.prof')
+
+# Instrumentação da execução em andamento (None quando desligada)
+_INSTRUMENTACAO = None
+
+@contextlib.contextmanager
+def medir_etapa(nome, linhas_entrada=None):
+    """
+    Mede a etapa na instrumentação ativa; sem instrumentação não faz nada
+    """
+    if _INSTRUMENTACAO is None:
+        yield {}
+        return
+    with _INSTRUMENTACAO.etapa(nome, linhas_entrada) as medida:
+        yield medida
+
+# Faixas fixas do histograma do diagnóstico; por serem fixas os blocos do
+# CSV podem ser somados um a um sem guardar os valores
+LIMITES_HISTOGRAMA = [0.0, 1.0, 10.0, 100.0, 1e3, 1e4, 1e5, 1e6, 1e7]
+FAIXAS_HISTOGRAMA = (
+    ['< 0', 'zero'] + [f'({inferior:g}, {superior:g}]' for inferior, superior in zip(LIMITES_HISTOGRAMA, LIMITES_HISTOGRAMA[1:])]
+    + [f'> {LIMITES_HISTOGRAMA[-1]:g}']
+)
+
+class Diagnostico:
+    """
+    Coleta, com memória limitada, o diagnóstico das conversões numéricas:
+    distribuição dos valores (histograma em faixas fixas), células que não
+    viraram número, valores reescalados pela heurística de reescala e
+    amostras das tabelas intermediárias. Só guarda contagens e as primeiras
+    limite_amostra ocorrências de cada caso
+    """
+    def __init__(self, limite_amostra=20):
+        self.limite_amostra = limite_amostra
+        self.colunas = {}
+        self.amostras = {}
+    
+    def registrar_limpeza(self, nome, brutos, limpos, funcao_escalar, limite_reescala):
+        """
+        Acumula o diagnóstico da conversão de uma coluna (ou de um bloco dela)
+        """
+        coluna = self.colunas.setdefault(nome, {
+            'celulas': 0, 'vazias': 0, 'nao_convertidas': 0, 'reescaladas': 0,
+            'negativas': 0, 'zeros': 0, 'soma': 0.0, 'minimo': None, 'maximo': None,
+            'histograma': np.zeros(len(FAIXAS_HISTOGRAMA), dtype=np.int64),
+            'exemplos_nao_convertidas': [], 'exemplos_reescaladas': []
+        })
+        limpos = np.asarray(limpos, dtype=np.float64)
+        texto = brutos.astype(TIPO_TEXTO_COLUNAR).str.strip()
+        vazia = (brutos.isna() | (texto == '')).to_numpy(dtype=bool, na_value=True)
+        
+        # Célula preenchida que virou 0 sem ser um zero escrito (ex.: "abc", "1.2.3")
+        tem_digito = texto.str.contains('[0-9]', regex=True).to_numpy(dtype=bool, na_value=False)
+        digito_nao_zero = texto.str.contains('[1-9]', regex=True).to_numpy(dtype=bool, na_value=False)
+        nao_convertida = ~vazia & (limpos == 0) & (digito_nao_zero | ~tem_digito)
+        
+        # A mesma limpeza sem a reescala mostra quais valores a heurística alterou
+        sem_reescala = _limpar_valores_vetorizado(brutos, funcao_escalar, np.inf)
+        reescalada = ~vazia & (np.abs(sem_reescala) > limite_reescala) & (sem_reescala != limpos)
+        
+        preenchidos = limpos[~vazia & ~nao_convertida]
+        coluna['celulas'] += len(limpos)
+        coluna['vazias'] += int(vazia.sum())
+        coluna['nao_convertidas'] += int(nao_convertida.sum())
+        coluna['reescaladas'] += int(reescalada.sum())
+        coluna['negativas'] += int((preenchidos < 0).sum())
+        coluna['zeros'] += int((preenchidos == 0).sum())
+        coluna['soma'] += float(preenchidos.sum())
+        if len(preenchidos):
+            minimo, maximo = float(preenchidos.min()), float(preenchidos.max())
+            coluna['minimo'] = minimo if coluna['minimo'] is None else min(coluna['minimo'], minimo)
+            coluna['maximo'] = maximo if coluna['maximo'] is None else max(coluna['maximo'], maximo)
+        
+        faixa = np.where(preenchidos < 0, 0, np.where(preenchidos == 0, 1, 1 + np.searchsorted(LIMITES_HISTOGRAMA, preenchidos, side='left')))
+        coluna['histograma'] += np.bincount(faixa, minlength=len(FAIXAS_HISTOGRAMA))
+        
+        brutos_objeto = brutos.to_numpy(dtype=object)
+        for chave, marcadas, valores in (
+            ('exemplos_nao_convertidas', nao_convertida, None),
+            ('exemplos_reescaladas', reescalada, sem_reescala)
+        ):
+            faltam = self.limite_amostra - len(coluna[chave])
+            for posicao in np.flatnonzero(marcadas)[:max(faltam, 0)]:
+                exemplo = {'VALOR_ORIGINAL': str(brutos_objeto[posicao]), 'VALOR_LIMPO': float(limpos[posicao])}
+                if valores is not None:
+                    exemplo['SEM_REESCALA'] = float(valores[posicao])
+                coluna[chave].append(exemplo)
+    
+    def registrar_amostra(self, nome, df, quantidade=20, semente=0):
+        """
+        Guarda uma amostra aleatória (reproduzível) de até quantidade linhas
+        """
+        self.amostras[nome] = df.sample(min(quantidade, len(df)), random_state=semente).sort_index()
+    
+    def tabelas(self):
+        """
+        Monta as tabelas do diagnóstico, uma por aba
+        """
+        distribuicao = pd.DataFrame([
+            {
+                'COLUNA': nome,
+                'CELULAS': coluna['celulas'],
+                'VAZIAS': coluna['vazias'],
+                'NAO_CONVERTIDAS': coluna['nao_convertidas'],
+                'REESCALADAS': coluna['reescaladas'],
+                'NEGATIVAS': coluna['negativas'],
+                'ZEROS': coluna['zeros'],
+                'MINIMO': coluna['minimo'],
+                'MAXIMO': coluna['maximo'],
+                'MEDIA': coluna['soma'] / max(coluna['celulas'] - coluna['vazias'] - coluna['nao_convertidas'], 1)
+            }
+            for nome, coluna in self.colunas.items()
+        ])
+        histograma = pd.DataFrame(
+            {nome: coluna['histograma'] for nome, coluna in self.colunas.items()},
+            index=pd.Index(FAIXAS_HISTOGRAMA, name='FAIXA')
+        ).reset_index()
+        
+        def exemplos(chave):
+            linhas = [{'COLUNA': nome, **exemplo} for nome, coluna in self.colunas.items() for exemplo in coluna[chave]]
+            return pd.DataFrame(linhas, columns=['COLUNA', 'VALOR_ORIGINAL', 'VALOR_LIMPO'] + (['SEM_REESCALA'] if chave == 'exemplos_reescaladas' else []))
+        
+        tabelas = {
+            'Distribuição': distribuicao,
+            'Histograma': histograma,
+            'Não convertidos': exemplos('exemplos_nao_convertidas'),
+            'Reescalados': exemplos('exemplos_reescaladas')
+        }
+        for nome, amostra in self.amostras.items():
+            tabelas[f'Amostra {nome}'[:31]] = amostra
+        return tabelas
+    
+    def gravar(self, caminho):
+        """
+        Grava o diagnóstico em uma planilha própria, separada do relatório
+        """
+        with pd.ExcelWriter(caminho) as escritor:
+            for nome, tabela in self.tabelas().items():
+                tabela.to_excel(escritor, sheet_name=nome, index=False)
+
+# Diagnóstico da execução em andamento (None quando desligado)
+_DIAGNOSTICO = None
 
 def limpar_valor_monetario(valor):
     """
@@ -113,6 +493,82 @@ def limpar_valor_numerico(valor):
     except:
         return 0.0
 
+# Formato "bem comportado" que cobre quase todas as células reais: sinal opcional,
+# "R$" opcional, espaços e um corpo só com dígitos, pontos e vírgulas.
+# Nesse formato limpar_valor_monetario e limpar_valor_numerico fazem exatamente
+# o mesmo tratamento, então dá para resolver a coluna inteira de uma vez.
+PADRAO_NUMERO_BRASILEIRO = r'^ *(-?) *(?:R\$)? *([0-9.,]+) *$'
+PADRAO_FLOAT_VALIDO = r'^(?:[0-9]+\.?[0-9]*|\.[0-9]+)$'
+
+def _limpar_valores_vetorizado(valores, funcao_escalar, limite_reescala):
+    """
+    Núcleo colunar das funções de limpeza: aplica a mesma regra das funções
+    escalares em toda a coluna e devolve para a função escalar só as células
+    fora do formato comum ou que caem na heurística de reescala
+    """
+    eh_serie = isinstance(valores, pd.Series)
+    objetos = np.asarray(valores.to_numpy(dtype=object) if eh_serie else valores, dtype=object).ravel()
+    resultado = np.zeros(len(objetos), dtype=np.float64)
+    
+    posicoes = np.flatnonzero(~pd.isna(objetos))
+    texto = pd.Series(objetos[posicoes], dtype=object).astype(TIPO_TEXTO_COLUNAR)
+    casou = texto.str.fullmatch(PADRAO_NUMERO_BRASILEIRO).to_numpy(dtype=bool, na_value=False)
+    
+    # Dentro do padrão só sobram espaços, sinal e "R$" além do corpo numérico
+    compacto = texto[casou].str.replace(' ', '', regex=False)
+    negativo = compacto.str.startswith('-').to_numpy(dtype=bool)
+    corpo = compacto.str.replace('-', '', regex=False).str.replace('R$', '', regex=False)
+    
+    # Mesma regra de vírgulas das funções escalares: a última vírgula é o decimal;
+    # com uma vírgula os pontos de milhar antes dela somem (os depois ficam e
+    # invalidam o número), com várias só as vírgulas somem
+    qtd_virgulas = corpo.str.count(',').to_numpy()
+    valor_limpo = corpo.copy()
+    uma_virgula = qtd_virgulas == 1
+    if uma_virgula.any():
+        com_virgula = corpo[uma_virgula]
+        parte_inteira = com_virgula.str.replace(r',.*$', '', regex=True).str.replace('.', '', regex=False)
+        valor_limpo[uma_virgula] = parte_inteira + '.' + com_virgula.str.replace(r'^[^,]*,', '', regex=True)
+    varias_virgulas = qtd_virgulas > 1
+    if varias_virgulas.any():
+        multiplas = corpo[varias_virgulas]
+        parte_inteira = multiplas.str.replace(r',[^,]*$', '', regex=True).str.replace(',', '', regex=False)
+        valor_limpo[varias_virgulas] = parte_inteira + '.' + multiplas.str.replace(r'^.*,', '', regex=True)
+    
+    # O texto só tem dígitos e pontos aqui; o que não for um float válido é
+    # exatamente o que float() rejeitaria, e a função escalar devolveria 0.0
+    valido = valor_limpo.str.fullmatch(PADRAO_FLOAT_VALIDO).to_numpy(dtype=bool, na_value=False)
+    numeros = np.zeros(len(valor_limpo), dtype=np.float64)
+    numeros[valido] = valor_limpo[valido].to_numpy(dtype=object).astype(np.float64)
+    
+    reescalar = numeros > limite_reescala
+    numeros = np.where(negativo & valido, -numeros, numeros)
+    
+    posicoes_casadas = posicoes[casou]
+    resultado[posicoes_casadas] = numeros
+    
+    # Fora do formato comum ou na heurística de reescala (que olha o texto original)
+    # quem decide é a função escalar, garantindo resultado idêntico
+    posicoes_escalares = np.concatenate([posicoes[~casou], posicoes_casadas[reescalar]])
+    for posicao in posicoes_escalares:
+        resultado[posicao] = funcao_escalar(objetos[posicao])
+    
+    if eh_serie:
+        return pd.Series(resultado, index=valores.index, name=valores.name)
+    return resultado.reshape(np.shape(valores))
+
+def limpar_serie_monetaria(valores):
+    """
+    Versão colunar de limpar_valor_monetario para Series e arrays NumPy
+    """
+    return _limpar_valores_vetorizado(valores, limpar_valor_monetario, 1000000)
+
+def limpar_serie_numerica(valores):
+    """
+    Versão colunar de limpar_valor_numerico para Series e arrays NumPy
+    """
+    return _limpar_valores_vetorizado(valores, limpar_valor_numerico, 100000)
+
 def comparar_valores_com_tolerancia(valor1, valor2, tolerancia=0.014):
     """
     Compara dois valores com tolerância de 0,014 para diferenças de ponto flutuante
@@ -124,21 +580,301 @@ def comparar_valores_com_tolerancia(valor1, valor2, tolerancia=0.014):
     except:
         return False
 
-def detectar_separador_csv(caminho):
+TAMANHO_AMOSTRA_CSV = 64 * 1024
+TAMANHO_BLOCO_BYTES_CSV = 1024 * 1024
+SEPARADORES_CSV = [';', ',', '\t', '|']
+
+# Esquema padrão do fechamento: para cada coluna usada na conferência, os nomes
+# com que ela aparece nas exportações, do preferido para o menos preferido
+MAPEAMENTO_COLUNAS_CSV = {
+    'NOTA FISCAL': ['NF-E', 'NOTA FISCAL', 'NOTAFISCAL', 'NOTA_FISCAL', 'NF', 'NOTA'],
+    'PESO': ['QTDE REAL', 'QTDE_REAL', 'QUANTIDADE REAL', 'PESO', 'PESO_KG', 'PESO KG', 'PESO_TOTAL', 'QUANTIDADE', 'QTDE'],
+    'TOTAL': ['FAT BRUTO', 'FAT_BRUTO', 'TOTAL', 'TOTAL_NF', 'VALOR_TOTAL', 'VALOR TOTAL', 'VALOR'],
+    'DATA': ['DATA', 'DATE', 'DT', 'DATA_NF', 'DATA EMISSÃO', 'EMISSÃO'],
+    'HISTÓRICO': ['HISTÓRICO', 'HISTORICO', 'HIST', 'HISTORICO_LANCTO']
+}
+COLUNAS_OBRIGATORIAS_CSV = ['NOTA FISCAL', 'PESO', 'TOTAL']
+
+# Layouts de outros ERPs entram como arquivos JSON nesta pasta, no formato
+# {"nome": "erp", "colunas": {"NOTA FISCAL": ["NUM NF", ...], "PESO": [...], ...}}
+DIRETORIO_ESQUEMAS_CSV = Path(os.environ.get('AVERIGUAR_ESQUEMAS_CSV') or Path(__file__).resolve().parent / 'esquemas_csv')
+MAX_MAPEAMENTOS_CSV = 256
+
+def detectar_separador_linhas(linhas):
     """
-    Detecta o separador do arquivo CSV
+    Escolhe o separador que aparece no cabeçalho e se repete com a mesma
+    contagem no maior número de linhas da amostra
     """
-    try:
-        with open(caminho, 'r', encoding='utf-8') as f:
-            primeira_linha = f.readline()
-        if ';' in primeira_linha:
-            return ';'
-        elif ',' in primeira_linha:
-            return ','
+    melhor_separador = ';'
+    melhor_consistencia = -1.0
+    
+    for separador in SEPARADORES_CSV:
+        qtd_cabecalho = linhas[0].count(separador) if linhas else 0
+        if qtd_cabecalho == 0:
+            continue
+        
+        linhas_iguais = sum(1 for linha in linhas if linha.count(separador) == qtd_cabecalho)
+        consistencia = linhas_iguais / len(linhas)
+        if consistencia > melhor_consistencia:
+            melhor_separador = separador
+            melhor_consistencia = consistencia
+    
+    return melhor_separador
+
+def normalizar_nome_coluna(nome):
+    """
+    Nome de coluna em maiúsculas, sem acentos e sem espaços nas pontas
+    """
+    texto = unicodedata.normalize('NFKD', str(nome).strip().upper())
+    return ''.join(caractere for caractere in texto if not unicodedata.combining(caractere))
+
+def compilar_esquema_csv(nome, colunas):
+    """
+    Monta uma vez o dicionário nome normalizado -> (coluna, prioridade) do
+    esquema, para resolver cada cabeçalho numa passada só pelas colunas
+    """
+    desconhecidas = set(colunas) - set(MAPEAMENTO_COLUNAS_CSV)
+    if desconhecidas:
+        raise ValueError(f"colunas desconhecidas: {', '.join(sorted(desconhecidas))}")
+    
+    apelidos = {}
+    for coluna_base, alternativas in colunas.items():
+        if isinstance(alternativas, str):
+            alternativas = [alternativas]
+        for prioridade, alternativa in enumerate(alternativas):
+            apelidos.setdefault(normalizar_nome_coluna(alternativa), (coluna_base, prioridade))
+    
+    return {'nome': nome, 'colunas': list(colunas), 'apelidos': apelidos}
+
+def carregar_esquemas_csv(pasta=DIRETORIO_ESQUEMAS_CSV):
+    """
+    Esquema padrão do fechamento seguido dos esquemas em JSON da pasta
+    """
+    esquemas = [compilar_esquema_csv('fechamento', MAPEAMENTO_COLUNAS_CSV)]
+    pasta = Path(pasta)
+    if not pasta.is_dir():
+        return esquemas
+    
+    for arquivo in sorted(pasta.glob('*.json')):
+        try:
+            with open(arquivo, encoding='utf-8') as f:
+                dados = json.load(f)
+            esquemas.append(compilar_esquema_csv(dados.get('nome') or arquivo.stem, dados['colunas']))
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            mostrar(f"⚠️ Esquema de colunas ignorado ({arquivo.name}): {e}", NIVEL_SILENCIOSO)
+    return esquemas
+
+ESQUEMAS_CSV = carregar_esquemas_csv()
+ASSINATURA_ESQUEMAS_CSV = hashlib.blake2b(
+    json.dumps([(esquema['nome'], sorted(esquema['apelidos'].items())) for esquema in ESQUEMAS_CSV], ensure_ascii=False).encode('utf-8'),
+    digest_size=8
+).hexdigest()
+_MAPEAMENTOS_CSV = {}
+
+def _resolver_esquema_csv(esquema, colunas_disponiveis):
+    """
+    Para cada coluna do esquema, a coluna do cabeçalho com o nome de maior
+    prioridade; empate fica com a que vem antes no arquivo
+    """
+    escolhidas = {}
+    for coluna_csv in colunas_disponiveis:
+        encontrada = esquema['apelidos'].get(normalizar_nome_coluna(coluna_csv))
+        if encontrada is None:
+            continue
+        coluna_base, prioridade = encontrada
+        if coluna_base not in escolhidas or prioridade < escolhidas[coluna_base][1]:
+            escolhidas[coluna_base] = (coluna_csv, prioridade)
+    return {coluna_base: escolhidas[coluna_base][0] for coluna_base in esquema['colunas'] if coluna_base in escolhidas}
+
+def mapear_colunas_csv(colunas_disponiveis, esquemas=None):
+    """
+    Encontra no cabeçalho as colunas usadas na conferência e devolve as
+    colunas a ler, o dicionário para renomeá-las e o nome do esquema usado.
+    Vale o primeiro esquema com todas as colunas obrigatórias ou, se nenhum
+    tiver, o que encontrar mais colunas. O resultado fica guardado por
+    cabeçalho, e arquivos repetidos não passam de novo pela resolução
+    """
+    chave = tuple(colunas_disponiveis)
+    if esquemas is None and chave in _MAPEAMENTOS_CSV:
+        return _MAPEAMENTOS_CSV[chave]
+    
+    melhor = None
+    for esquema in ESQUEMAS_CSV if esquemas is None else esquemas:
+        encontradas = _resolver_esquema_csv(esquema, colunas_disponiveis)
+        if all(coluna in encontradas for coluna in COLUNAS_OBRIGATORIAS_CSV):
+            melhor = (esquema, encontradas)
+            break
+        if melhor is None or len(encontradas) > len(melhor[1]):
+            melhor = (esquema, encontradas)
+    
+    esquema, encontradas = melhor
+    for coluna_base, coluna_csv in encontradas.items():
+        mostrar(f"   ✅ Coluna '{coluna_base}' encontrada como: '{coluna_csv}'", NIVEL_DETALHADO)
+    if esquema['nome'] != ESQUEMAS_CSV[0]['nome']:
+        mostrar(f"   🗂️ Layout de colunas: {esquema['nome']}", NIVEL_DETALHADO)
+    
+    resultado = (
+        list(encontradas.values()),
+        {coluna_csv: coluna_base for coluna_base, coluna_csv in encontradas.items()},
+        esquema['nome']
+    )
+    if esquemas is None:
+        if len(_MAPEAMENTOS_CSV) >= MAX_MAPEAMENTOS_CSV:
+            _MAPEAMENTOS_CSV.pop(next(iter(_MAPEAMENTOS_CSV)))
+        _MAPEAMENTOS_CSV[chave] = resultado
+    return resultado
+
+def detectar_perfil_csv(caminho, tamanho_amostra=TAMANHO_AMOSTRA_CSV):
+    """
+    Lê só uma amostra do início do CSV e decide codificação, separador e
+    mapeamento de colunas. O perfil devolvido é reaproveitado pela leitura,
+    que passa uma única vez pelo arquivo
+    """
+    with open(caminho, 'rb') as arquivo:
+        amostra = arquivo.read(tamanho_amostra)
+        chegou_ao_fim = not arquivo.read(1)
+    
+    if amostra.startswith(codecs.BOM_UTF8):
+        amostra = amostra[len(codecs.BOM_UTF8):]
+    
+    # A última linha da amostra pode estar cortada no meio e fica de fora
+    linhas_bytes = amostra.split(b'\n')
+    if not chegou_ao_fim and len(linhas_bytes) > 1:
+        linhas_bytes = linhas_bytes[:-1]
+    
+    # Linhas não ASCII que decodificam como utf-8 contam a favor do utf-8; uns poucos
+    # bytes ruins numa linha não devem condenar o arquivo inteiro ao latin-1
+    linhas_utf8 = 0
+    linhas_invalidas = 0
+    for linha in linhas_bytes:
+        if linha.isascii():
+            continue
+        try:
+            linha.decode('utf-8')
+            linhas_utf8 += 1
+        except UnicodeDecodeError:
+            linhas_invalidas += 1
+    encoding = 'latin-1' if linhas_invalidas > linhas_utf8 else 'utf-8'
+    
+    linhas = []
+    for linha in linhas_bytes:
+        try:
+            linhas.append(linha.decode(encoding).rstrip('\r'))
+        except UnicodeDecodeError:
+            linhas.append(linha.decode('latin-1').rstrip('\r'))
+    linhas = [linha for linha in linhas if linha]
+    
+    separador = detectar_separador_linhas(linhas)
+    colunas_disponiveis = pd.read_csv(io.StringIO(linhas[0] if linhas else ''), nrows=0, sep=separador).columns.tolist()
+    colunas_para_ler, rename_dict, esquema = mapear_colunas_csv(colunas_disponiveis)
+    
+    return {
+        'caminho': caminho,
+        'encoding': encoding,
+        'separador': separador,
+        'colunas': colunas_disponiveis,
+        'colunas_para_ler': colunas_para_ler,
+        'renomear': rename_dict,
+        'esquema': esquema
+    }
+
+class ArquivoCSVTolerante:
+    """
+    Arquivo de texto para o pd.read_csv que decodifica o CSV em blocos grandes e,
+    só nas linhas com bytes inválidos para a codificação do perfil, cai para
+    latin-1 e anota o número da linha, em vez de reler o arquivo inteiro.
+    Calcula de passagem o hash do conteúdo, usado pelo cache
+    """
+    def __init__(self, caminho, encoding='utf-8'):
+        self.encoding = encoding
+        self.linhas_invalidas = []
+        self.resumo = hashlib.blake2b(digest_size=20)
+        self._arquivo = open(caminho, 'rb')
+        self._pendente = b''
+        self._texto = ''
+        self._linhas_lidas = 0
+        self._inicio = True
+        self._fim = False
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *erro):
+        self.close()
+    
+    def __iter__(self):
+        linha = self.readline()
+        while linha:
+            yield linha
+            linha = self.readline()
+    
+    def close(self):
+        self._arquivo.close()
+    
+    def _decodificar_bloco(self):
+        dados = self._arquivo.read(TAMANHO_BLOCO_BYTES_CSV)
+        self.resumo.update(dados)
+        if self._inicio:
+            self._inicio = False
+            if dados.startswith(codecs.BOM_UTF8):
+                dados = dados[len(codecs.BOM_UTF8):]
+        
+        if dados:
+            dados = self._pendente + dados
+            corte = dados.rfind(b'\n') + 1
+            if corte == 0:
+                self._pendente = dados
+                return
+            completo, self._pendente = dados[:corte], dados[corte:]
         else:
-            return ';'
-    except:
-        return ';'
+            completo, self._pendente = self._pendente, b''
+            self._fim = True
+        
+        try:
+            texto = completo.decode(self.encoding)
+        except UnicodeDecodeError:
+            partes = []
+            for deslocamento, linha in enumerate(completo.split(b'\n')):
+                try:
+                    partes.append(linha.decode(self.encoding))
+                except UnicodeDecodeError:
+                    partes.append(linha.decode('latin-1'))
+                    self.linhas_invalidas.append(self._linhas_lidas + deslocamento + 1)
+            texto = '\n'.join(partes)
+        
+        self._linhas_lidas += completo.count(b'\n')
+        self._texto += texto
+    
+    def read(self, tamanho=-1):
+        while not self._fim and (tamanho is None or tamanho < 0 or len(self._texto) < tamanho):
+            self._decodificar_bloco()
+        
+        if tamanho is None or tamanho < 0:
+            saida, self._texto = self._texto, ''
+        else:
+            saida, self._texto = self._texto[:tamanho], self._texto[tamanho:]
+        return saida
+    
+    def readline(self):
+        while not self._fim and '\n' not in self._texto:
+            self._decodificar_bloco()
+        
+        corte = self._texto.find('\n') + 1 or len(self._texto)
+        saida, self._texto = self._texto[:corte], self._texto[corte:]
+        return saida
+
+def informar_linhas_invalidas(arquivo, limite=10):
+    """
+    Mostra as linhas que tinham bytes inválidos e foram lidas como latin-1
+    """
+    if not arquivo.linhas_invalidas:
+        return
+    
+    linhas = ', '.join(str(linha) for linha in arquivo.linhas_invalidas[:limite])
+    if len(arquivo.linhas_invalidas) > limite:
+        linhas += ', ...'
+    mostrar(f"   ⚠️ {len(arquivo.linhas_invalidas)} linha(s) com bytes inválidos para {arquivo.encoding} "
+            f"lidas como latin-1 (linhas {linhas})", NIVEL_SILENCIOSO)
 
 def formatar_nota_fiscal(valor):
     """
@@ -168,305 +904,981 @@ def converter_para_inteiro_nota_fiscal(valor):
     except:
         return 0
 
-def ler_csv_com_cabecalho(caminho, data_inicio=None, data_fim=None):
+def formatar_serie_nota_fiscal(valores):
     """
-    Lê o CSV detectando automaticamente o cabeçalho e filtrando por data
-    E APENAS NOTAS COM HISTÓRICO 51
+    Versão colunar de formatar_nota_fiscal; devolve texto colunar
     """
-    separador = detectar_separador_csv(caminho)
+    objetos = valores.to_numpy(dtype=object)
+    vazio = pd.isna(objetos) | (objetos == '')
+    texto = pd.Series(objetos, index=valores.index, dtype=object).where(~vazio, '').astype(str).astype(TIPO_TEXTO_COLUNAR)
+    
+    # Dígitos fora do ASCII (isdigit aceita "²", "٣"...) ficam com a função escalar
+    nao_ascii = texto.str.contains(r'[^\x00-\x7f]', regex=True).to_numpy(dtype=bool, na_value=False)
+    digitos = texto.str.replace(r'[^0-9]', '', regex=True)
     
+    sete_digitos = ((digitos.str.len() == 7) & digitos.str.endswith('0')).to_numpy(dtype=bool, na_value=False)
+    digitos[sete_digitos] = digitos[sete_digitos].str.slice(0, 6)
+    if nao_ascii.any():
+        digitos[nao_ascii] = [formatar_nota_fiscal(valor) for valor in objetos[nao_ascii]]
+    return digitos
+
+# A chave inteira usa até TAMANHO_CHAVE_NF dígitos: 10^17 * 18 ainda cabe em int64
+TAMANHO_CHAVE_NF = 17
+
+def chave_nota_fiscal(notas):
+    """
+    Converte notas já formatadas (só dígitos) em uma chave int64 que preserva
+    a igualdade e a ordem do texto: os dígitos completados com zeros à direita
+    até TAMANHO_CHAVE_NF casas, vezes 18, mais a quantidade de dígitos
+    ("1" e "10" continuam diferentes e "1" < "10" < "2").
+    Devolve None se alguma nota tiver mais de TAMANHO_CHAVE_NF dígitos
+    ou dígitos fora do ASCII
+    """
+    texto = notas.astype(TIPO_TEXTO_COLUNAR)
+    tamanhos = texto.str.len().to_numpy(dtype=np.int64)
+    if len(tamanhos) and tamanhos.max() > TAMANHO_CHAVE_NF:
+        return None
+    if not texto.str.fullmatch(r'[0-9]*').all():
+        return None
+    completos = texto.str.pad(TAMANHO_CHAVE_NF, side='right', fillchar='0').astype(np.int64).to_numpy()
+    return pd.Series(completos * (TAMANHO_CHAVE_NF + 1) + tamanhos, index=notas.index, name='NF_CHAVE')
+
+def _memoria_mb(df):
+    """
+    Memória ocupada pelo DataFrame (contando o texto), em MB
+    """
+    return df.memory_usage(deep=True).sum() / 1024 ** 2
+
+def informar_economia_memoria(nome, antes_mb, depois_mb):
+    """
+    Mostra e registra na instrumentação a memória economizada com os tipos compactos
+    """
+    if _INSTRUMENTACAO is not None:
+        _INSTRUMENTACAO.economia_memoria[nome] = {'antes_mb': round(antes_mb, 2), 'depois_mb': round(depois_mb, 2)}
+    mostrar(f"   🗜️ {nome}: {antes_mb:,.1f} MB → {depois_mb:,.1f} MB", NIVEL_DETALHADO)
+
+def _medindo_memoria():
+    """
+    A medição exata da memória percorre o texto todo, então só é feita
+    quando alguém vai olhar (modo detalhado ou instrumentação)
+    """
+    return NIVEL_LOG >= NIVEL_DETALHADO or _INSTRUMENTACAO is not None
+
+# Cache local dos dados já lidos. As planilhas ficam em unidades de rede e a
+# leitura delas custa bem mais do que a conferência em si
+DIRETORIO_CACHE = Path(os.environ.get('AVERIGUAR_CACHE_DIR') or Path.home() / '.cache' / 'averiguar_expedicao')
+MAX_ENTRADAS_CACHE = 20
+
+# Cópia em memória das últimas entradas usadas, para que vários trabalhos no
+# mesmo processo (modo lote) não leiam o mesmo pickle de novo
+MAX_ENTRADAS_MEMORIA = 8
+_CACHE_MEMORIA = {'limite': MAX_ENTRADAS_MEMORIA, 'entradas': {}}
+
+# A planilha e os CSVs são lidos em threads ao mesmo tempo; o índice e o
+# cache em memória são alterados por um de cada vez
+_TRAVA_CACHE = threading.RLock()
+
+@contextlib.contextmanager
+def cache_memoria_proprio(limite=MAX_ENTRADAS_MEMORIA):
+    """
+    Dentro do bloco o cache em memória é um só dele, com o limite pedido
+    (que quem o recebe pode aumentar); ao sair o cache anterior volta como
+    estava. Usado pelo modo vigia, que mantém todas as entradas em memória
+    """
+    global _CACHE_MEMORIA
+    with _TRAVA_CACHE:
+        anterior = _CACHE_MEMORIA
+        _CACHE_MEMORIA = {'limite': limite, 'entradas': {}}
+        proprio = _CACHE_MEMORIA
     try:
-        df_teste = pd.read_csv(caminho, nrows=0, sep=separador, encoding='utf-8')
-        colunas_disponiveis = df_teste.columns.tolist()
-        
-        mapeamento_colunas = {
-            'NOTA FISCAL': ['NF-E', 'NOTA FISCAL', 'NOTAFISCAL', 'NOTA_FISCAL', 'NF', 'NOTA'],
-            'PESO': ['QTDE REAL', 'QTDE_REAL', 'QUANTIDADE REAL', 'PESO', 'PESO_KG', 'PESO KG', 'PESO_TOTAL', 'QUANTIDADE', 'QTDE'],
-            'TOTAL': ['FAT BRUTO', 'FAT_BRUTO', 'TOTAL', 'TOTAL_NF', 'VALOR_TOTAL', 'VALOR TOTAL', 'VALOR'],
-            'DATA': ['DATA', 'DATE', 'DT', 'DATA_NF', 'DATA EMISSÃO', 'EMISSÃO'],
-            'HISTÓRICO': ['HISTÓRICO', 'HISTORICO', 'HIST', 'HISTORICO_LANCTO']
-        }
+        yield proprio
+    finally:
+        with _TRAVA_CACHE:
+            _CACHE_MEMORIA = anterior
+
+ABA_EXPEDICAO = 'JAN-FEV-MAR-ABR-MAI-JUN'
+COLUNAS_EXPEDICAO = ['NF', 'VOG', 'R$ NF', 'STATUS', 'DATA', 'OPERAÇÃO']
+COLUNAS_CATEGORICAS_EXPEDICAO = ['STATUS', 'OPERAÇÃO', 'ABA']
+
+# Versão do formato dos DataFrames guardados; muda quando as colunas ou os
+# tipos mudam, para que entradas antigas do cache não sejam usadas
+VERSAO_DADOS_CACHE = 4
+
+def calcular_hash_arquivo(caminho, tamanho_bloco=1024 * 1024):
+    """
+    Calcula o hash do conteúdo do arquivo lendo em blocos
+    """
+    resumo = hashlib.blake2b(digest_size=20)
+    with open(caminho, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(tamanho_bloco), b''):
+            resumo.update(bloco)
+    return resumo.hexdigest()
+
+def _chave_cache(tipo, caminho, parametros):
+    """
+    Monta a chave de uma entrada do cache a partir do arquivo de origem e
+    dos parâmetros que mudam o resultado guardado
+    """
+    identificacao = json.dumps(
+        {'tipo': tipo, 'caminho': os.path.abspath(caminho), 'parametros': parametros},
+        sort_keys=True, default=str
+    )
+    return hashlib.sha1(identificacao.encode('utf-8')).hexdigest()
+
+def _ler_indice_cache():
+    """
+    Lê o índice do cache (entradas, origem e último uso de cada uma)
+    """
+    try:
+        with open(DIRETORIO_CACHE / 'indice.json', encoding='utf-8') as arquivo:
+            return json.load(arquivo)
+    except (OSError, ValueError):
+        return {}
+
+def _gravar_indice_cache(indice):
+    """
+    Grava o índice do cache de forma atômica
+    """
+    DIRETORIO_CACHE.mkdir(parents=True, exist_ok=True)
+    temporario = DIRETORIO_CACHE / f'indice.{os.getpid()}.tmp'
+    with open(temporario, 'w', encoding='utf-8') as arquivo:
+        json.dump(indice, arquivo, ensure_ascii=False, indent=1)
+    os.replace(temporario, DIRETORIO_CACHE / 'indice.json')
+
+def _remover_entrada_cache(indice, chave):
+    """
+    Tira a entrada do índice e apaga o arquivo de dados dela
+    """
+    entrada = indice.pop(chave, None)
+    if entrada:
+        try:
+            os.remove(DIRETORIO_CACHE / entrada['arquivo'])
+        except OSError:
+            pass
+
+def _guardar_memoria(chave, tipo, caminho, parametros, estado, df):
+    """
+    Guarda o DataFrame no cache em memória, descartando o usado há mais tempo
+    """
+    entradas = _CACHE_MEMORIA['entradas']
+    entradas.pop(chave, None)
+    entradas[chave] = {
+        'tipo': tipo,
+        'caminho': os.path.abspath(caminho),
+        'parametros': parametros,
+        'estado': estado,
+        'df': df
+    }
+    while len(entradas) > _CACHE_MEMORIA['limite']:
+        entradas.pop(next(iter(entradas)))
+
+def _buscar_memoria(chave_exata, tipo, caminho, aceita_parametros=None):
+    """
+    Procura a entrada no cache em memória; vale só se o arquivo de origem
+    continua com o mesmo tamanho e data de modificação
+    """
+    try:
+        estado = os.stat(caminho)
+    except OSError:
+        return None
+    
+    entradas = _CACHE_MEMORIA['entradas']
+    caminho_absoluto = os.path.abspath(caminho)
+    candidatas = [chave_exata] if chave_exata in entradas else []
+    if aceita_parametros is not None:
+        candidatas += [
+            chave for chave, entrada in entradas.items()
+            if chave != chave_exata and entrada['tipo'] == tipo and entrada['caminho'] == caminho_absoluto
+            and aceita_parametros(entrada['parametros'])
+        ]
+    
+    for chave in candidatas:
+        entrada = entradas[chave]
+        if entrada['estado'] != (estado.st_size, estado.st_mtime_ns):
+            del entradas[chave]
+            continue
+        entradas[chave] = entradas.pop(chave)
+        return entrada
+    return None
+
+def buscar_cache(tipo, caminho, parametros, aceita_parametros=None):
+    """
+    Devolve o DataFrame guardado para o arquivo e parâmetros informados,
+    ou None se não houver cache ou se o arquivo de origem mudou.
+    Tamanho e data de modificação iguais bastam; se só a data mudou
+    (arquivo salvo sem alterações) o hash do conteúdo decide.
+    aceita_parametros permite usar uma entrada gravada com outros parâmetros
+    (por exemplo um período que contém o pedido); devolve também esses parâmetros.
+    O DataFrame devolvido pode ser o mesmo objeto do cache em memória: não alterar
+    """
+    with _TRAVA_CACHE:
+        chave_exata = _chave_cache(tipo, caminho, parametros)
+        entrada = _buscar_memoria(chave_exata, tipo, caminho, aceita_parametros)
+        if entrada is not None:
+            if aceita_parametros is not None:
+                return entrada['df'], entrada['parametros']
+            return entrada['df']
         
-        colunas_para_ler = []
-        for coluna_base, alternativas in mapeamento_colunas.items():
-            encontrou = False
-            for alternativa in alternativas:
-                for coluna_csv in colunas_disponiveis:
-                    if coluna_csv.upper() == alternativa.upper():
-                        colunas_para_ler.append(coluna_csv)
-                        encontrou = True
-                        print(f"   ✅ Coluna '{coluna_base}' encontrada como: '{coluna_csv}'")
-                        break
-                if encontrou:
-                    break
-        
-        # Lê todo o CSV
-        df = pd.read_csv(caminho, sep=separador, usecols=colunas_para_ler, encoding='utf-8')
-        
-        rename_dict = {}
-        for coluna_csv in colunas_para_ler:
-            for coluna_base, alternativas in mapeamento_colunas.items():
-                if any(coluna_csv.upper() == alt.upper() for alt in alternativas):
-                    rename_dict[coluna_csv] = coluna_base
-                    break
-        
-        df = df.rename(columns=rename_dict)
-        
-        # FILTRO CRÍTICO: APENAS HISTÓRICO 51
-        if 'HISTÓRICO' in df.columns:
-            # Converte histórico para numérico e filtra apenas 51
-            df['HISTÓRICO'] = pd.to_numeric(df['HISTÓRICO'], errors='coerce')
-            df = df[df['HISTÓRICO'] == 51]
-            print(f"   ✅ CSV filtrado - apenas histórico 51: {len(df)} notas")
-        
-        # FILTRO ADICIONAL: APENAS LINHAS COM QTDE REAL POSITIVA
-        if 'PESO' in df.columns:
-            df['PESO_LIMPO'] = df['PESO'].apply(limpar_valor_numerico)
-            print(f"   📊 Valores únicos de QTDE REAL encontrados: {df['PESO_LIMPO'].unique()}")
-            # Remove TODAS as linhas com valores negativos ou zero
-            df = df[df['PESO_LIMPO'] > 0]
-            print(f"   ✅ CSV filtrado - apenas QTDE REAL positiva: {len(df)} notas")
-        
-        if (data_inicio or data_fim) and 'DATA' in df.columns:
-            df['DATA'] = pd.to_datetime(df['DATA'], dayfirst=True, errors='coerce')
-            
-            if data_inicio:
-                df = df[df['DATA'] >= data_inicio]
-            if data_fim:
-                data_fim_ajustada = data_fim + pd.Timedelta(days=1)
-                df = df[df['DATA'] < data_fim_ajustada]
+        indice = _ler_indice_cache()
+        caminho_absoluto = os.path.abspath(caminho)
         
-        return df
+        candidatas = [chave_exata] if chave_exata in indice else []
+        if aceita_parametros is not None:
+            candidatas += [
+                chave for chave, entrada in indice.items()
+                if chave != chave_exata and entrada['tipo'] == tipo and entrada['caminho'] == caminho_absoluto
+                and aceita_parametros(entrada['parametros'])
+            ]
         
-    except Exception as e:
-        try:
-            df_teste = pd.read_csv(caminho, nrows=0, sep=separador, encoding='latin-1')
-            colunas_disponiveis = df_teste.columns.tolist()
+        for chave in candidatas:
+            entrada = indice[chave]
+            try:
+                estado = os.stat(caminho)
+                if (estado.st_size, estado.st_mtime_ns) != (entrada['tamanho'], entrada['mtime']):
+                    if estado.st_size != entrada['tamanho'] or calcular_hash_arquivo(caminho) != entrada['hash']:
+                        continue
+                    entrada['mtime'] = estado.st_mtime_ns
+                
+                df = pd.read_pickle(DIRETORIO_CACHE / entrada['arquivo'])
+                entrada['ultimo_uso'] = time.time()
+                _gravar_indice_cache(indice)
+                _guardar_memoria(chave, tipo, caminho, entrada['parametros'], (estado.st_size, estado.st_mtime_ns), df)
+            except Exception:
+                _remover_entrada_cache(indice, chave)
+                try:
+                    _gravar_indice_cache(indice)
+                except OSError:
+                    pass
+                continue
             
-            colunas_para_ler = []
-            mapeamento_colunas = {
-                'NOTA FISCAL': ['NF-E', 'NOTA FISCAL', 'NOTAFISCAL', 'NOTA_FISCAL', 'NF', 'NOTA'],
-                'PESO': ['QTDE REAL', 'QTDE_REAL', 'QUANTIDADE REAL', 'PESO', 'PESO_KG', 'PESO KG', 'PESO_TOTAL', 'QUANTIDADE', 'QTDE'],
-                'TOTAL': ['FAT BRUTO', 'FAT_BRUTO', 'TOTAL', 'TOTAL_NF', 'VALOR_TOTAL', 'VALOR TOTAL', 'VALOR'],
-                'DATA': ['DATA', 'DATE', 'DT', 'DATA_NF', 'DATA EMISSÃO', 'EMISSÃO'],
-                'HISTÓRICO': ['HISTÓRICO', 'HISTORICO', 'HIST', 'HISTORICO_LANCTO']
-            }
+            if aceita_parametros is not None:
+                return df, entrada['parametros']
+            return df
+        
+        if aceita_parametros is not None:
+            return None, None
+        return None
+
+def gravar_cache(tipo, caminho, parametros, df, estado_origem=None, hash_conteudo=None):
+    """
+    Guarda o DataFrame no cache local e descarta as entradas usadas há mais
+    tempo quando o limite de entradas é ultrapassado (LRU).
+    estado_origem é o os.stat do arquivo tirado antes da leitura, para que uma
+    alteração feita durante a leitura invalide a entrada
+    """
+    with _TRAVA_CACHE:
+        try:
+            if estado_origem is None:
+                estado_origem = os.stat(caminho)
+            if hash_conteudo is None:
+                hash_conteudo = calcular_hash_arquivo(caminho)
             
-            for coluna_base, alternativas in mapeamento_colunas.items():
-                encontrou = False
-                for alternativa in alternativas:
-                    for coluna_csv in colunas_disponiveis:
-                        if coluna_csv.upper() == alternativa.upper():
-                            colunas_para_ler.append(coluna_csv)
-                            encontrou = True
-                            print(f"   ✅ Coluna '{coluna_base}' encontrada como: '{coluna_csv}'")
-                            break
-                    if encontrou:
-                        break
+            chave = _chave_cache(tipo, caminho, parametros)
+            _guardar_memoria(chave, tipo, caminho, parametros, (estado_origem.st_size, estado_origem.st_mtime_ns), df)
+            DIRETORIO_CACHE.mkdir(parents=True, exist_ok=True)
+            df.to_pickle(DIRETORIO_CACHE / f'{chave}.pkl')
             
-            # Lê todo o CSV
-            df = pd.read_csv(caminho, sep=separador, usecols=colunas_para_ler, encoding='latin-1')
+            indice = _ler_indice_cache()
+            indice[chave] = {
+                'tipo': tipo,
+                'caminho': os.path.abspath(caminho),
+                'parametros': parametros,
+                'tamanho': estado_origem.st_size,
+                'mtime': estado_origem.st_mtime_ns,
+                'hash': hash_conteudo,
+                'arquivo': f'{chave}.pkl',
+                'ultimo_uso': time.time()
+            }
             
-            rename_dict = {}
-            for coluna_csv in colunas_para_ler:
-                for coluna_base, alternativas in mapeamento_colunas.items():
-                    if any(coluna_csv.upper() == alt.upper() for alt in alternativas):
-                        rename_dict[coluna_csv] = coluna_base
-                        break
+            excedentes = sorted(indice, key=lambda c: indice[c]['ultimo_uso'])[:max(len(indice) - MAX_ENTRADAS_CACHE, 0)]
+            for chave_antiga in excedentes:
+                _remover_entrada_cache(indice, chave_antiga)
             
-            df = df.rename(columns=rename_dict)
+            _gravar_indice_cache(indice)
+        except Exception as e:
+            mostrar(f"   ⚠️ Não foi possível gravar o cache local: {e}", NIVEL_SILENCIOSO)
+
+# A partir deste tamanho a conversão da planilha (openpyxl, Python puro) vale
+# um processo próprio para rodar de fato junto com a leitura dos CSVs
+TAMANHO_PLANILHA_PROCESSO = 1024 * 1024
+
+# Leitor próprio da aba do .xlsx: percorre o XML da planilha em fluxo e só
+# converte as células das colunas pedidas, em vez de criar um objeto por
+# célula da aba inteira como o openpyxl. Os valores de cada célula e a
+# inferência de tipos seguem o pd.read_excel (a montagem final é feita pelo
+# mesmo TextParser do pandas). A aba é lida até o fim, como no pandas: a
+# região vazia (só formatada) do fim é pulada linha a linha sem conversão.
+# O leitor usa partes internas do openpyxl (textos compartilhados, formatos
+# de data, XML e CRC da aba), então só é usado nas versões testadas; nas
+# outras a planilha é lida pelo pd.read_excel
+VERSOES_OPENPYXL_TESTADAS = ['3.1']
+LEITOR_RAPIDO_DISPONIVEL = '.'.join(VERSAO_OPENPYXL.split('.')[:2]) in VERSOES_OPENPYXL_TESTADAS
+NAMESPACE_PLANILHA = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+TAG_LINHA = NAMESPACE_PLANILHA + 'row'
+TAG_VALOR = NAMESPACE_PLANILHA + 'v'
+TAG_TEXTO_EM_LINHA = NAMESPACE_PLANILHA + 'is'
+TAG_TEXTO = NAMESPACE_PLANILHA + 't'
+
+def _numero_celula(texto):
+    """
+    Número da célula como o openpyxl devolve (int sem ponto nem expoente)
+    """
+    if '.' in texto or 'E' in texto or 'e' in texto:
+        return float(texto)
+    return int(texto)
+
+def _texto_em_linha(celula):
+    """
+    Texto de uma célula inlineStr (ignora a leitura fonética dos <rPh>)
+    """
+    elemento = celula.find(TAG_TEXTO_EM_LINHA)
+    if elemento is None:
+        return None
+    if len(elemento) == 1 and elemento[0].tag == TAG_TEXTO:
+        return elemento[0].text or ''
+    partes = [filho.text or '' for filho in elemento if filho.tag == TAG_TEXTO]
+    partes += [texto.text or '' for corrida in elemento if corrida.tag == NAMESPACE_PLANILHA + 'r' for texto in corrida.iter(TAG_TEXTO)]
+    return ''.join(partes)
+
+def _letras_celula(celula):
+    """
+    Letras da coluna da célula (o Excel e as bibliotecas sempre gravam a
+    referência; sem ela a leitura cai para o pd.read_excel)
+    """
+    referencia = celula.get('r')
+    if not referencia:
+        raise ValueError("célula sem referência")
+    return referencia.rstrip('0123456789')
+
+def _converter_celula(celula, tipo, textos, formatos_data, formatos_duracao, epoca):
+    """
+    Valor da célula como o pd.read_excel (openpyxl + _convert_cell do pandas):
+    vazio vira '', erro vira NaN e número inteiro vira int
+    """
+    if tipo == 'inlineStr':
+        valor = _texto_em_linha(celula)
+        return '' if valor is None else valor
+    
+    texto = celula.findtext(TAG_VALOR) or None
+    if texto is None:
+        return ''
+    if tipo == 'n':
+        numero = _numero_celula(texto)
+        estilo = int(celula.get('s', 0))
+        if estilo in formatos_data:
+            try:
+                return from_excel(numero, epoca, timedelta=estilo in formatos_duracao)
+            except (OverflowError, ValueError):
+                return np.nan
+        inteiro = int(numero)
+        return inteiro if inteiro == numero else float(numero)
+    if tipo == 's':
+        return textos[int(texto)]
+    if tipo == 'b':
+        return bool(int(texto))
+    if tipo == 'e':
+        return np.nan
+    if tipo == 'd':
+        return from_ISO8601(texto)
+    return texto
+
+def ler_aba_xlsx(dados, aba, cabecalho, colunas, dtype=None, filtros=None):
+    """
+    Lê só as colunas pedidas de uma aba do .xlsx, com o mesmo resultado de
+    pd.read_excel(sheet_name=aba, header=cabecalho, usecols=colunas, dtype=dtype).
+    filtros ({coluna: valores aceitos}) descarta as linhas já na leitura,
+    antes de converter o resto da linha (o resultado equivale a filtrar com isin)
+    """
+    if not LEITOR_RAPIDO_DISPONIVEL:
+        raise RuntimeError(f"openpyxl {VERSAO_OPENPYXL} não testado com o leitor rápido")
+    
+    # O openpyxl em modo somente leitura carrega só os metadados: textos
+    # compartilhados, formatos de data e a data base (1900 ou 1904)
+    livro = load_workbook(io.BytesIO(dados), read_only=True, data_only=True, keep_links=False)
+    try:
+        planilha = livro[aba]
+        textos = planilha._shared_strings
+        formatos_data = livro._date_formats
+        formatos_duracao = livro._timedelta_formats
+        epoca = livro.epoch
+        fonte = planilha._get_source()
+    except Exception:
+        livro.close()
+        raise
+    
+    linha_cabecalho = cabecalho + 1
+    posicoes = None
+    filtros_posicao = {}
+    colunas = list(colunas)
+    vazia = [''] * len(colunas)
+    linhas = []
+    ultima_com_dados = None
+    numero_linha = 0
+    try:
+        for _, elemento in iterparse(fonte):
+            if elemento.tag != TAG_LINHA:
+                continue
+            referencia = elemento.get('r')
+            numero_linha = int(referencia) if referencia else numero_linha + 1
             
-            # FILTRO CRÍTICO: APENAS HISTÓRICO 51
-            if 'HISTÓRICO' in df.columns:
-                # Converte histórico para numérico e filtra apenas 51
-                df['HISTÓRICO'] = pd.to_numeric(df['HISTÓRICO'], errors='coerce')
-                df = df[df['HISTÓRICO'] == 51]
-                print(f"   ✅ CSV filtrado - apenas histórico 51: {len(df)} notas")
+            if posicoes is None:
+                if numero_linha == linha_cabecalho:
+                    # Primeira coluna com cada nome (as repetidas o pandas chama de NOME.1)
+                    nomes = {}
+                    for celula in elemento:
+                        valor = _converter_celula(celula, celula.get('t', 'n'), textos, formatos_data, formatos_duracao, epoca)
+                        if isinstance(valor, str) and valor not in nomes:
+                            nomes[valor] = _letras_celula(celula)
+                    faltando = [coluna for coluna in colunas if coluna not in nomes]
+                    if faltando:
+                        raise ValueError(f"Usecols do not match columns, columns expected but not found: {faltando}")
+                    
+                    # As colunas saem na ordem da planilha, como no usecols do pandas
+                    colunas = sorted(colunas, key=lambda coluna: (len(nomes[coluna]), nomes[coluna]))
+                    posicoes = {nomes[coluna]: posicao for posicao, coluna in enumerate(colunas)}
+                    filtros_posicao = {colunas.index(coluna): set(valores) for coluna, valores in (filtros or {}).items()}
+                    ultima_com_dados = numero_linha
+                elif numero_linha > linha_cabecalho:
+                    raise ValueError(f"Linha de cabeçalho {linha_cabecalho} não encontrada na aba {aba}")
+                elemento.clear()
+                continue
             
-            # FILTRO ADICIONAL: APENAS LINHAS COM QTDE REAL POSITIVA
-            if 'PESO' in df.columns:
-                df['PESO_LIMPO'] = df['PESO'].apply(limpar_valor_numerico)
-                print(f"   📊 Valores únicos de QTDE REAL encontrados: {df['PESO_LIMPO'].unique()}")
-                # Remove TODAS as linhas com valores negativos ou zero
-                df = df[df['PESO_LIMPO'] > 0]
-                print(f"   ✅ CSV filtrado - apenas QTDE REAL positiva: {len(df)} notas")
+            # Linha sem nenhum valor (só formatação) nem é convertida
+            if elemento.find('*/' + TAG_VALOR) is None and elemento.find('*/' + TAG_TEXTO_EM_LINHA) is None:
+                elemento.clear()
+                continue
             
-            if (data_inicio or data_fim) and 'DATA' in df.columns:
-                df['DATA'] = pd.to_datetime(df['DATA'], dayfirst=True, errors='coerce')
-                
-                if data_inicio:
-                    df = df[df['DATA'] >= data_inicio]
-                if data_fim:
-                    data_fim_ajustada = data_fim + pd.Timedelta(days=1)
-                    df = df[df['DATA'] < data_fim_ajustada]
+            linha = list(vazia)
+            tem_dados = False
+            for celula in elemento:
+                referencia = celula.get('r')
+                if not referencia:
+                    raise ValueError("célula sem referência")
+                posicao = posicoes.get(referencia.rstrip('0123456789'))
+                if posicao is None:
+                    # Fora das colunas pedidas só interessa saber se há valor
+                    if not tem_dados:
+                        tipo = celula.get('t', 'n')
+                        valor = _converter_celula(celula, tipo, textos, formatos_data, formatos_duracao, epoca)
+                        tem_dados = valor.__class__ is not str or valor != ''
+                    continue
+                valor = _converter_celula(celula, celula.get('t', 'n'), textos, formatos_data, formatos_duracao, epoca)
+                linha[posicao] = valor
+                if valor.__class__ is not str or valor != '':
+                    tem_dados = True
+            elemento.clear()
             
-            return df
+            if not tem_dados:
+                continue
+            if filtros_posicao and not all(linha[posicao] in aceitos for posicao, aceitos in filtros_posicao.items()):
+                ultima_com_dados = numero_linha
+                continue
             
-        except Exception as e2:
-            print(f"❌ Erro ao ler CSV: {e2}")
-            return None
+            # Linhas vazias entre as linhas com dados entram vazias, como no pandas
+            if not filtros_posicao:
+                linhas.extend([list(vazia) for _ in range(numero_linha - ultima_com_dados - 1)])
+            linhas.append(linha)
+            ultima_com_dados = numero_linha
+    finally:
+        fonte.close()
+        livro.close()
+    
+    if posicoes is None:
+        raise ValueError(f"Linha de cabeçalho {linha_cabecalho} não encontrada na aba {aba}")
+    
+    # O TextParser é o mesmo usado pelo pd.read_excel: NA, tipos e dtype ficam iguais
+    return TextParser([list(colunas)] + linhas, header=0, dtype=dtype).read()
 
-def obter_periodo_usuario():
+LEITORES_PLANILHA = ['rapido', 'pandas']
+
+def _converter_planilha_expedicao(dados, aba, filtros=None, leitor='rapido'):
     """
-    Solicita o período desejado ao usuário
+    Converte os bytes da planilha de expedição em DataFrame; roda também em
+    outro processo. Usa o leitor próprio e, se ele falhar (ou com leitor
+    'pandas'), o pd.read_excel
     """
-    print("📅 PERÍODO DE ANÁLISE")
-    print("Deixe em branco para não usar filtro")
-    
-    while True:
-        data_inicio_str = input("Data de início (DD/MM/AAAA): ").strip()
-        data_fim_str = input("Data de fim (DD/MM/AAAA): ").strip()
-        
-        data_inicio = None
-        data_fim = None
-        
+    if leitor == 'rapido':
         try:
-            if data_inicio_str:
-                data_inicio = datetime.strptime(data_inicio_str, '%d/%m/%Y')
-            if data_fim_str:
-                data_fim = datetime.strptime(data_fim_str, '%d/%m/%Y')
-            
-            if data_inicio and data_fim and data_inicio > data_fim:
-                print("❌ Data de início não pode ser maior que data de fim!")
+            return ler_aba_xlsx(dados, aba, 3, COLUNAS_EXPEDICAO, dtype={'NF': str}, filtros=filtros)
+        except Exception as e:
+            mostrar(f"   ⚠️ Leitor rápido da planilha falhou ({e}); usando o pd.read_excel", NIVEL_DETALHADO)
+    
+    df = pd.read_excel(
+        io.BytesIO(dados),
+        sheet_name=aba,
+        header=3,
+        usecols=COLUNAS_EXPEDICAO,
+        dtype={'NF': str}
+    )
+    for coluna, valores in (filtros or {}).items():
+        df = df[df[coluna].isin(valores)].reset_index(drop=True)
+    return df
+
+# Abas da planilha de expedição. A pasta de trabalho tem várias abas de
+# período e o nome da aba nem sempre bate com as datas dela (a aba
+# JAN-FEV-MAR-ABR-MAI-JUN do arquivo de NOVEMBRO): entram todas as abas cujo
+# cabeçalho tem as colunas usadas, cada uma lida em um processo.
+# O intervalo de DATA de cada aba fica guardado com o CRC do XML dela, que o
+# .xlsx (um zip) já traz: nas próximas execuções as abas que não mudaram e
+# não têm datas no período pedido nem são lidas
+ARQUIVO_ABAS_EXPEDICAO = DIRETORIO_CACHE / 'abas_expedicao.json'
+
+def _cabecalho_aba(planilha, linha_cabecalho, textos, formatos_data, formatos_duracao, epoca):
+    """
+    Valores da linha de cabeçalho da aba, lendo o XML só até ela
+    """
+    fonte = planilha._get_source()
+    try:
+        numero_linha = 0
+        for _, elemento in iterparse(fonte):
+            if elemento.tag != TAG_LINHA:
                 continue
-                
-            return data_inicio, data_fim
-            
-        except ValueError:
-            print("❌ Formato inválido! Use DD/MM/AAAA")
-            continuar = input("Tentar novamente? (S/N): ").strip().upper()
-            if continuar != 'S':
-                return None, None
+            referencia = elemento.get('r')
+            numero_linha = int(referencia) if referencia else numero_linha + 1
+            if numero_linha == linha_cabecalho:
+                return [
+                    _converter_celula(celula, celula.get('t', 'n'), textos, formatos_data, formatos_duracao, epoca)
+                    for celula in elemento
+                ]
+            if numero_linha > linha_cabecalho:
+                break
+            elemento.clear()
+    finally:
+        fonte.close()
+    return []
 
-def aplicar_estilo_erros(worksheet, df_relatorio, problemas_por_linha):
+def listar_abas_expedicao(fonte, cabecalho=3, colunas=COLUNAS_EXPEDICAO):
     """
-    Aplica estilo vermelho às células com problemas graves e amarelo para erros de digitação
+    Abas da pasta de trabalho (caminho ou bytes) com o CRC do XML de cada uma
+    e se a linha de cabeçalho tem todas as colunas esperadas
     """
-    fill_vermelho = PatternFill(start_color='FF9999', end_color='FF9999', fill_type='solid')
-    fill_amarelo = PatternFill(start_color='FFFF99', end_color='FFFF99', fill_type='solid')
-    
-    colunas_indices = {}
-    for idx, col_name in enumerate(df_relatorio.columns):
-        colunas_indices[col_name] = idx
+    livro = load_workbook(io.BytesIO(fonte) if isinstance(fonte, bytes) else fonte, read_only=True, data_only=True, keep_links=False)
+    try:
+        abas = []
+        for planilha in livro.worksheets:
+            # Fora das versões testadas do openpyxl: só a API pública e sem CRC,
+            # e as datas guardadas das abas não são reaproveitadas
+            if LEITOR_RAPIDO_DISPONIVEL:
+                nomes = _cabecalho_aba(
+                    planilha, cabecalho + 1, planilha._shared_strings,
+                    livro._date_formats, livro._timedelta_formats, livro.epoch
+                )
+                crc = livro._archive.getinfo(planilha._worksheet_path).CRC
+            else:
+                nomes = next(planilha.iter_rows(min_row=cabecalho + 1, max_row=cabecalho + 1, values_only=True), ())
+                crc = None
+            abas.append({
+                'aba': planilha.title,
+                'crc': crc,
+                'cabecalho': set(colunas) <= {nome for nome in nomes if isinstance(nome, str)},
+                'datas': {}
+            })
+    finally:
+        livro.close()
+    return abas
+
+def _ler_registros_arquivos(arquivo_json):
+    """
+    Lê um registro JSON do cache indexado pelo caminho absoluto de cada
+    arquivo de entrada (tamanho, data de modificação e o que foi guardado)
+    """
+    try:
+        with open(arquivo_json, encoding='utf-8') as arquivo:
+            return json.load(arquivo)
+    except (OSError, ValueError):
+        return {}
+
+def _guardar_registro_arquivo(arquivo_json, caminho, estado_origem, limite=MAX_ENTRADAS_CACHE, **dados):
+    """
+    Guarda o registro de um arquivo de entrada (gravação atômica, mantendo só
+    os últimos limite arquivos registrados)
+    """
+    with _TRAVA_CACHE:
+        registros = _ler_registros_arquivos(arquivo_json)
+        registros.pop(os.path.abspath(caminho), None)
+        registros[os.path.abspath(caminho)] = {'tamanho': estado_origem.st_size, 'mtime': estado_origem.st_mtime_ns, **dados}
+        while len(registros) > limite:
+            registros.pop(next(iter(registros)))
+        DIRETORIO_CACHE.mkdir(parents=True, exist_ok=True)
+        temporario = arquivo_json.with_suffix(f'.{os.getpid()}.tmp')
+        with open(temporario, 'w', encoding='utf-8') as arquivo:
+            json.dump(registros, arquivo, ensure_ascii=False, indent=1)
+        os.replace(temporario, arquivo_json)
+
+def _registro_atual(arquivo_json, caminho, estado):
+    """
+    Registro guardado do arquivo e se ele ainda vale (mesmo tamanho e data de modificação)
+    """
+    registro = _ler_registros_arquivos(arquivo_json).get(os.path.abspath(caminho))
+    return registro, bool(registro) and (registro['tamanho'], registro['mtime']) == (estado.st_size, estado.st_mtime_ns)
+
+def descobrir_abas_expedicao(caminho, usar_cache=True):
+    """
+    Abas da planilha com CRC, cabeçalho e os intervalos de datas já conhecidos.
+    Se o arquivo não mudou (tamanho e data de modificação) ele nem é aberto;
+    se mudou, as abas com o mesmo CRC mantêm os intervalos guardados
+    """
+    registro, atual = _registro_atual(ARQUIVO_ABAS_EXPEDICAO, caminho, os.stat(caminho)) if usar_cache else (None, False)
+    if atual:
+        return registro['abas']
     
-    for linha_idx, problemas in problemas_por_linha.items():
-        linha_excel = linha_idx + 2
-        
-        for problema in problemas:
-            tipo = problema['tipo']
-            
-            if tipo == 'nf_nao_encontrada':
-                for col_idx in range(len(df_relatorio.columns)):
-                    cell = worksheet.cell(row=linha_excel, column=col_idx+1)
-                    cell.fill = fill_vermelho
-            
-            elif tipo == 'peso_divergente':
-                if 'VOG_Expedição' in colunas_indices:
-                    col_idx = colunas_indices['VOG_Expedição']
-                    cell = worksheet.cell(row=linha_excel, column=col_idx+1)
-                    cell.fill = fill_vermelho
-                if 'PESO_CSV' in colunas_indices:
-                    col_idx = colunas_indices['PESO_CSV']
-                    cell = worksheet.cell(row=linha_excel, column=col_idx+1)
-                    cell.fill = fill_vermelho
-            
-            elif tipo == 'valor_divergente':
-                if 'R$ NF_Expedição' in colunas_indices:
-                    col_idx = colunas_indices['R$ NF_Expedição']
-                    cell = worksheet.cell(row=linha_excel, column=col_idx+1)
-                    cell.fill = fill_vermelho
-                if 'TOTAL_CSV' in colunas_indices:
-                    col_idx = colunas_indices['TOTAL_CSV']
-                    cell = worksheet.cell(row=linha_excel, column=col_idx+1)
-                    cell.fill = fill_vermelho
-            
-            elif tipo == 'erro_digitacao_vog':
-                if 'VOG_Expedição' in colunas_indices:
-                    col_idx = colunas_indices['VOG_Expedição']
-                    cell = worksheet.cell(row=linha_excel, column=col_idx+1)
-                    cell.fill = fill_amarelo
-            
-            elif tipo == 'erro_digitacao_valor':
-                if 'R$ NF_Expedição' in colunas_indices:
-                    col_idx = colunas_indices['R$ NF_Expedição']
-                    cell = worksheet.cell(row=linha_excel, column=col_idx+1)
-                    cell.fill = fill_amarelo
+    anteriores = {(anterior['aba'], anterior['crc']): anterior for anterior in registro['abas']} if registro else {}
+    abas = listar_abas_expedicao(caminho)
+    for info in abas:
+        anterior = anteriores.get((info['aba'], info['crc']))
+        if anterior is not None and info['crc'] is not None:
+            info['datas'] = anterior['datas']
+    return abas
 
-def processar_planilhas():
-    # Caminhos das planilhas
-    caminho_expedicao = r"Z:\RODRIGO - LOGISTICA\Cópia de CONTROLE DE EXPEDIÇÃO NOVEMBRO.xlsx"
-    caminho_csv = r"S:\hor\excel\fechamento-20251101-20251110.csv"
+def registrar_abas_expedicao(caminho, estado_origem, abas):
+    """
+    Guarda as abas da planilha para as próximas execuções
+    """
+    try:
+        _guardar_registro_arquivo(ARQUIVO_ABAS_EXPEDICAO, caminho, estado_origem, abas=abas)
+    except Exception as e:
+        mostrar(f"   ⚠️ Não foi possível guardar as abas da planilha: {e}", NIVEL_SILENCIOSO)
+
+def intervalo_datas(valores):
+    """
+    Primeira e última data válida ([ISO, ISO]) convertidas como em
+    filtrar_expedicao, ou None se não houver nenhuma
+    """
+    datas = pd.to_datetime(pd.Series(valores), errors='coerce').dropna()
+    if datas.empty:
+        return None
+    return [datas.min().isoformat(), datas.max().isoformat()]
+
+def periodo_sobrepoe(intervalo, data_inicio=None, data_fim=None):
+    """
+    Se uma aba com esse intervalo de datas tem alguma linha que passa no
+    filtro de período de filtrar_expedicao
+    """
+    if not (data_inicio or data_fim):
+        return True
+    if intervalo is None:
+        return False
+    primeira, ultima = pd.Timestamp(intervalo[0]), pd.Timestamp(intervalo[1])
+    if data_inicio and ultima < pd.Timestamp(data_inicio):
+        return False
+    if data_fim and primeira >= pd.Timestamp(data_fim) + pd.Timedelta(days=1):
+        return False
+    return True
+
+# Bytes da planilha nos processos auxiliares: enviados uma vez por processo
+# em vez de uma vez por aba
+# Os processos da planilha e dos CSVs são criados enquanto outra thread lê
+# a outra entrada; com fork (padrão no Linux) o filho herdaria travas presas
+# por essa thread (a da saída, as do pandas e do openpyxl) e poderia travar.
+# forkserver e spawn (padrão no Windows) começam de um processo limpo
+CONTEXTO_PROCESSOS = multiprocessing.get_context(
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+)
+
+_DADOS_PLANILHA = None
+
+def _iniciar_processo_planilha(dados):
+    """
+    Guarda os bytes da planilha no processo auxiliar
+    """
+    global _DADOS_PLANILHA
+    _DADOS_PLANILHA = dados
+
+def _converter_aba_processo(aba, filtros, leitor):
+    """
+    Converte uma aba com os bytes recebidos na criação do processo
+    """
+    return _converter_planilha_expedicao(_DADOS_PLANILHA, aba, filtros, leitor)
+
+def ler_planilha_expedicao(caminho, aba=None, usar_cache=True, usar_processo=False, filtros=None, leitor='rapido',
+                           data_inicio=None, data_fim=None):
+    """
+    Lê as colunas da planilha de controle de expedição usadas na conferência,
+    reaproveitando o cache local quando o arquivo não mudou.
+    aba é o nome de uma aba, uma lista de abas ou None para todas as abas com
+    o cabeçalho esperado que tenham datas no período; a coluna ABA diz de
+    qual aba veio cada linha.
+    Com usar_processo uma planilha grande é convertida em outros processos
+    (uma aba por processo). filtros ({coluna: valores aceitos}) descarta as
+    linhas já na leitura
+    """
+    chave_filtros = json.dumps(filtros, sort_keys=True, default=str)
+    descobertas = None
+    if aba is None:
+        descobertas = descobrir_abas_expedicao(caminho, usar_cache)
+        candidatas = [info for info in descobertas if info['cabecalho']]
+        if not candidatas:
+            raise ValueError(f"Nenhuma aba com as colunas {', '.join(COLUNAS_EXPEDICAO)} na linha 4")
+        
+        # Aba com intervalo conhecido fora do período não é lida; aba nova ou
+        # alterada é lida e o intervalo dela decide depois
+        abas = [
+            info['aba'] for info in candidatas
+            if chave_filtros not in info['datas'] or periodo_sobrepoe(info['datas'][chave_filtros], data_inicio, data_fim)
+        ]
+        if len(candidatas) > 1:
+            ignoradas = len(candidatas) - len(abas)
+            mostrar(f"   📑 Abas da expedição: {len(abas)} de {len(candidatas)}" + (f" ({ignoradas} sem datas no período)" if ignoradas else ""))
+    else:
+        abas = [aba] if isinstance(aba, str) else list(aba)
     
-    if not os.path.exists(caminho_expedicao):
-        print(f"❌ Arquivo não encontrado: {caminho_expedicao}")
-        return
+    def parametros_cache(abas_lidas):
+        return {
+            'aba': abas_lidas, 'cabecalho': 3, 'colunas': COLUNAS_EXPEDICAO, 'versao': VERSAO_DADOS_CACHE,
+            'filtros': filtros
+        }
     
-    if not os.path.exists(caminho_csv):
-        print(f"❌ Arquivo não encontrado: {caminho_csv}")
-        return
+    if usar_cache:
+        df = buscar_cache('expedicao', caminho, parametros_cache(abas))
+        if df is not None:
+            mostrar("   ⚡ Planilha de expedição carregada do cache local")
+            return df
     
-    # Solicita o período ao usuário
-    data_inicio, data_fim = obter_periodo_usuario()
+    # Lê os bytes uma vez só: servem para o hash do cache e para o openpyxl
+    estado_origem = os.stat(caminho)
+    with open(caminho, 'rb') as arquivo:
+        dados = arquivo.read()
     
-    print("\n📊 PROCESSANDO DADOS...")
+    if usar_processo and len(dados) >= TAMANHO_PLANILHA_PROCESSO and abas:
+        processos = min(len(abas), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=processos, mp_context=CONTEXTO_PROCESSOS,
+                                 initializer=_iniciar_processo_planilha, initargs=(dados,)) as executor:
+            partes = list(executor.map(_converter_aba_processo, abas, [filtros] * len(abas), [leitor] * len(abas)))
+    else:
+        partes = [_converter_planilha_expedicao(dados, aba_lida, filtros, leitor) for aba_lida in abas]
     
-    try:
-        # Lê a planilha de controle de expedição
-        df_expedicao = pd.read_excel(
-            caminho_expedicao, 
-            sheet_name='JAN-FEV-MAR-ABR-MAI-JUN',
-            header=3,
-            usecols=['NF', 'VOG', 'R$ NF', 'STATUS', 'DATA', 'OPERAÇÃO'],
-            dtype={'NF': str}
+    if descobertas is not None:
+        # Guarda o intervalo de cada aba lida e descarta as que ficaram fora do período
+        por_nome = {info['aba']: info for info in descobertas}
+        lidas = []
+        for aba_lida, parte in zip(abas, partes):
+            intervalo = intervalo_datas(parte['DATA'])
+            por_nome[aba_lida]['datas'][chave_filtros] = intervalo
+            if periodo_sobrepoe(intervalo, data_inicio, data_fim):
+                lidas.append((aba_lida, parte))
+        if usar_cache:
+            registrar_abas_expedicao(caminho, estado_origem, descobertas)
+        abas = [aba_lida for aba_lida, _ in lidas]
+        partes = [parte for _, parte in lidas]
+    
+    if partes:
+        df = pd.concat(
+            [parte.assign(ABA=aba_lida) for aba_lida, parte in zip(abas, partes)],
+            ignore_index=True
         )
+    else:
+        df = pd.DataFrame({coluna: pd.Series(dtype=object) for coluna in [*COLUNAS_EXPEDICAO, 'ABA']})
+    
+    # Status, operação e aba têm poucos valores distintos: como categoria
+    # ocupam um código por linha em vez de um texto
+    antes_mb = _memoria_mb(df) if _medindo_memoria() else None
+    for coluna in COLUNAS_CATEGORICAS_EXPEDICAO:
+        df[coluna] = df[coluna].astype('category')
+    df['NF'] = df['NF'].astype(TIPO_TEXTO_COLUNAR)
+    if antes_mb is not None:
+        informar_economia_memoria('Planilha de expedição', antes_mb, _memoria_mb(df))
+    
+    if usar_cache:
+        gravar_cache('expedicao', caminho, parametros_cache(abas), df, estado_origem, hashlib.blake2b(dados, digest_size=20).hexdigest())
+    return df
+
+TAMANHO_BLOCO_CSV = 200000
+HISTORICO_CONFERENCIA = 51
+
+def ampliar_intervalo(intervalo, datas):
+    """
+    Amplia o intervalo [primeira, última] com as datas válidas da série
+    """
+    primeira, ultima = datas.min(), datas.max()
+    if pd.isna(primeira):
+        return
+    if intervalo[0] is None or primeira < intervalo[0]:
+        intervalo[0] = primeira
+    if intervalo[1] is None or ultima > intervalo[1]:
+        intervalo[1] = ultima
+
+def filtrar_linhas_csv(df, data_inicio=None, data_fim=None, mostrar_progresso=True, intervalo=None):
+    """
+    Aplica ao CSV (ou a um bloco dele) os filtros de histórico 51,
+    QTDE REAL positiva e período. intervalo ([primeira, última]) recebe as
+    datas das linhas antes do recorte do período
+    """
+    # FILTRO CRÍTICO: APENAS HISTÓRICO 51
+    if 'HISTÓRICO' in df.columns:
+        # Converte histórico para numérico e filtra apenas 51
+        df['HISTÓRICO'] = pd.to_numeric(df['HISTÓRICO'], errors='coerce')
+        df = df[df['HISTÓRICO'] == HISTORICO_CONFERENCIA]
+        if mostrar_progresso:
+            mostrar(f"   ✅ CSV filtrado - apenas histórico 51: {len(df)} notas")
+    
+    # FILTRO ADICIONAL: APENAS LINHAS COM QTDE REAL POSITIVA
+    if 'PESO' in df.columns:
+        df['PESO_LIMPO'] = limpar_serie_numerica(df['PESO'])
+        if _DIAGNOSTICO is not None:
+            _DIAGNOSTICO.registrar_limpeza('CSV QTDE REAL', df['PESO'], df['PESO_LIMPO'], limpar_valor_numerico, 100000)
+        # Remove TODAS as linhas com valores negativos ou zero
+        df = df[df['PESO_LIMPO'] > 0]
+        if mostrar_progresso:
+            mostrar(f"   ✅ CSV filtrado - apenas QTDE REAL positiva: {len(df)} notas")
+    
+    if (data_inicio or data_fim) and 'DATA' in df.columns:
+        df['DATA'] = pd.to_datetime(df['DATA'], dayfirst=True, errors='coerce')
+        if intervalo is not None:
+            ampliar_intervalo(intervalo, df['DATA'])
         
-        df_expedicao = df_expedicao.dropna(subset=['NF'])
-        
-        status_validos = ['ENTREGUE', 'EM ROTA', 'DEVOLUÇÃO']
-        df_expedicao_filtrado = df_expedicao[df_expedicao['STATUS'].isin(status_validos)].copy()
-        
-        operacoes_vog = ['VOG', 'VOG 2ºSAIDA', 'VOG 2 SAIDA', 'VOG 2SAIDA', 'VOG 2º SAIDA']
-        df_expedicao_filtrado = df_expedicao_filtrado[
-            df_expedicao_filtrado['OPERAÇÃO'].isin(operacoes_vog)
-        ]
-        
-        df_expedicao_filtrado['NF'] = df_expedicao_filtrado['NF'].apply(formatar_nota_fiscal)
+        if data_inicio:
+            df = df[df['DATA'] >= data_inicio]
+        if data_fim:
+            data_fim_ajustada = data_fim + pd.Timedelta(days=1)
+            df = df[df['DATA'] < data_fim_ajustada]
+    
+    return df
+
+# Na leitura inteira o pandas infere o tipo destas colunas e o texto que
+# chega à nota fiscal e à limpeza dos valores depende dele (123456 lido como
+# número perde os zeros à esquerda; com vazios vira 123456.0). A leitura em
+# blocos lê tudo como texto, acompanha o que a inferência concluiria sobre o
+# arquivo inteiro e converte no fim, para os dois modos darem o mesmo texto
+COLUNAS_TIPO_INFERIDO_CSV = ['NOTA FISCAL', 'PESO', 'TOTAL']
+
+def acumular_tipos_csv(bloco, tipos):
+    """
+    Atualiza, com um bloco lido como texto (antes dos filtros), o que a
+    inferência do pandas concluiria de cada coluna: se todos os valores são
+    números, se há vazios e se todos são inteiros
+    """
+    for coluna in COLUNAS_TIPO_INFERIDO_CSV:
+        if coluna not in bloco.columns:
+            continue
+        estado = tipos.setdefault(coluna, {'numerica': True, 'vazios': False, 'inteira': True})
+        if not estado['numerica']:
+            continue
         
-        if 'DATA' in df_expedicao_filtrado.columns:
-            df_expedicao_filtrado['DATA_EXPEDICAO'] = pd.to_datetime(df_expedicao_filtrado['DATA'], errors='coerce')
-            
-            if data_inicio or data_fim:
-                if data_inicio:
-                    df_expedicao_filtrado = df_expedicao_filtrado[df_expedicao_filtrado['DATA_EXPEDICAO'] >= data_inicio]
-                if data_fim:
-                    data_fim_ajustada = data_fim + pd.Timedelta(days=1)
-                    df_expedicao_filtrado = df_expedicao_filtrado[df_expedicao_filtrado['DATA_EXPEDICAO'] < data_fim_ajustada]
-        else:
-            df_expedicao_filtrado['DATA_EXPEDICAO'] = None
+        preenchidos = bloco[coluna].dropna()
+        if pd.to_numeric(preenchidos, errors='coerce').isna().any():
+            estado['numerica'] = False
+            continue
+        estado['vazios'] = estado['vazios'] or len(preenchidos) < len(bloco)
+        estado['inteira'] = estado['inteira'] and bool(preenchidos.str.fullmatch(r'\s*[+-]?[0-9]+\s*').all())
+
+def aplicar_tipos_csv(df, tipos):
+    """
+    Converte as colunas lidas como texto para o tipo que a leitura inteira
+    teria inferido e refaz o PESO_LIMPO, que depende do texto
+    """
+    for coluna, estado in tipos.items():
+        if not estado['numerica'] or coluna not in df.columns:
+            continue
+        numeros = pd.to_numeric(df[coluna])
+        df[coluna] = numeros.astype(np.int64) if estado['inteira'] and not estado['vazios'] else numeros.astype(np.float64)
+    if 'PESO_LIMPO' in df.columns and tipos.get('PESO', {}).get('numerica'):
+        df['PESO_LIMPO'] = limpar_serie_numerica(df['PESO'])
+    return df
+
+def _ler_csv_filtrado(perfil, data_inicio=None, data_fim=None, tamanho_bloco=None):
+    """
+    Lê o CSV uma única vez com o perfil detectado, inteiro ou em blocos
+    de tamanho_bloco linhas. As datas das linhas que passam pelos outros
+    filtros ficam em perfil['intervalo_datas']
+    """
+    perfil['intervalo_datas'] = intervalo = [None, None]
+    with ArquivoCSVTolerante(perfil['caminho'], perfil['encoding']) as arquivo:
+        if not tamanho_bloco:
+            # Lê todo o CSV
+            df = pd.read_csv(arquivo, sep=perfil['separador'], usecols=perfil['colunas_para_ler'])
+            informar_linhas_invalidas(arquivo)
+            perfil['hash'] = arquivo.resumo.hexdigest()
+            perfil['linhas_lidas'] = len(df)
+            df = df.rename(columns=perfil['renomear'])
+            return filtrar_linhas_csv(df, data_inicio, data_fim, intervalo=intervalo)
         
-        vog_limpo = df_expedicao_filtrado['VOG'].apply(limpar_valor_numerico)
-        valor_nf_limpo = df_expedicao_filtrado['R$ NF'].apply(limpar_valor_monetario)
+        # Leitura em blocos: cada bloco é filtrado assim que chega e só as linhas
+        # que sobrevivem ficam em memória. Tudo como texto para que a inferência de
+        # tipos não mude de um bloco para outro; o tipo do arquivo inteiro é
+        # aplicado no fim (acumular_tipos_csv)
+        blocos_mantidos = []
+        tipos = {}
+        linhas_lidas = 0
+        linhas_mantidas = 0
+        inicio = time.perf_counter()
         
-        print(f"   ✅ Expedição processada: {len(df_expedicao_filtrado)} notas VOG")
+        leitor = pd.read_csv(
+            arquivo,
+            sep=perfil['separador'],
+            usecols=perfil['colunas_para_ler'],
+            dtype=str,
+            chunksize=tamanho_bloco
+        )
+        with leitor:
+            for bloco in leitor:
+                linhas_lidas += len(bloco)
+                bloco = bloco.rename(columns=perfil['renomear'])
+                acumular_tipos_csv(bloco, tipos)
+                bloco = filtrar_linhas_csv(bloco, data_inicio, data_fim, mostrar_progresso=False, intervalo=intervalo)
+                linhas_mantidas += len(bloco)
+                if not bloco.empty:
+                    blocos_mantidos.append(bloco)
+                
+                decorrido = max(time.perf_counter() - inicio, 1e-9)
+                mostrar(f"   ⏳ {linhas_lidas} linhas lidas, {linhas_mantidas} mantidas "
+                        f"({linhas_lidas / decorrido:,.0f} lidas/s, {linhas_mantidas / decorrido:,.0f} mantidas/s)", NIVEL_DETALHADO)
         
-    except Exception as e:
-        print(f"❌ Erro ao ler planilha de expedição: {e}")
-        return
+        informar_linhas_invalidas(arquivo)
+        perfil['hash'] = arquivo.resumo.hexdigest()
+        perfil['linhas_lidas'] = linhas_lidas
     
-    # Lê o arquivo CSV (AGORA APENAS COM HISTÓRICO 51 E QTDE REAL POSITIVA)
-    print("   📋 Lendo arquivo CSV...")
-    df_csv = ler_csv_com_cabecalho(caminho_csv, data_inicio, data_fim)
+    if blocos_mantidos:
+        df = aplicar_tipos_csv(pd.concat(blocos_mantidos), tipos)
+    else:
+        df = filtrar_linhas_csv(
+            pd.DataFrame(columns=perfil['colunas_para_ler'], dtype=str).rename(columns=perfil['renomear']),
+            data_inicio, data_fim, mostrar_progresso=False
+        )
     
-    if df_csv is None or df_csv.empty:
-        print("❌ Não foi possível ler o arquivo CSV ou nenhum dado com histórico 51 e QTDE REAL positiva encontrado")
-        return
+    decorrido = time.perf_counter() - inicio
+    mostrar(f"   ✅ CSV filtrado em blocos (histórico 51 + QTDE REAL positiva): "
+            f"{linhas_mantidas} de {linhas_lidas} linhas mantidas em {decorrido:.1f}s")
+    return df
+
+def ler_csv_com_cabecalho(caminho, data_inicio=None, data_fim=None, tamanho_bloco=None, perfil=None):
+    """
+    Lê o CSV detectando automaticamente o cabeçalho e filtrando por data
+    E APENAS NOTAS COM HISTÓRICO 51
     
+    Com tamanho_bloco o arquivo é lido em blocos e filtrado à medida que é lido,
+    então a memória fica limitada às linhas mantidas e não ao tamanho do arquivo.
+    Um perfil já detectado (detectar_perfil_csv) pode ser passado para reaproveitar
+    a detecção de codificação, separador e colunas; ao fim da leitura ele
+    recebe o hash do conteúdo lido
+    """
+    try:
+        if perfil is None:
+            with medir_etapa('detectar_perfil'):
+                perfil = detectar_perfil_csv(caminho)
+        with medir_etapa('ler_filtrar') as medida:
+            df = _ler_csv_filtrado(perfil, data_inicio, data_fim, tamanho_bloco)
+            medida['linhas_entrada'] = perfil.get('linhas_lidas')
+            medida['linhas_saida'] = len(df)
+        return df
+        
+    except Exception as e:
+        mostrar(f"❌ Erro ao ler CSV: {e}", NIVEL_SILENCIOSO)
+        return None
+
+def preparar_linhas_csv(df_csv):
+    """
+    Normaliza a nota fiscal e calcula PESO/TOTAL de comparação e a data
+    das linhas do CSV que passaram pelos filtros
+    """
     df_csv = df_csv.dropna(subset=['NOTA FISCAL'])
-    df_csv['NOTA FISCAL'] = df_csv['NOTA FISCAL'].apply(formatar_nota_fiscal)
+    antes_mb = _memoria_mb(df_csv) if _medindo_memoria() else None
+    df_csv['NOTA FISCAL'] = formatar_serie_nota_fiscal(df_csv['NOTA FISCAL'])
     
     # Usa o PESO_LIMPO que já foi calculado na função ler_csv_com_cabecalho
-    peso_limpo = df_csv['PESO_LIMPO'] if 'PESO_LIMPO' in df_csv.columns else df_csv['PESO'].apply(limpar_valor_numerico)
-    total_limpo = df_csv['TOTAL'].apply(limpar_valor_monetario)
+    peso_limpo = df_csv['PESO_LIMPO'] if 'PESO_LIMPO' in df_csv.columns else limpar_serie_numerica(df_csv['PESO'])
+    total_limpo = limpar_serie_monetaria(df_csv['TOTAL'])
+    if _DIAGNOSTICO is not None:
+        _DIAGNOSTICO.registrar_limpeza('CSV FAT BRUTO', df_csv['TOTAL'], total_limpo, limpar_valor_monetario, 1000000)
     
     df_csv['PESO_COMPARACAO'] = peso_limpo
     df_csv['TOTAL_COMPARACAO'] = total_limpo
@@ -476,224 +1888,2476 @@ def processar_planilhas():
     else:
         df_csv['DATA_CSV'] = None
     
+    # Texto colunar para o que só é lido de volta e chave inteira para o
+    # agrupamento e o merge. Os valores limpos continuam float64: em float32
+    # a resolução perto de 1.000.000 passa da tolerância de 0,014
+    df_csv['PESO'] = df_csv['PESO'].astype(TIPO_TEXTO_COLUNAR)
+    df_csv['TOTAL'] = df_csv['TOTAL'].astype(TIPO_TEXTO_COLUNAR)
+    colunas = ['NOTA FISCAL', 'PESO', 'TOTAL', 'DATA_CSV', 'PESO_COMPARACAO', 'TOTAL_COMPARACAO']
+    chave = chave_nota_fiscal(df_csv['NOTA FISCAL'])
+    if chave is not None:
+        df_csv['NF_CHAVE'] = chave
+        colunas.append('NF_CHAVE')
+    
+    df_linhas = df_csv[colunas]
+    if antes_mb is not None:
+        informar_economia_memoria('Linhas do CSV', antes_mb, _memoria_mb(df_linhas))
+    return df_linhas
+
+def agrupar_por_nota_fiscal(df_linhas):
+    """
+    Agrupa as linhas do CSV por nota fiscal somando PESO e TOTAL de comparação
+    """
     # AGRUPAMENTO POR NOTA FISCAL - SOMANDO APENAS VALORES POSITIVOS (já filtrados)
-    df_agrupado = df_csv.groupby('NOTA FISCAL').agg({
+    # A chave inteira tem a mesma ordem do texto, então o resultado sai igual
+    if 'NF_CHAVE' in df_linhas.columns:
+        return df_linhas.groupby('NF_CHAVE').agg({
+            'NOTA FISCAL': 'first',
+            'PESO': 'first',
+            'TOTAL': 'first',
+            'DATA_CSV': 'first',
+            'PESO_COMPARACAO': 'sum',
+            'TOTAL_COMPARACAO': 'sum'
+        }).reset_index()
+    
+    return df_linhas.groupby('NOTA FISCAL').agg({
         'PESO': 'first',
         'TOTAL': 'first',
         'DATA_CSV': 'first',
         'PESO_COMPARACAO': 'sum',  # Soma apenas os valores positivos (já filtrados)
         'TOTAL_COMPARACAO': 'sum'  # Soma apenas os valores positivos (já filtrados)
     }).reset_index()
+
+def _formatar_data_parametro(data):
+    """
+    Representa uma data de filtro nos parâmetros do cache
+    """
+    return data.strftime('%Y-%m-%d') if data else None
+
+def _periodo_contem(parametros, data_inicio, data_fim):
+    """
+    Indica se o período gravado em parametros contém o período pedido
+    (None é período aberto)
+    """
+    inicio = _formatar_data_parametro(data_inicio)
+    fim = _formatar_data_parametro(data_fim)
+    inicio_ok = parametros['data_inicio'] is None or (inicio is not None and parametros['data_inicio'] <= inicio)
+    fim_ok = parametros['data_fim'] is None or (fim is not None and fim <= parametros['data_fim'])
+    return inicio_ok and fim_ok
+
+def recortar_periodo_csv(df_linhas, data_inicio=None, data_fim=None):
+    """
+    Aplica o filtro de período às linhas já preparadas do CSV
+    """
+    if not pd.api.types.is_datetime64_any_dtype(df_linhas['DATA_CSV']):
+        return df_linhas
     
-    print(f"   ✅ CSV agrupado: {len(df_agrupado)} notas únicas (histórico 51 + QTDE REAL positiva - valores somados)")
-    
-    # DEBUG: Mostrar algumas notas para verificar se os valores estão corretos
-    print("\n   🔍 VERIFICAÇÃO DE VALORES (amostra):")
-    for i, row in df_agrupado.head(5).iterrows():
-        print(f"      NF {row['NOTA FISCAL']}: PESO_COMPARACAO = {row['PESO_COMPARACAO']}, TOTAL_COMPARACAO = {row['TOTAL_COMPARACAO']}")
-    
-    # Realiza o merge das planilhas
-    df_comparacao = pd.merge(
-        df_expedicao_filtrado,
-        df_agrupado,
-        left_on='NF',
-        right_on='NOTA FISCAL',
-        how='left',
-        indicator=True
+    if data_inicio:
+        df_linhas = df_linhas[df_linhas['DATA_CSV'] >= data_inicio]
+    if data_fim:
+        data_fim_ajustada = data_fim + pd.Timedelta(days=1)
+        df_linhas = df_linhas[df_linhas['DATA_CSV'] < data_fim_ajustada]
+    return df_linhas
+
+def _parametros_linhas_csv(data_inicio=None, data_fim=None):
+    """
+    Parâmetros que identificam as linhas do CSV guardadas no cache
+    """
+    return {
+        'historico': HISTORICO_CONFERENCIA,
+        'somente_positivos': True,
+        'versao': VERSAO_DADOS_CACHE,
+        'esquemas': ASSINATURA_ESQUEMAS_CSV,
+        'data_inicio': _formatar_data_parametro(data_inicio),
+        'data_fim': _formatar_data_parametro(data_fim)
+    }
+
+def buscar_linhas_csv_cache(caminho, data_inicio=None, data_fim=None):
+    """
+    Procura no cache as linhas do CSV de um período que contenha o pedido
+    e devolve já recortadas, ou None
+    """
+    df_linhas, _ = buscar_cache(
+        'csv_linhas', caminho, _parametros_linhas_csv(data_inicio, data_fim),
+        aceita_parametros=lambda gravados: (
+            gravados['historico'] == HISTORICO_CONFERENCIA
+            and gravados['somente_positivos']
+            and gravados.get('versao') == VERSAO_DADOS_CACHE
+            and gravados.get('esquemas') == ASSINATURA_ESQUEMAS_CSV
+            and _periodo_contem(gravados, data_inicio, data_fim)
+        )
     )
+    if df_linhas is None:
+        return None
+    mostrar(f"   ⚡ CSV carregado do cache local: {os.path.basename(caminho)}")
+    return recortar_periodo_csv(df_linhas, data_inicio, data_fim)
+
+# Catálogo do período de cada CSV: o intervalo de DATA medido na última
+# leitura do arquivo (enquanto ele não muda) ou, antes disso, o período do
+# nome (fechamento-20251101-20251110.csv). Um CSV todo fora do período pedido
+# não é aberto nem buscado no cache
+ARQUIVO_CATALOGO_CSV = DIRETORIO_CACHE / 'catalogo_csv.json'
+MAX_ENTRADAS_CATALOGO = 1000
+PADRAO_PERIODO_NOME_CSV = re.compile(r'(?<!\d)(\d{8})\D+(\d{8})(?!\d)')
+
+def periodo_nome_csv(caminho):
+    """
+    Período ([início, fim] em ISO) escrito no nome do arquivo como
+    AAAAMMDD-AAAAMMDD, ou None se o nome não tiver um período válido
+    """
+    encontrado = PADRAO_PERIODO_NOME_CSV.search(os.path.basename(caminho))
+    if not encontrado:
+        return None
+    try:
+        inicio, fim = (datetime.strptime(texto, '%Y%m%d') for texto in encontrado.groups())
+    except ValueError:
+        return None
+    if fim < inicio:
+        return None
+    return [inicio.isoformat(), fim.isoformat()]
+
+def periodo_csv(caminho, usar_cache=True):
+    """
+    Intervalo de datas do CSV e de onde ele veio: ('dados', [primeira, última]
+    ou None se não há datas), ('nome', [início, fim]) ou (None, None)
+    """
+    if usar_cache:
+        registro, atual = _registro_atual(ARQUIVO_CATALOGO_CSV, caminho, os.stat(caminho))
+        if atual:
+            return 'dados', registro['datas']
+    intervalo = periodo_nome_csv(caminho)
+    return ('nome', intervalo) if intervalo else (None, None)
+
+def registrar_periodo_csv(caminho, estado_origem, intervalo):
+    """
+    Guarda no catálogo o intervalo de datas medido na leitura do CSV
+    (intervalo None: desconhecido, nada é guardado)
+    """
+    if intervalo is None:
+        return
+    datas = None if intervalo[0] is None else [pd.Timestamp(data).isoformat() for data in intervalo]
+    try:
+        _guardar_registro_arquivo(ARQUIVO_CATALOGO_CSV, caminho, estado_origem, MAX_ENTRADAS_CATALOGO, datas=datas)
+    except Exception as e:
+        mostrar(f"   ⚠️ Não foi possível guardar o período do CSV: {e}", NIVEL_SILENCIOSO)
+
+def csv_no_periodo(caminho, data_inicio=None, data_fim=None, usar_cache=True):
+    """
+    Indica se o CSV pode ter linhas no período pedido; sem intervalo conhecido
+    o arquivo é lido
+    """
+    if not (data_inicio or data_fim):
+        return True
+    origem, intervalo = periodo_csv(caminho, usar_cache)
+    if origem is None or periodo_sobrepoe(intervalo, data_inicio, data_fim):
+        return True
     
-    df_csv_sem_expedicao = pd.merge(
-        df_agrupado,
-        df_expedicao_filtrado,
-        left_on='NOTA FISCAL',
-        right_on='NF',
-        how='left',
-        indicator=True
-    )
-    nfs_csv_sem_expedicao = df_csv_sem_expedicao[df_csv_sem_expedicao['_merge'] == 'left_only']
+    if intervalo is None:
+        mostrar(f"   ⏭️ {os.path.basename(caminho)}: sem datas, ignorado")
+    else:
+        primeira, ultima = (pd.Timestamp(data).strftime('%d/%m/%Y') for data in intervalo)
+        mostrar(f"   ⏭️ {os.path.basename(caminho)}: {primeira} a {ultima}{' (pelo nome)' if origem == 'nome' else ''}, fora do período")
+    return False
+
+TAMANHO_BLOCO_COPIA = 8 * 1024 * 1024
+
+def eh_caminho_de_rede(caminho):
+    """
+    Indica se o arquivo está em um compartilhamento de rede: caminho UNC
+    (\\\\servidor\\pasta) ou, no Windows, unidade mapeada (Z:, S:)
+    """
+    caminho = os.path.abspath(caminho)
+    if caminho.startswith(('\\\\', '//')):
+        return True
+    if sys.platform == 'win32':
+        import ctypes
+        unidade = os.path.splitdrive(caminho)[0]
+        # 4 = DRIVE_REMOTE
+        return bool(unidade) and ctypes.windll.kernel32.GetDriveTypeW(unidade + '\\') == 4
+    return False
+
+def copiar_para_local(caminho, pasta, tamanho_bloco=TAMANHO_BLOCO_COPIA):
+    """
+    Copia o arquivo em blocos grandes para a pasta local informada, calculando
+    o hash do conteúdo no caminho; devolve o caminho da cópia e o hash.
+    A leitura do CSV em blocos pequenos fica na cópia local, e não na rede
+    """
+    destino = os.path.join(pasta, os.path.basename(caminho))
+    resumo = hashlib.blake2b(digest_size=20)
+    inicio = time.perf_counter()
+    with open(caminho, 'rb') as origem, open(destino, 'wb') as copia:
+        for bloco in iter(lambda: origem.read(tamanho_bloco), b''):
+            resumo.update(bloco)
+            copia.write(bloco)
+    tamanho_mb = os.path.getsize(destino) / 1024 ** 2
+    mostrar(f"   📥 {os.path.basename(caminho)}: {tamanho_mb:,.1f} MB copiados da rede em {time.perf_counter() - inicio:.1f}s", NIVEL_DETALHADO)
+    return destino, resumo.hexdigest()
+
+def ler_linhas_csv(caminho, data_inicio=None, data_fim=None, tamanho_bloco=TAMANHO_BLOCO_CSV):
+    """
+    Lê, filtra e prepara as linhas de um CSV sem passar pelo cache.
+    Devolve (linhas, os.stat tirado antes da leitura, hash do conteúdo,
+    intervalo de datas do arquivo para o catálogo); é a função executada por
+    cada processo na leitura em paralelo.
+    Um CSV em compartilhamento de rede é antes copiado para uma pasta temporária
+    """
+    estado_origem = os.stat(caminho)
+    if not eh_caminho_de_rede(caminho):
+        return _ler_linhas_csv_local(caminho, data_inicio, data_fim, tamanho_bloco, estado_origem)
     
-    # Identifica divergências
-    resultados = []
-    problemas_por_linha = {}
+    with tempfile.TemporaryDirectory(prefix='averiguar_') as pasta:
+        try:
+            with medir_etapa('copiar_local'):
+                copia, hash_conteudo = copiar_para_local(caminho, pasta)
+        except OSError as e:
+            mostrar(f"❌ Erro ao copiar CSV da rede: {e}", NIVEL_SILENCIOSO)
+            return None, estado_origem, None, None
+        df_linhas, _, _, intervalo = _ler_linhas_csv_local(copia, data_inicio, data_fim, tamanho_bloco, estado_origem)
+    return df_linhas, estado_origem, hash_conteudo, intervalo
+
+def _ler_linhas_csv_local(caminho, data_inicio, data_fim, tamanho_bloco, estado_origem):
+    """
+    Leitura de ler_linhas_csv a partir de um arquivo local
+    """
+    try:
+        with medir_etapa('detectar_perfil'):
+            perfil = detectar_perfil_csv(caminho)
+    except Exception as e:
+        mostrar(f"❌ Erro ao ler CSV: {e}", NIVEL_SILENCIOSO)
+        return None, estado_origem, None, None
     
-    for index, row in df_comparacao.iterrows():
-        nf = row['NF']
-        vog_expedicao = vog_limpo.iloc[index] if index < len(vog_limpo) else 0
-        valor_nf_expedicao = valor_nf_limpo.iloc[index] if index < len(valor_nf_limpo) else 0
-        peso_csv = row['PESO_COMPARACAO'] if 'PESO_COMPARACAO' in row and not pd.isna(row['PESO_COMPARACAO']) else 0
-        total_csv = row['TOTAL_COMPARACAO'] if 'TOTAL_COMPARACAO' in row and not pd.isna(row['TOTAL_COMPARACAO']) else 0
-        status = row['STATUS']
-        operacao = row['OPERAÇÃO'] if 'OPERAÇÃO' in row else ''
-        merge_status = row['_merge']
-        
-        data_expedicao = None
-        data_csv = None
-        
-        if 'DATA_EXPEDICAO' in row and not pd.isna(row['DATA_EXPEDICAO']):
-            data_expedicao = row['DATA_EXPEDICAO']
-        
-        if 'DATA_CSV' in row and not pd.isna(row['DATA_CSV']):
-            data_csv = row['DATA_CSV']
-        
-        problemas_linha = []
-        
-        if merge_status == 'left_only':
-            problemas_linha.append({'tipo': 'nf_nao_encontrada', 'descricao': 'NF não encontrada no CSV (histórico 51 + QTDE REAL positiva)'})
-        else:
-            # AGORA COM TOLERÂNCIA DE 0,014
-            if not comparar_valores_com_tolerancia(vog_expedicao, peso_csv, 0.014):
-                problemas_linha.append({'tipo': 'peso_divergente', 'descricao': f"PESO divergente: Expedição={vog_expedicao} vs CSV={peso_csv}"})
-            
-            # AGORA COM TOLERÂNCIA DE 0,014
-            if not comparar_valores_com_tolerancia(valor_nf_expedicao, total_csv, 0.014):
-                problemas_linha.append({'tipo': 'valor_divergente', 'descricao': f"VALOR divergente: Expedição={valor_nf_expedicao} vs CSV={total_csv}"})
-        
-        if pd.notna(row['VOG']):
-            vog_original = str(row['VOG'])
-            if vog_original.count(',') > 1 or (',' in vog_original and '.' in vog_original.split(',')[0]):
-                problemas_linha.append({'tipo': 'erro_digitacao_vog', 'descricao': f"Erro digitação VOG"})
-        
-        if pd.notna(row['R$ NF']):
-            valor_original = str(row['R$ NF'])
-            if valor_original.count(',') > 1 or (',' in valor_original and '.' in valor_original.split(',')[0]):
-                problemas_linha.append({'tipo': 'erro_digitacao_valor', 'descricao': f"Erro digitação VALOR"})
-        
-        if problemas_linha:
-            nf_inteiro = converter_para_inteiro_nota_fiscal(nf)
-            peso_csv_float = float(peso_csv) if peso_csv else 0.0
-            total_csv_float = float(total_csv) if total_csv else 0.0
-            
-            resultados.append({
-                'NF': nf_inteiro,
-                'DATA_EXPEDICAO': data_expedicao,
-                'DATA_CSV': data_csv,
-                'STATUS': status,
-                'OPERAÇÃO': operacao,
-                'VOG_Expedição': row['VOG'],
-                'PESO_CSV': peso_csv_float,
-                'R$ NF_Expedição': row['R$ NF'],
-                'TOTAL_CSV': total_csv_float
-            })
-            
-            problemas_por_linha[len(resultados)-1] = problemas_linha
+    df_csv = ler_csv_com_cabecalho(caminho, data_inicio, data_fim, tamanho_bloco=tamanho_bloco, perfil=perfil)
+    if df_csv is None:
+        return None, estado_origem, None, None
     
-    for index, row in nfs_csv_sem_expedicao.iterrows():
-        nf = row['NOTA FISCAL']
-        data_csv = row['DATA_CSV'] if 'DATA_CSV' in row and not pd.isna(row['DATA_CSV']) else None
-        
-        peso_csv = row['PESO'] if 'PESO' in row else ''
-        total_csv = row['TOTAL'] if 'TOTAL' in row else ''
-        
-        nf_inteiro = converter_para_inteiro_nota_fiscal(nf)
-        peso_csv_float = limpar_valor_numerico(peso_csv) if peso_csv else 0.0
-        total_csv_float = limpar_valor_monetario(total_csv) if total_csv else 0.0
-        
-        resultados.append({
-            'NF': nf_inteiro,
-            'DATA_EXPEDICAO': None,
-            'DATA_CSV': data_csv,
-            'STATUS': 'N/A',
-            'OPERAÇÃO': 'N/A',
-            'VOG_Expedição': 'N/A',
-            'PESO_CSV': peso_csv_float,
-            'R$ NF_Expedição': 'N/A',
-            'TOTAL_CSV': total_csv_float
-        })
-        
-        problemas_por_linha[len(resultados)-1] = [{'tipo': 'nf_nao_encontrada', 'descricao': 'NF do CSV (histórico 51 + QTDE REAL positiva) não encontrada no expedição'}]
+    with medir_etapa('preparar', len(df_csv)) as medida:
+        df_linhas = preparar_linhas_csv(df_csv)
+        medida['linhas_saida'] = len(df_linhas)
     
-    # Cria relatório final
-    if resultados:
-        df_relatorio = pd.DataFrame(resultados)
-        
-        colunas_ordenadas = [
-            'NF', 'DATA_EXPEDICAO', 'DATA_CSV', 'STATUS', 'OPERAÇÃO', 
-            'VOG_Expedição', 'PESO_CSV', 'R$ NF_Expedição', 'TOTAL_CSV'
-        ]
-        colunas_ordenadas = [col for col in colunas_ordenadas if col in df_relatorio.columns]
-        df_relatorio = df_relatorio[colunas_ordenadas]
-        
-        downloads_path = str(Path.home() / "Downloads")
-        caminho_relatorio = os.path.join(downloads_path, "RELATORIO_DIVERGENCIAS.xlsx")
-        
-        with pd.ExcelWriter(caminho_relatorio, engine='openpyxl') as writer:
-            df_relatorio.to_excel(writer, index=False, sheet_name='Divergências')
-            worksheet = writer.sheets['Divergências']
-            
-            date_columns = ['DATA_EXPEDICAO', 'DATA_CSV']
-            for col_idx, col_name in enumerate(df_relatorio.columns):
-                if col_name in date_columns:
-                    col_letter = chr(65 + col_idx)
-                    for row in range(2, len(df_relatorio) + 2):
-                        cell = worksheet[f'{col_letter}{row}']
-                        if cell.value and not pd.isna(cell.value):
-                            cell.number_format = 'DD/MM/YYYY'
-            
-            for col_idx, col_name in enumerate(df_relatorio.columns):
-                if col_name == 'NF':
-                    col_letter = chr(65 + col_idx)
-                    for row in range(2, len(df_relatorio) + 2):
-                        cell = worksheet[f'{col_letter}{row}']
-                        cell.number_format = '0'
-            
-            float_columns = ['PESO_CSV', 'TOTAL_CSV']
-            for col_idx, col_name in enumerate(df_relatorio.columns):
-                if col_name in float_columns:
-                    col_letter = chr(65 + col_idx)
-                    for row in range(2, len(df_relatorio) + 2):
-                        cell = worksheet[f'{col_letter}{row}']
-                        cell.number_format = '#,##0.00'
-            
-            aplicar_estilo_erros(worksheet, df_relatorio, problemas_por_linha)
-            
-            for column in worksheet.columns:
-                max_length = 0
-                column_letter = column[0].column_letter
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = min(max_length + 2, 50)
-                worksheet.column_dimensions[column_letter].width = adjusted_width
-        
-        # RESUMO FINAL SIMPLIFICADO
-        print(f"\n✅ RELATÓRIO CONCLUÍDO")
-        print(f"📁 Salvo em: {caminho_relatorio}")
-        print(f"📊 Total de divergências: {len(resultados)}")
-        
-        tipos_problemas = {}
-        for problemas in problemas_por_linha.values():
-            for problema in problemas:
-                tipo = problema['tipo']
-                tipos_problemas[tipo] = tipos_problemas.get(tipo, 0) + 1
-        
-        print("\n🔍 RESUMO DE PROBLEMAS:")
-        if 'nf_nao_encontrada' in tipos_problemas:
-            print(f"   🔴 NFs não encontradas: {tipos_problemas['nf_nao_encontrada']}")
-        if 'peso_divergente' in tipos_problemas:
-            print(f"   🔴 Divergências de PESO: {tipos_problemas['peso_divergente']}")
-        if 'valor_divergente' in tipos_problemas:
-            print(f"   🔴 Divergências de VALOR: {tipos_problemas['valor_divergente']}")
-        if 'erro_digitacao_vog' in tipos_problemas:
-            print(f"   🟡 Erros digitação VOG: {tipos_problemas['erro_digitacao_vog']}")
-        if 'erro_digitacao_valor' in tipos_problemas:
-            print(f"   🟡 Erros digitação VALOR: {tipos_problemas['erro_digitacao_valor']}")
-            
+    # Intervalo de datas do arquivo inteiro: com período vem da filtragem
+    # (antes do recorte), sem período das próprias linhas. Sem coluna DATA
+    # o período não filtra nada e o intervalo fica desconhecido
+    if not pd.api.types.is_datetime64_any_dtype(df_linhas['DATA_CSV']):
+        intervalo = None
+    elif data_inicio or data_fim:
+        intervalo = perfil['intervalo_datas']
     else:
-        print("\n✅ Nenhuma divergência encontrada!")
+        intervalo = [None, None]
+        ampliar_intervalo(intervalo, df_linhas['DATA_CSV'])
+    return df_linhas, estado_origem, perfil.get('hash'), intervalo
+
+def carregar_linhas_csv(caminho, data_inicio=None, data_fim=None, tamanho_bloco=TAMANHO_BLOCO_CSV, usar_cache=True):
+    """
+    Devolve as linhas do CSV filtradas e preparadas para o agrupamento.
+    O resultado fica no cache local junto com os filtros usados; um período
+    contido em outro já lido só recorta o que está no cache, sem reler o CSV
+    """
+    if usar_cache:
+        df_linhas = buscar_linhas_csv_cache(caminho, data_inicio, data_fim)
+        if df_linhas is not None:
+            return df_linhas
     
-    # Estatísticas rápidas
-    nfs_sem_match_expedicao = len(df_comparacao[df_comparacao['_merge'] == 'left_only'])
-    nfs_sem_match_csv = len(nfs_csv_sem_expedicao)
+    df_linhas, estado_origem, hash_conteudo, intervalo = ler_linhas_csv(caminho, data_inicio, data_fim, tamanho_bloco)
+    if df_linhas is not None and usar_cache:
+        gravar_cache('csv_linhas', caminho, _parametros_linhas_csv(data_inicio, data_fim), df_linhas, estado_origem, hash_conteudo)
+        registrar_periodo_csv(caminho, estado_origem, intervalo)
+    return df_linhas
+
+TOLERANCIA_COMPARACAO = 0.014
+
+# Ordem em que os problemas de uma linha são listados; os amarelos vêm depois
+# dos vermelhos para prevalecerem na mesma célula
+TIPOS_PROBLEMA = [
+    'nf_nao_encontrada', 'peso_divergente', 'valor_divergente',
+    'erro_digitacao_vog', 'erro_digitacao_valor', 'nf_repetida_expedicao'
+]
+
+def converter_serie_nota_fiscal_inteiro(notas):
+    """
+    Versão colunar de converter_para_inteiro_nota_fiscal para notas já formatadas
+    """
+    return pd.to_numeric(notas.where(notas != ''), errors='coerce').fillna(0).astype(np.int64)
+
+def marcar_erro_digitacao(valores):
+    """
+    Marca os valores digitados com mais de uma vírgula ou com ponto antes
+    da vírgula (ex.: 1.234,5,6 ou 1.234,56 digitado como texto)
+    """
+    preenchidos = valores[valores.notna()]
+    texto = preenchidos.astype(TIPO_TEXTO_COLUNAR)
+    suspeito = (texto.str.count(',') > 1) | texto.str.contains(r'^[^,]*\.[^,]*,', regex=True)
+    suspeito = pd.Series(suspeito.to_numpy(dtype=bool, na_value=False), index=preenchidos.index)
+    return suspeito.reindex(valores.index, fill_value=False).to_numpy(dtype=bool)
+
+def marcar_divergencias(df_comparacao, tolerancia=TOLERANCIA_COMPARACAO):
+    """
+    Marca cada tipo de problema nas linhas da comparação; devolve as marcas
+    (um array booleano por tipo) e os valores comparados
+    """
+    encontrada = (df_comparacao['_merge'] != 'left_only').to_numpy()
+    vog_expedicao = df_comparacao['VOG_LIMPO'].to_numpy(dtype=np.float64)
+    valor_nf_expedicao = df_comparacao['VALOR_NF_LIMPO'].to_numpy(dtype=np.float64)
+    peso_csv = df_comparacao['PESO_COMPARACAO'].fillna(0).to_numpy(dtype=np.float64)
+    total_csv = df_comparacao['TOTAL_COMPARACAO'].fillna(0).to_numpy(dtype=np.float64)
+    if 'LINHAS_NF' in df_comparacao.columns:
+        linhas_nf = df_comparacao['LINHAS_NF'].to_numpy(dtype=np.int64)
+    else:
+        linhas_nf = np.ones(len(df_comparacao), dtype=np.int64)
+    
+    # AGORA COM TOLERÂNCIA DE 0,014 (NaN nunca fica dentro da tolerância)
+    marcas = {
+        'nf_nao_encontrada': ~encontrada,
+        'peso_divergente': encontrada & ~(np.abs(vog_expedicao - peso_csv) <= tolerancia),
+        'valor_divergente': encontrada & ~(np.abs(valor_nf_expedicao - total_csv) <= tolerancia),
+        'erro_digitacao_vog': marcar_erro_digitacao(df_comparacao['VOG']),
+        'erro_digitacao_valor': marcar_erro_digitacao(df_comparacao['R$ NF']),
+        # A mesma NF em mais de uma linha: cada linha é comparada com o total do CSV
+        'nf_repetida_expedicao': linhas_nf > 1
+    }
+    return marcas, vog_expedicao, valor_nf_expedicao, peso_csv, total_csv
+
+def detectar_divergencias(df_comparacao, df_csv_sem_expedicao, tolerancia=TOLERANCIA_COMPARACAO, manter_indice=False):
+    """
+    Calcula os problemas de todas as linhas de uma vez, como colunas booleanas,
+    e devolve o relatório (só linhas com problema) e a tabela de problemas
+    com a linha do relatório, o tipo e a descrição de cada um.
+    Com manter_indice o relatório leva o índice das linhas de origem
+    """
+    marcas, vog_expedicao, valor_nf_expedicao, peso_csv, total_csv = marcar_divergencias(df_comparacao, tolerancia)
+    linhas_nf = df_comparacao['LINHAS_NF'] if 'LINHAS_NF' in df_comparacao.columns else pd.Series(1, index=df_comparacao.index)
+    com_problema = np.logical_or.reduce(list(marcas.values()))
+    
+    def selecionar(coluna):
+        return df_comparacao[coluna].to_numpy()[com_problema] if coluna in df_comparacao.columns else None
+    
+    relatorio_expedicao = pd.DataFrame({
+        'NF': converter_serie_nota_fiscal_inteiro(df_comparacao['NF']).to_numpy()[com_problema],
+        **({'ABA': selecionar('ABA')} if 'ABA' in df_comparacao.columns else {}),
+        'DATA_EXPEDICAO': selecionar('DATA_EXPEDICAO'),
+        'DATA_CSV': selecionar('DATA_CSV'),
+        'STATUS': selecionar('STATUS'),
+        'OPERAÇÃO': selecionar('OPERAÇÃO') if 'OPERAÇÃO' in df_comparacao.columns else '',
+        'VOG_Expedição': selecionar('VOG'),
+        'PESO_CSV': peso_csv[com_problema],
+        'R$ NF_Expedição': selecionar('R$ NF'),
+        'TOTAL_CSV': total_csv[com_problema]
+    })
+    
+    descricoes_expedicao = {
+        'nf_nao_encontrada': pd.Series('NF não encontrada no CSV (histórico 51 + QTDE REAL positiva)', index=df_comparacao.index),
+        'peso_divergente': "PESO divergente: Expedição=" + pd.Series(vog_expedicao).astype(str) + " vs CSV=" + pd.Series(peso_csv).astype(str),
+        'valor_divergente': "VALOR divergente: Expedição=" + pd.Series(valor_nf_expedicao).astype(str) + " vs CSV=" + pd.Series(total_csv).astype(str),
+        'erro_digitacao_vog': pd.Series('Erro digitação VOG', index=df_comparacao.index),
+        'erro_digitacao_valor': pd.Series('Erro digitação VALOR', index=df_comparacao.index),
+        'nf_repetida_expedicao': "NF repetida na expedição (" + linhas_nf.astype(str) + " linhas): cada linha comparada com o total do CSV"
+    }
+    
+    # Linha que cada linha da comparação ocupa no relatório
+    linha_relatorio = np.cumsum(com_problema) - 1
+    problemas = []
+    for ordem, tipo in enumerate(TIPOS_PROBLEMA):
+        marcadas = marcas[tipo]
+        problemas.append(pd.DataFrame({
+            'LINHA': linha_relatorio[marcadas],
+            'ORDEM': ordem,
+            'TIPO': tipo,
+            'DESCRICAO': descricoes_expedicao[tipo].to_numpy()[marcadas]
+        }))
+    
+    # NFs do CSV que não existem na expedição
+    relatorio_csv = pd.DataFrame({
+        'NF': converter_serie_nota_fiscal_inteiro(df_csv_sem_expedicao['NOTA FISCAL']).to_numpy(),
+        **({'ABA': 'N/A'} if 'ABA' in df_comparacao.columns else {}),
+        'DATA_EXPEDICAO': None,
+        'DATA_CSV': df_csv_sem_expedicao['DATA_CSV'].to_numpy() if 'DATA_CSV' in df_csv_sem_expedicao.columns else None,
+        'STATUS': 'N/A',
+        'OPERAÇÃO': 'N/A',
+        'VOG_Expedição': 'N/A',
+        'PESO_CSV': limpar_serie_numerica(df_csv_sem_expedicao['PESO']).to_numpy() if 'PESO' in df_csv_sem_expedicao.columns else 0.0,
+        'R$ NF_Expedição': 'N/A',
+        'TOTAL_CSV': limpar_serie_monetaria(df_csv_sem_expedicao['TOTAL']).to_numpy() if 'TOTAL' in df_csv_sem_expedicao.columns else 0.0
+    })
+    problemas.append(pd.DataFrame({
+        'LINHA': len(relatorio_expedicao) + np.arange(len(relatorio_csv)),
+        'ORDEM': 0,
+        'TIPO': 'nf_nao_encontrada',
+        'DESCRICAO': 'NF do CSV (histórico 51 + QTDE REAL positiva) não encontrada no expedição'
+    }))
+    
+    if manter_indice:
+        relatorio_expedicao.index = df_comparacao.index[com_problema]
+        relatorio_csv.index = df_csv_sem_expedicao.index
+    
+    df_relatorio = pd.concat([relatorio_expedicao, relatorio_csv], ignore_index=not manter_indice)
+    df_problemas = (
+        pd.concat(problemas, ignore_index=True)
+        .sort_values(['LINHA', 'ORDEM'], kind='stable')
+        .drop(columns='ORDEM')
+        .reset_index(drop=True)
+    )
+    return df_relatorio, df_problemas
+
+# Aproximação de notas: entre as notas que ficaram sem par dos dois lados,
+# propõe pares que diferem por um dígito (trocado, a mais ou a menos) ou por
+# dois dígitos vizinhos invertidos. Os candidatos saem de um índice de
+# remoções: cada nota entra com ela mesma e com cada versão sem um dos
+# dígitos, e duas notas a essa distância sempre têm uma dessas chaves em
+# comum, então um join pelas chaves substitui a comparação de todos os pares
+MIN_DIGITOS_APROXIMACAO = 4
+TOLERANCIA_RELATIVA_APROXIMACAO = 0.01
+MAX_CANDIDATOS_APROXIMACAO = 3
+CONFIANCA_APROXIMACAO = {4: 'alta', 3: 'média', 2: 'média', 1: 'baixa'}
+
+def chaves_remocao(notas):
+    """
+    Índice de remoções das notas: DataFrame (CHAVE, POSICAO) com cada nota
+    e cada versão dela sem um dos dígitos
+    """
+    texto = pd.Series(notas, dtype=object).reset_index(drop=True).astype(TIPO_TEXTO_COLUNAR)
+    tamanhos = texto.str.len().to_numpy(dtype=np.int64)
+    partes = [pd.DataFrame({'CHAVE': texto, 'POSICAO': np.arange(len(texto))})]
+    for posicao in range(int(tamanhos.max()) if len(tamanhos) else 0):
+        alcancadas = np.flatnonzero(tamanhos > posicao)
+        parte = texto.iloc[alcancadas]
+        partes.append(pd.DataFrame({
+            'CHAVE': (parte.str.slice(0, posicao) + parte.str.slice(posicao + 1)).to_numpy(),
+            'POSICAO': alcancadas
+        }))
+    # Dígitos repetidos ("1123") geram a mesma chave mais de uma vez
+    return pd.concat(partes, ignore_index=True).drop_duplicates()
+
+def classificar_diferenca_nota(nota_expedicao, nota_csv):
+    """
+    Diferença entre duas notas a um dígito de distância, ou None se estiverem
+    mais longe (duas chaves iguais no índice não garantem a distância)
+    """
+    if len(nota_expedicao) == len(nota_csv):
+        diferentes = [posicao for posicao, (a, b) in enumerate(zip(nota_expedicao, nota_csv)) if a != b]
+        if len(diferentes) == 1:
+            return 'dígito trocado'
+        if (len(diferentes) == 2 and diferentes[1] == diferentes[0] + 1
+                and nota_expedicao[diferentes[0]] == nota_csv[diferentes[1]]
+                and nota_expedicao[diferentes[1]] == nota_csv[diferentes[0]]):
+            return 'dígitos invertidos'
+        return None
+    
+    maior, menor = (nota_expedicao, nota_csv) if len(nota_expedicao) > len(nota_csv) else (nota_csv, nota_expedicao)
+    if len(maior) != len(menor) + 1:
+        return None
+    if not any(maior[:posicao] + maior[posicao + 1:] == menor for posicao in range(len(maior))):
+        return None
+    return 'dígito a mais na expedição' if maior is nota_expedicao else 'dígito a menos na expedição'
+
+def _valores_concordam(a, b, tolerancia):
+    """
+    Igualdade dentro da tolerância e proximidade relativa (NaN nunca concorda)
+    """
+    diferenca = np.abs(a - b)
+    iguais = diferenca <= tolerancia
+    proximos = iguais | (diferenca <= TOLERANCIA_RELATIVA_APROXIMACAO * np.maximum(np.abs(a), np.abs(b)))
+    return iguais, proximos
+
+def aproximar_notas_fiscais(df_comparacao, df_csv_sem_expedicao, tolerancia=TOLERANCIA_COMPARACAO):
+    """
+    Propõe, para as notas da expedição sem par no CSV, notas do CSV sem par
+    na expedição que parecem a mesma nota digitada errado. Só entram pares
+    em que o PESO ou o TOTAL batem (exatos ou a 1%), ordenados pela
+    concordância dos dois valores, com até MAX_CANDIDATOS_APROXIMACAO
+    candidatos por nota da expedição
+    """
+    colunas = [
+        'NF_EXPEDICAO', 'NF_CSV', 'DIFERENCA', 'CONFIANCA', 'DATA_EXPEDICAO', 'DATA_CSV',
+        'PESO_EXPEDICAO', 'PESO_CSV', 'VALOR_EXPEDICAO', 'TOTAL_CSV'
+    ]
+    sem_csv = df_comparacao[df_comparacao['_merge'] == 'left_only']
+    notas_expedicao = sem_csv['NF'].astype(str)
+    sem_csv = sem_csv[notas_expedicao.str.len() >= MIN_DIGITOS_APROXIMACAO].drop_duplicates('NF')
+    notas_csv = df_csv_sem_expedicao['NOTA FISCAL'].astype(str)
+    so_csv = df_csv_sem_expedicao[notas_csv.str.len() >= MIN_DIGITOS_APROXIMACAO]
+    if sem_csv.empty or so_csv.empty:
+        return pd.DataFrame(columns=colunas)
+    
+    candidatos = (
+        pd.merge(chaves_remocao(sem_csv['NF'].astype(str)), chaves_remocao(so_csv['NOTA FISCAL'].astype(str)),
+                 on='CHAVE', suffixes=('_EXPEDICAO', '_CSV'))
+        [['POSICAO_EXPEDICAO', 'POSICAO_CSV']]
+        .drop_duplicates()
+    )
+    posicoes_expedicao = candidatos['POSICAO_EXPEDICAO'].to_numpy(dtype=np.int64)
+    posicoes_csv = candidatos['POSICAO_CSV'].to_numpy(dtype=np.int64)
+    
+    # Os valores filtram os pares antes da verificação da distância, que é
+    # feita nota a nota e fica só com os que sobram
+    peso_expedicao = sem_csv['VOG_LIMPO'].to_numpy(dtype=np.float64)[posicoes_expedicao]
+    valor_expedicao = sem_csv['VALOR_NF_LIMPO'].to_numpy(dtype=np.float64)[posicoes_expedicao]
+    # Do lado do CSV valem os totais da nota, como na comparação exata
+    peso_csv = so_csv['PESO_COMPARACAO'].to_numpy(dtype=np.float64)[posicoes_csv]
+    total_csv = so_csv['TOTAL_COMPARACAO'].to_numpy(dtype=np.float64)[posicoes_csv]
+    peso_igual, peso_proximo = _valores_concordam(peso_expedicao, peso_csv, tolerancia)
+    valor_igual, valor_proximo = _valores_concordam(valor_expedicao, total_csv, tolerancia)
+    pontos = peso_igual.astype(np.int64) + peso_proximo + valor_igual + valor_proximo
+    
+    mantidos = np.flatnonzero(pontos > 0)
+    nf_expedicao = sem_csv['NF'].astype(str).to_numpy()[posicoes_expedicao[mantidos]]
+    nf_csv = so_csv['NOTA FISCAL'].astype(str).to_numpy()[posicoes_csv[mantidos]]
+    diferencas = [classificar_diferenca_nota(a, b) for a, b in zip(nf_expedicao, nf_csv)]
+    
+    # Desempate entre pares com a mesma pontuação pela diferença relativa
+    with np.errstate(divide='ignore', invalid='ignore'):
+        afastamento = (
+            np.abs(peso_expedicao - peso_csv) / np.maximum(np.abs(peso_csv), 1)
+            + np.abs(valor_expedicao - total_csv) / np.maximum(np.abs(total_csv), 1)
+        )
+    
+    df_pares = pd.DataFrame({
+        'NF_EXPEDICAO': converter_serie_nota_fiscal_inteiro(pd.Series(nf_expedicao, dtype=object)).to_numpy(),
+        'NF_CSV': converter_serie_nota_fiscal_inteiro(pd.Series(nf_csv, dtype=object)).to_numpy(),
+        'DIFERENCA': diferencas,
+        'CONFIANCA': [CONFIANCA_APROXIMACAO[ponto] for ponto in pontos[mantidos].tolist()],
+        'DATA_EXPEDICAO': sem_csv['DATA_EXPEDICAO'].to_numpy()[posicoes_expedicao[mantidos]],
+        'DATA_CSV': so_csv['DATA_CSV'].to_numpy()[posicoes_csv[mantidos]] if 'DATA_CSV' in so_csv.columns else None,
+        'PESO_EXPEDICAO': peso_expedicao[mantidos],
+        'PESO_CSV': peso_csv[mantidos],
+        'VALOR_EXPEDICAO': valor_expedicao[mantidos],
+        'TOTAL_CSV': total_csv[mantidos],
+        '_PONTOS': pontos[mantidos],
+        '_AFASTAMENTO': np.nan_to_num(afastamento[mantidos], nan=np.inf)
+    })
+    df_pares = df_pares[df_pares['DIFERENCA'].notna()]
+    df_pares = (
+        df_pares.sort_values(['_PONTOS', '_AFASTAMENTO', 'NF_EXPEDICAO', 'NF_CSV'], ascending=[False, True, True, True], kind='stable')
+        .groupby('NF_EXPEDICAO', sort=False).head(MAX_CANDIDATOS_APROXIMACAO)
+    )
+    return df_pares[colunas].reset_index(drop=True)
+
+# Colunas que determinam o resultado de cada linha; se nenhuma mudou desde a
+# última execução o resultado guardado é reaproveitado
+COLUNAS_ESTADO_EXPEDICAO = [
+    'NF', 'DATA_EXPEDICAO', 'STATUS', 'OPERAÇÃO', 'VOG', 'R$ NF', 'VOG_LIMPO', 'VALOR_NF_LIMPO',
+    '_merge', 'DATA_CSV', 'PESO_COMPARACAO', 'TOTAL_COMPARACAO', 'LINHAS_NF', 'ABA'
+]
+COLUNAS_ESTADO_CSV = ['NOTA FISCAL', 'DATA_CSV', 'PESO', 'TOTAL']
+
+DIRETORIO_ESTADO = DIRETORIO_CACHE / 'estado'
+
+def caminho_estado_conferencia(caminho_expedicao, caminhos_csv, aba, data_inicio, data_fim, tolerancia=TOLERANCIA_COMPARACAO):
+    """
+    Arquivo do estado da última conferência com as mesmas entradas e período
+    """
+    parametros = {
+        'aba': aba,
+        'csv': [os.path.abspath(caminho) for caminho in caminhos_csv],
+        'data_inicio': _formatar_data_parametro(data_inicio),
+        'data_fim': _formatar_data_parametro(data_fim),
+        'tolerancia': tolerancia
+    }
+    return DIRETORIO_ESTADO / f"{_chave_cache('estado', caminho_expedicao, parametros)}.pkl"
+
+def carregar_estado_conferencia(caminho_estado):
+    """
+    Lê o estado gravado pela última conferência, ou None se não houver
+    """
+    try:
+        return pd.read_pickle(caminho_estado)
+    except Exception:
+        return None
+
+def gravar_estado_conferencia(caminho_estado, estado):
+    """
+    Grava o estado da conferência de forma atômica
+    """
+    try:
+        caminho_estado.parent.mkdir(parents=True, exist_ok=True)
+        temporario = caminho_estado.with_suffix(f'.{os.getpid()}.tmp')
+        pd.to_pickle(estado, temporario)
+        os.replace(temporario, caminho_estado)
+    except Exception as e:
+        mostrar(f"   ⚠️ Não foi possível gravar o estado da conferência: {e}", NIVEL_SILENCIOSO)
+
+def _hash_linhas(df, colunas, chaves):
+    """
+    Hash de cada linha considerando só as colunas informadas
+    """
+    presentes = [coluna for coluna in colunas if coluna in df.columns]
+    hashes = pd.util.hash_pandas_object(df[presentes], index=False).to_numpy()
+    return pd.Series(hashes, index=chaves)
+
+def chaves_conferencia(df_comparacao, df_csv_sem_expedicao):
+    """
+    Identifica cada linha da conferência entre execuções: linhas da expedição
+    pela NF e pela ocorrência dela (a mesma NF pode aparecer mais de uma vez)
+    e notas só do CSV pela NOTA FISCAL
+    """
+    ocorrencia = df_comparacao.groupby('NF', sort=False).cumcount().astype(str)
+    chaves_expedicao = ('E|' + df_comparacao['NF'].astype(str) + '|' + ocorrencia).to_numpy()
+    chaves_csv = ('C|' + df_csv_sem_expedicao['NOTA FISCAL'].astype(str)).to_numpy()
+    return chaves_expedicao, chaves_csv
+
+def detectar_divergencias_incremental(df_comparacao, df_csv_sem_expedicao, caminho_estado, tolerancia=TOLERANCIA_COMPARACAO):
+    """
+    Reavalia só as linhas cujas entradas mudaram desde a última execução e
+    reaproveita o resultado guardado das demais. O relatório ganha a coluna
+    SITUACAO: NOVA, EM ABERTO ou RESOLVIDA (divergências da execução anterior
+    que deixaram de existir, listadas no fim sem destaque).
+    Devolve (relatório, problemas, contagens)
+    """
+    chaves_expedicao, chaves_csv = chaves_conferencia(df_comparacao, df_csv_sem_expedicao)
+    hashes = pd.concat([
+        _hash_linhas(df_comparacao, COLUNAS_ESTADO_EXPEDICAO, chaves_expedicao),
+        _hash_linhas(df_csv_sem_expedicao, COLUNAS_ESTADO_CSV, chaves_csv)
+    ])
+    
+    estado = carregar_estado_conferencia(caminho_estado)
+    reaproveitada = np.zeros(len(hashes), dtype=bool)
+    if estado is not None:
+        comum = hashes.index.isin(estado['hashes'].index)
+        reaproveitada[comum] = estado['hashes'].loc[hashes.index[comum]].to_numpy() == hashes.to_numpy()[comum]
+    
+    # Só as linhas novas ou alteradas passam pela detecção
+    quantidade_expedicao = len(chaves_expedicao)
+    alteradas_expedicao = df_comparacao[~reaproveitada[:quantidade_expedicao]].set_axis(
+        chaves_expedicao[~reaproveitada[:quantidade_expedicao]], axis=0
+    )
+    alteradas_csv = df_csv_sem_expedicao[~reaproveitada[quantidade_expedicao:]].set_axis(
+        chaves_csv[~reaproveitada[quantidade_expedicao:]], axis=0
+    )
+    relatorio_novo, problemas_novos = detectar_divergencias(alteradas_expedicao, alteradas_csv, tolerancia, manter_indice=True)
+    problemas_novos = pd.DataFrame({
+        'CHAVE': relatorio_novo.index.to_numpy()[problemas_novos['LINHA'].to_numpy()],
+        'TIPO': problemas_novos['TIPO'].to_numpy(),
+        'DESCRICAO': problemas_novos['DESCRICAO'].to_numpy()
+    })
+    
+    partes_relatorio = [relatorio_novo]
+    partes_problemas = [problemas_novos]
+    relatorio_anterior = None
+    if estado is not None:
+        chaves_reaproveitadas = hashes.index[reaproveitada]
+        relatorio_anterior = estado['relatorio']
+        relatorio_reaproveitado = relatorio_anterior[relatorio_anterior.index.isin(chaves_reaproveitadas)]
+        if len(relatorio_reaproveitado):
+            partes_relatorio.append(relatorio_reaproveitado)
+            partes_problemas.append(estado['problemas'][estado['problemas']['CHAVE'].isin(chaves_reaproveitadas)])
+    
+    # Junta o que foi reavaliado com o reaproveitado na ordem das linhas atuais
+    posicao = pd.Series(np.arange(len(hashes)), index=hashes.index)
+    relatorio_atual = pd.concat(partes_relatorio)
+    relatorio_atual = relatorio_atual.iloc[np.argsort(posicao.loc[relatorio_atual.index].to_numpy(), kind='stable')]
+    problemas_atuais = pd.concat(partes_problemas, ignore_index=True)
+    problemas_atuais = problemas_atuais.iloc[
+        np.argsort(posicao.loc[problemas_atuais['CHAVE']].to_numpy(), kind='stable')
+    ].reset_index(drop=True)
+    
+    gravar_estado_conferencia(caminho_estado, {
+        'hashes': hashes,
+        'relatorio': relatorio_atual,
+        'problemas': problemas_atuais
+    })
+    
+    if relatorio_anterior is not None:
+        ja_existia = relatorio_atual.index.isin(relatorio_anterior.index)
+        resolvidas = relatorio_anterior[~relatorio_anterior.index.isin(relatorio_atual.index)]
+    else:
+        ja_existia = np.zeros(len(relatorio_atual), dtype=bool)
+        resolvidas = relatorio_atual.iloc[:0]
+    
+    partes = [relatorio_atual.assign(SITUACAO=np.where(ja_existia, 'EM ABERTO', 'NOVA'))]
+    if len(resolvidas):
+        partes.append(resolvidas.assign(SITUACAO='RESOLVIDA'))
+    df_relatorio = pd.concat(partes).reset_index(drop=True)
+    
+    linha = pd.Series(np.arange(len(relatorio_atual)), index=relatorio_atual.index)
+    df_problemas = pd.DataFrame({
+        'LINHA': linha.loc[problemas_atuais['CHAVE']].to_numpy(),
+        'TIPO': problemas_atuais['TIPO'].to_numpy(),
+        'DESCRICAO': problemas_atuais['DESCRICAO'].to_numpy()
+    })
+    
+    contagens = {
+        'reavaliadas': int((~reaproveitada).sum()),
+        'linhas': len(hashes),
+        'novas': int((~ja_existia).sum()),
+        'em_aberto': int(ja_existia.sum()),
+        'resolvidas': len(resolvidas)
+    }
+    return df_relatorio, df_problemas, contagens
+
+# Índice de consulta por nota fiscal da última conferência: um .npy com as
+# chaves (hash da nota formatada) em ordem, outro com os registros na mesma
+# ordem e um JSON com a origem. Os .npy são abertos com mmap, então consultar
+# uma nota lê só as páginas da busca binária e dos registros dela
+DIRETORIO_INDICE_NF = DIRETORIO_CACHE / 'indice_nf'
+ORIGEM_EXPEDICAO = 0
+ORIGEM_SO_CSV = 1
+
+def hash_nota_fiscal(notas):
+    """
+    Hash (uint64) de notas já formatadas; é a chave do índice de consulta
+    """
+    return pd.util.hash_array(np.asarray(notas, dtype=object))
+
+def _texto_fixo(valores):
+    """
+    Converte para texto de largura fixa (o .npy não guarda objetos Python)
+    """
+    texto = pd.Series(valores, dtype=object).fillna('').astype(str).to_numpy()
+    return texto.astype(f'U{max(max(map(len, texto), default=0), 1)}')
+
+def _datas_fixas(valores, quantidade):
+    """
+    Converte datas para datetime64; linhas sem data ficam NaT
+    """
+    if valores is None:
+        return np.full(quantidade, np.datetime64('NaT'), dtype='M8[ns]')
+    return pd.to_datetime(pd.Series(valores), errors='coerce').to_numpy(dtype='M8[ns]')
+
+def montar_indice_notas(df_comparacao, df_csv_sem_expedicao, tolerancia=TOLERANCIA_COMPARACAO):
+    """
+    Monta o índice de consulta: uma linha por linha da comparação e uma por
+    nota só do CSV, com datas, status, operação, valores somados e os
+    problemas marcados em bits (na ordem de TIPOS_PROBLEMA).
+    Devolve as chaves em ordem e os registros na mesma ordem
+    """
+    marcas, vog_expedicao, valor_nf_expedicao, peso_csv, total_csv = marcar_divergencias(df_comparacao, tolerancia)
+    problemas_expedicao = np.zeros(len(df_comparacao), dtype=np.uint8)
+    for bit, tipo in enumerate(TIPOS_PROBLEMA):
+        problemas_expedicao |= marcas[tipo].astype(np.uint8) << bit
+    
+    def coluna(df, nome):
+        return df[nome].to_numpy() if nome in df.columns else None
+    
+    quantidade_csv = len(df_csv_sem_expedicao)
+    vazio = np.full(quantidade_csv, '', dtype=object)
+    notas = np.concatenate([df_comparacao['NF'].to_numpy(dtype=object), df_csv_sem_expedicao['NOTA FISCAL'].to_numpy(dtype=object)])
+    status = np.concatenate([df_comparacao['STATUS'].to_numpy(dtype=object), vazio])
+    operacao = np.concatenate([
+        df_comparacao['OPERAÇÃO'].to_numpy(dtype=object) if 'OPERAÇÃO' in df_comparacao.columns else np.full(len(df_comparacao), '', dtype=object),
+        vazio
+    ])
+    datas_csv = coluna(df_comparacao, 'DATA_CSV'), coluna(df_csv_sem_expedicao, 'DATA_CSV')
+    
+    colunas = {
+        'nf': _texto_fixo(notas),
+        'origem': np.repeat(np.array([ORIGEM_EXPEDICAO, ORIGEM_SO_CSV], dtype=np.int8), [len(df_comparacao), quantidade_csv]),
+        'data_expedicao': np.concatenate([
+            _datas_fixas(coluna(df_comparacao, 'DATA_EXPEDICAO'), len(df_comparacao)),
+            _datas_fixas(None, quantidade_csv)
+        ]),
+        'data_csv': np.concatenate([
+            _datas_fixas(datas_csv[0], len(df_comparacao)),
+            _datas_fixas(datas_csv[1], quantidade_csv)
+        ]),
+        'status': _texto_fixo(status),
+        'operacao': _texto_fixo(operacao),
+        'vog': np.concatenate([vog_expedicao, np.full(quantidade_csv, np.nan)]),
+        'valor_nf': np.concatenate([valor_nf_expedicao, np.full(quantidade_csv, np.nan)]),
+        'peso_csv': np.concatenate([peso_csv, coluna(df_csv_sem_expedicao, 'PESO_COMPARACAO')]).astype(np.float64),
+        'total_csv': np.concatenate([total_csv, coluna(df_csv_sem_expedicao, 'TOTAL_COMPARACAO')]).astype(np.float64),
+        'problemas': np.concatenate([
+            problemas_expedicao,
+            np.full(quantidade_csv, 1 << TIPOS_PROBLEMA.index('nf_nao_encontrada'), dtype=np.uint8)
+        ])
+    }
+    registros = np.empty(len(notas), dtype=[(nome, valores.dtype) for nome, valores in colunas.items()])
+    for nome, valores in colunas.items():
+        registros[nome] = valores
+    
+    chaves = hash_nota_fiscal(notas)
+    ordem = np.argsort(chaves, kind='stable')
+    return chaves[ordem], registros[ordem]
+
+def gravar_indice_notas(df_comparacao, df_csv_sem_expedicao, pasta=None, **origem):
+    """
+    Grava o índice de consulta por nota fiscal de forma atômica (cada arquivo
+    é gravado em temporário e trocado; o JSON por último confirma o conjunto).
+    Devolve os registros montados (usados também no histórico), ou None
+    """
+    pasta = Path(pasta or DIRETORIO_INDICE_NF)
+    registros = None
+    try:
+        chaves, registros = montar_indice_notas(df_comparacao, df_csv_sem_expedicao)
+        pasta.mkdir(parents=True, exist_ok=True)
+        for nome, dados in [('chaves', chaves), ('registros', registros)]:
+            temporario = pasta / f'{nome}.{os.getpid()}.tmp.npy'
+            np.save(temporario, dados, allow_pickle=False)
+            os.replace(temporario, pasta / f'{nome}.npy')
+        
+        metadados = {
+            'gerado_em': datetime.now().isoformat(timespec='seconds'),
+            'linhas': len(chaves),
+            'tipos_problema': TIPOS_PROBLEMA,
+            **origem
+        }
+        temporario = pasta / f'indice.{os.getpid()}.tmp'
+        with open(temporario, 'w', encoding='utf-8') as arquivo:
+            json.dump(metadados, arquivo, ensure_ascii=False, indent=1, default=str)
+        os.replace(temporario, pasta / 'indice.json')
+        mostrar(f"   🔎 Índice de consulta por NF atualizado: {len(chaves)} linhas", NIVEL_DETALHADO)
+    except Exception as e:
+        mostrar(f"   ⚠️ Não foi possível gravar o índice de consulta por NF: {e}", NIVEL_SILENCIOSO)
+    return registros
+
+def abrir_indice_notas(pasta=None):
+    """
+    Abre o índice de consulta com mmap; devolve chaves, registros e metadados,
+    ou None se não houver índice (ou se os arquivos não baterem)
+    """
+    pasta = Path(pasta or DIRETORIO_INDICE_NF)
+    try:
+        with open(pasta / 'indice.json', encoding='utf-8') as arquivo:
+            metadados = json.load(arquivo)
+        chaves = np.load(pasta / 'chaves.npy', mmap_mode='r')
+        registros = np.load(pasta / 'registros.npy', mmap_mode='r')
+    except (OSError, ValueError):
+        return None
+    if len(chaves) != len(registros) or len(chaves) != metadados.get('linhas'):
+        return None
+    return chaves, registros, metadados
+
+def _data_registro(valor):
+    """
+    Data do registro do índice como DD/MM/AAAA, ou None
+    """
+    if np.isnat(valor):
+        return None
+    return pd.Timestamp(valor).strftime('%d/%m/%Y')
+
+def _valor_registro(valor):
+    """
+    Número do registro do índice, ou None quando não se aplica
+    """
+    return None if np.isnan(valor) else float(valor)
+
+def consultar_nota_fiscal(nota, pasta_indice=None, indice=None):
+    """
+    Consulta uma nota no índice da última conferência sem refazer a conferência.
+    A nota passa por formatar_nota_fiscal, como na conferência.
+    Devolve uma lista com um dicionário por linha encontrada (a mesma NF pode
+    aparecer mais de uma vez na expedição; lista vazia se não existir),
+    ou None se não houver índice. indice permite reaproveitar o índice aberto
+    """
+    if indice is None:
+        indice = abrir_indice_notas(pasta_indice)
+        if indice is None:
+            return None
+    chaves, registros, metadados = indice
+    
+    nota_formatada = formatar_nota_fiscal(nota)
+    chave = hash_nota_fiscal([nota_formatada])[0]
+    inicio = np.searchsorted(chaves, chave, side='left')
+    fim = np.searchsorted(chaves, chave, side='right')
+    tipos = metadados.get('tipos_problema', TIPOS_PROBLEMA)
+    
+    linhas = []
+    for registro in registros[inicio:fim]:
+        # Hashes iguais de notas diferentes são descartados pelo texto
+        if str(registro['nf']) != nota_formatada:
+            continue
+        linhas.append({
+            'NF': nota_formatada,
+            'ORIGEM': 'expedição' if registro['origem'] == ORIGEM_EXPEDICAO else 'só CSV',
+            'DATA_EXPEDICAO': _data_registro(registro['data_expedicao']),
+            'DATA_CSV': _data_registro(registro['data_csv']),
+            'STATUS': str(registro['status']) or None,
+            'OPERAÇÃO': str(registro['operacao']) or None,
+            'VOG_Expedição': _valor_registro(registro['vog']),
+            'R$ NF_Expedição': _valor_registro(registro['valor_nf']),
+            'PESO_CSV': _valor_registro(registro['peso_csv']),
+            'TOTAL_CSV': _valor_registro(registro['total_csv']),
+            'PROBLEMAS': [tipo for bit, tipo in enumerate(tipos) if int(registro['problemas']) >> bit & 1]
+        })
+    return linhas
+
+# Histórico das conferências em um banco SQLite local: cada execução acrescenta
+# as linhas do índice de consulta (uma por linha da expedição e uma por nota
+# só do CSV, com os valores somados e os problemas) e um problema por linha
+# em problemas. Tendências e o histórico de uma NF viram consultas indexadas
+# em vez de refazer conferências de períodos antigos. Cada execução guarda as
+# datas que cobriu: numa tendência cada dia conta pela execução mais recente
+# que o cobriu, e períodos conferidos mais de uma vez não somam em dobro
+ARQUIVO_HISTORICO = DIRETORIO_CACHE / 'historico.sqlite'
+
+ESQUEMA_HISTORICO = """
+CREATE TABLE IF NOT EXISTS execucoes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    executada_em TEXT NOT NULL,
+    expedicao TEXT, csv TEXT, aba TEXT, data_inicio TEXT, data_fim TEXT,
+    primeira_data TEXT, ultima_data TEXT, notas_expedicao INTEGER, notas_csv INTEGER, expedicao_sem_csv INTEGER,
+    csv_sem_expedicao INTEGER, divergencias INTEGER
+);
+CREATE TABLE IF NOT EXISTS notas (
+    execucao INTEGER NOT NULL REFERENCES execucoes(id),
+    nf TEXT NOT NULL, origem TEXT NOT NULL, data_expedicao TEXT, data_csv TEXT, status TEXT, operacao TEXT,
+    vog REAL, valor_nf REAL, peso_csv REAL, total_csv REAL, problemas INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS problemas (
+    execucao INTEGER NOT NULL REFERENCES execucoes(id),
+    nf TEXT NOT NULL, data TEXT, tipo TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS notas_nf ON notas (nf, execucao);
+CREATE INDEX IF NOT EXISTS problemas_tipo ON problemas (tipo, data);
+CREATE INDEX IF NOT EXISTS problemas_data ON problemas (data, execucao, tipo);
+CREATE INDEX IF NOT EXISTS problemas_nf ON problemas (nf, execucao);
+"""
+
+CACHE_HISTORICO_KB = 256 * 1024
+AGRUPAMENTOS_HISTORICO = {'dia': '%Y-%m-%d', 'semana': '%Y-S%W', 'mes': '%Y-%m'}
+
+def abrir_historico(caminho=None):
+    """
+    Abre (e cria, se preciso) o banco do histórico
+    """
+    caminho = Path(caminho or ARQUIVO_HISTORICO)
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    conexao = sqlite3.connect(caminho)
+    # WAL e cache maior: cada execução acrescenta centenas de milhares de
+    # linhas espalhadas pelos índices de NF
+    conexao.execute(f"PRAGMA cache_size = -{CACHE_HISTORICO_KB}")
+    conexao.execute("PRAGMA journal_mode = WAL")
+    conexao.execute("PRAGMA synchronous = NORMAL")
+    conexao.executescript(ESQUEMA_HISTORICO)
+    return conexao
+
+def _datas_texto(valores):
+    """
+    Datas do índice como texto AAAA-MM-DD (None para NaT)
+    """
+    datas = pd.Series(valores).dt.strftime('%Y-%m-%d')
+    return datas.astype(object).where(datas.notna(), None).tolist()
+
+def _numeros_historico(valores):
+    """
+    Números do índice para o banco (None para NaN)
+    """
+    return pd.Series(valores).astype(object).where(~np.isnan(valores), None).tolist()
+
+def registrar_historico(registros, estatisticas, caminho=None, **origem):
+    """
+    Acrescenta ao histórico uma execução da conferência com as linhas do
+    índice de consulta (registros de montar_indice_notas) e os problemas de
+    cada linha. Devolve o número da execução, ou None se não foi possível gravar
+    """
+    try:
+        # Em ordem de NF as inserções nos índices seguem a ordem das páginas
+        registros = registros[np.argsort(registros['nf'], kind='stable')]
+        notas = registros['nf'].astype(str).tolist()
+        datas_expedicao = _datas_texto(registros['data_expedicao'])
+        datas_csv = _datas_texto(registros['data_csv'])
+        datas = [expedicao or csv for expedicao, csv in zip(datas_expedicao, datas_csv)]
+        problemas = registros['problemas'].astype(np.int64)
+        origens = np.where(registros['origem'] == ORIGEM_EXPEDICAO, 'expedicao', 'csv').tolist()
+        
+        # Datas cobertas: o período pedido ou, sem ele, as datas encontradas
+        datas_encontradas = [data for data in datas if data is not None]
+        primeira_data = origem.get('data_inicio') or min(datas_encontradas, default=None)
+        ultima_data = origem.get('data_fim') or max(datas_encontradas, default=None)
+        aba = origem.get('aba')
+        
+        with contextlib.closing(abrir_historico(caminho)) as conexao, conexao:
+            execucao = conexao.execute(
+                "INSERT INTO execucoes (executada_em, expedicao, csv, aba, data_inicio, data_fim, primeira_data, ultima_data, "
+                "notas_expedicao, notas_csv, expedicao_sem_csv, csv_sem_expedicao, divergencias) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    datetime.now().isoformat(timespec='seconds'), origem.get('expedicao'),
+                    json.dumps(origem.get('csv'), ensure_ascii=False),
+                    aba if aba is None or isinstance(aba, str) else json.dumps(aba, ensure_ascii=False),
+                    origem.get('data_inicio'), origem.get('data_fim'), primeira_data, ultima_data,
+                    *(estatisticas.get(nome) for nome in ['notas_expedicao', 'notas_csv', 'expedicao_sem_csv', 'csv_sem_expedicao', 'divergencias'])
+                )
+            ).lastrowid
+            conexao.executemany(
+                "INSERT INTO notas VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                zip(
+                    [execucao] * len(notas), notas, origens, datas_expedicao, datas_csv,
+                    registros['status'].astype(str).tolist(), registros['operacao'].astype(str).tolist(),
+                    _numeros_historico(registros['vog']), _numeros_historico(registros['valor_nf']),
+                    _numeros_historico(registros['peso_csv']), _numeros_historico(registros['total_csv']),
+                    problemas.tolist()
+                )
+            )
+            for bit, tipo in enumerate(TIPOS_PROBLEMA):
+                linhas = np.flatnonzero(problemas >> bit & 1)
+                conexao.executemany(
+                    "INSERT INTO problemas VALUES (?, ?, ?, ?)",
+                    ((execucao, notas[linha], datas[linha], tipo) for linha in linhas.tolist())
+                )
+        mostrar(f"   🗃️ Histórico: execução {execucao} registrada ({len(notas)} linhas)", NIVEL_DETALHADO)
+        return execucao
+    except Exception as e:
+        mostrar(f"   ⚠️ Não foi possível gravar o histórico: {e}", NIVEL_SILENCIOSO)
+        return None
+
+def _filtro_datas_historico(coluna, data_inicio, data_fim):
+    """
+    Condição SQL e parâmetros do filtro de período sobre a coluna de data
+    """
+    condicoes, parametros = [], []
+    if data_inicio:
+        condicoes.append(f"{coluna} >= ?")
+        parametros.append(_formatar_data_parametro(data_inicio))
+    if data_fim:
+        condicoes.append(f"{coluna} <= ?")
+        parametros.append(_formatar_data_parametro(data_fim))
+    return condicoes, parametros
+
+def consultar_tendencia(por='semana', tipos=None, data_inicio=None, data_fim=None, caminho=None):
+    """
+    Quantidade de problemas por período (dia, semana ou mês da data da NF) e
+    tipo. Cada dia conta pela execução mais recente que o cobriu, para que
+    períodos conferidos mais de uma vez não sejam somados em dobro
+    """
+    condicoes_dias, parametros = _filtro_datas_historico('data', data_inicio, data_fim)
+    condicoes = []
+    if tipos:
+        condicoes.append(f"p.tipo IN ({', '.join('?' * len(tipos))})")
+        parametros.extend(tipos)
+    consulta = f"""
+        WITH dias AS (
+            SELECT DISTINCT data FROM problemas
+            WHERE data IS NOT NULL {''.join(' AND ' + condicao for condicao in condicoes_dias)}
+        ),
+        cobertura AS (
+            SELECT d.data, MAX(e.id) AS execucao
+            FROM dias d JOIN execucoes e ON d.data BETWEEN e.primeira_data AND e.ultima_data
+            GROUP BY d.data
+        )
+        SELECT strftime('{AGRUPAMENTOS_HISTORICO[por]}', p.data) AS periodo, p.tipo AS tipo, COUNT(*) AS quantidade
+        FROM cobertura c JOIN problemas p ON p.data = c.data AND p.execucao = c.execucao
+        {'WHERE ' + ' AND '.join(condicoes) if condicoes else ''}
+        GROUP BY periodo, tipo
+        ORDER BY periodo, tipo
+    """
+    with contextlib.closing(abrir_historico(caminho)) as conexao:
+        return pd.read_sql_query(consulta, conexao, params=parametros)
+
+def historico_nota_fiscal(nota, caminho=None):
+    """
+    Todas as vezes em que a NF apareceu no histórico, da execução mais
+    recente para a mais antiga, com os valores e os problemas de cada uma
+    """
+    consulta = """
+        SELECT e.id AS execucao, e.executada_em, n.origem, n.data_expedicao, n.data_csv, n.status, n.operacao,
+               n.vog, n.valor_nf, n.peso_csv, n.total_csv, n.problemas
+        FROM notas n JOIN execucoes e ON e.id = n.execucao
+        WHERE n.nf = ?
+        ORDER BY e.id DESC
+    """
+    with contextlib.closing(abrir_historico(caminho)) as conexao:
+        df = pd.read_sql_query(consulta, conexao, params=[formatar_nota_fiscal(nota)])
+    df['problemas'] = [
+        ', '.join(tipo for bit, tipo in enumerate(TIPOS_PROBLEMA) if problemas >> bit & 1)
+        for problemas in df['problemas']
+    ]
+    return df
+
+def listar_execucoes_historico(caminho=None):
+    """
+    Execuções registradas no histórico, da mais recente para a mais antiga
+    """
+    with contextlib.closing(abrir_historico(caminho)) as conexao:
+        return pd.read_sql_query("SELECT * FROM execucoes ORDER BY id DESC", conexao)
+
+def obter_periodo_usuario():
+    """
+    Solicita o período desejado ao usuário
+    """
+    print("📅 PERÍODO DE ANÁLISE")
+    print("Deixe em branco para não usar filtro")
+    
+    while True:
+        data_inicio_str = input("Data de início (DD/MM/AAAA): ").strip()
+        data_fim_str = input("Data de fim (DD/MM/AAAA): ").strip()
+        
+        data_inicio = None
+        data_fim = None
+        
+        try:
+            if data_inicio_str:
+                data_inicio = datetime.strptime(data_inicio_str, '%d/%m/%Y')
+            if data_fim_str:
+                data_fim = datetime.strptime(data_fim_str, '%d/%m/%Y')
+            
+            if data_inicio and data_fim and data_inicio > data_fim:
+                print("❌ Data de início não pode ser maior que data de fim!")
+                continue
+                
+            return data_inicio, data_fim
+            
+        except ValueError:
+            print("❌ Formato inválido! Use DD/MM/AAAA")
+            continuar = input("Tentar novamente? (S/N): ").strip().upper()
+            if continuar != 'S':
+                return None, None
+
+# Formatos numéricos do relatório por coluna
+FORMATOS_RELATORIO = {
+    'NF': '0',
+    'DATA_EXPEDICAO': 'DD/MM/YYYY',
+    'DATA_CSV': 'DD/MM/YYYY',
+    'PESO_CSV': '#,##0.00',
+    'TOTAL_CSV': '#,##0.00',
+    'NF_EXPEDICAO': '0',
+    'NF_CSV': '0',
+    'PESO_EXPEDICAO': '#,##0.00',
+    'VALOR_EXPEDICAO': '#,##0.00'
+}
+NOME_ABA_CORRESPONDENCIAS = 'Possíveis correspondências'
+
+SEM_PREENCHIMENTO = 0
+PREENCHIMENTO_VERMELHO = 1
+PREENCHIMENTO_AMARELO = 2
+
+def mapear_preenchimentos_erros(df_relatorio, df_problemas):
+    """
+    Monta a matriz (linhas x colunas do relatório) com o preenchimento de cada
+    célula: vermelho para problemas graves e amarelo para erros de digitação
+    """
+    colunas_indices = {col_name: idx for idx, col_name in enumerate(df_relatorio.columns)}
+    preenchimentos = np.full(df_relatorio.shape, SEM_PREENCHIMENTO, dtype=np.int8)
+    
+    colunas_por_tipo = {
+        'peso_divergente': (['VOG_Expedição', 'PESO_CSV'], PREENCHIMENTO_VERMELHO),
+        'valor_divergente': (['R$ NF_Expedição', 'TOTAL_CSV'], PREENCHIMENTO_VERMELHO),
+        'erro_digitacao_vog': (['VOG_Expedição'], PREENCHIMENTO_AMARELO),
+        'erro_digitacao_valor': (['R$ NF_Expedição'], PREENCHIMENTO_AMARELO),
+        'nf_repetida_expedicao': (['NF'], PREENCHIMENTO_AMARELO)
+    }
+    
+    # Aplicado na ordem de TIPOS_PROBLEMA: o amarelo prevalece sobre o vermelho
+    for tipo in TIPOS_PROBLEMA:
+        linhas = df_problemas.loc[df_problemas['TIPO'] == tipo, 'LINHA'].to_numpy()
+        if tipo == 'nf_nao_encontrada':
+            preenchimentos[linhas, :] = PREENCHIMENTO_VERMELHO
+            continue
+        
+        colunas, preenchimento = colunas_por_tipo[tipo]
+        for coluna in colunas:
+            if coluna in colunas_indices:
+                preenchimentos[linhas, colunas_indices[coluna]] = preenchimento
+    
+    return preenchimentos
+
+def _largura_coluna(serie, nome):
+    """
+    Largura da coluna calculada direto do DataFrame, pelo texto mais longo
+    como ele aparece com o formato da coluna
+    """
+    preenchidos = serie.dropna()
+    if preenchidos.empty:
+        maior = 0
+    elif FORMATOS_RELATORIO.get(nome) == 'DD/MM/YYYY':
+        maior = len('DD/MM/YYYY')
+    elif FORMATOS_RELATORIO.get(nome) == '#,##0.00':
+        numeros = pd.to_numeric(preenchidos, errors='coerce')
+        maior = max(len(f'{numeros.max():,.2f}'), len(f'{numeros.min():,.2f}'))
+    else:
+        maior = int(preenchidos.astype(str).str.len().max())
+    
+    return min(max(maior, len(str(nome))) + 2, 50)
+
+def _gravar_xlsx_xlsxwriter(caminho_relatorio, abas):
+    """
+    Grava as abas do relatório com o XlsxWriter em modo de memória constante;
+    cada combinação de formato e preenchimento vira um único estilo
+    """
+    workbook = xlsxwriter.Workbook(caminho_relatorio, {'constant_memory': True})
+    cores = {PREENCHIMENTO_VERMELHO: '#FF9999', PREENCHIMENTO_AMARELO: '#FFFF99'}
+    # Cabeçalho no mesmo estilo do pandas.to_excel
+    estilo_cabecalho = workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+    
+    for nome_aba, nomes_colunas, formatos, larguras, colunas, preenchimentos in abas:
+        worksheet = workbook.add_worksheet(nome_aba)
+        estilos = {}
+        for col_idx, formato in enumerate(formatos):
+            for preenchimento in (SEM_PREENCHIMENTO, PREENCHIMENTO_VERMELHO, PREENCHIMENTO_AMARELO):
+                propriedades = {}
+                if formato:
+                    propriedades['num_format'] = formato
+                if preenchimento != SEM_PREENCHIMENTO:
+                    propriedades.update({'pattern': 1, 'bg_color': cores[preenchimento]})
+                estilos[col_idx, preenchimento] = workbook.add_format(propriedades) if propriedades else None
+            worksheet.set_column(col_idx, col_idx, larguras[col_idx], estilos[col_idx, SEM_PREENCHIMENTO])
+        
+        worksheet.write_row(0, 0, nomes_colunas, estilo_cabecalho)
+        
+        for linha_idx, (linha_valores, linha_preenchimentos) in enumerate(zip(zip(*colunas), preenchimentos.tolist()), start=1):
+            for col_idx, (valor, preenchimento) in enumerate(zip(linha_valores, linha_preenchimentos)):
+                estilo = estilos[col_idx, preenchimento]
+                if valor is None:
+                    if preenchimento != SEM_PREENCHIMENTO:
+                        worksheet.write_blank(linha_idx, col_idx, None, estilo)
+                else:
+                    worksheet.write(linha_idx, col_idx, valor, estilo)
+    
+    workbook.close()
+
+def _gravar_xlsx_openpyxl(caminho_relatorio, abas):
+    """
+    Grava as abas do relatório com o openpyxl em modo de escrita contínua
+    (write-only); só as células com formato ou preenchimento viram WriteOnlyCell
+    """
+    workbook = Workbook(write_only=True)
+    borda = Side(style='thin')
+    fills = {
+        PREENCHIMENTO_VERMELHO: PatternFill(start_color='FF9999', end_color='FF9999', fill_type='solid'),
+        PREENCHIMENTO_AMARELO: PatternFill(start_color='FFFF99', end_color='FFFF99', fill_type='solid')
+    }
+    
+    for nome_aba, nomes_colunas, formatos, larguras, colunas, preenchimentos in abas:
+        worksheet = workbook.create_sheet(nome_aba)
+        for col_idx, largura in enumerate(larguras):
+            worksheet.column_dimensions[get_column_letter(col_idx + 1)].width = largura
+        
+        # Cabeçalho no mesmo estilo do pandas.to_excel
+        cabecalho = []
+        for col_name in nomes_colunas:
+            cell = WriteOnlyCell(worksheet, value=col_name)
+            cell.font = Font(bold=True)
+            cell.border = Border(left=borda, right=borda, top=borda, bottom=borda)
+            cell.alignment = Alignment(horizontal='center', vertical='top')
+            cabecalho.append(cell)
+        worksheet.append(cabecalho)
+        
+        # O estilo de cada combinação é montado uma vez e copiado
+        modelos = {}
+        for linha_valores, linha_preenchimentos in zip(zip(*colunas), preenchimentos.tolist()):
+            linha = []
+            for valor, formato, preenchimento in zip(linha_valores, formatos, linha_preenchimentos):
+                if valor is None:
+                    formato = None
+                if formato is None and preenchimento == SEM_PREENCHIMENTO:
+                    linha.append(valor)
+                    continue
+                
+                chave = (formato, preenchimento)
+                if chave not in modelos:
+                    modelo = WriteOnlyCell(worksheet)
+                    if formato:
+                        modelo.number_format = formato
+                    if preenchimento != SEM_PREENCHIMENTO:
+                        modelo.fill = fills[preenchimento]
+                    modelos[chave] = modelo
+                
+                cell = WriteOnlyCell(worksheet, value=valor)
+                cell._style = copy(modelos[chave]._style)
+                linha.append(cell)
+            worksheet.append(linha)
+    
+    workbook.save(caminho_relatorio)
+
+def _preparar_aba_excel(nome_aba, df, preenchimentos=None):
+    """
+    Nome, colunas, formatos, larguras, valores (NaN/NaT viram célula vazia)
+    e preenchimentos de uma aba do relatório
+    """
+    nomes_colunas = df.columns.tolist()
+    formatos = [FORMATOS_RELATORIO.get(col_name) for col_name in nomes_colunas]
+    larguras = [_largura_coluna(df[col_name], col_name) for col_name in nomes_colunas]
+    if preenchimentos is None:
+        preenchimentos = np.full(df.shape, SEM_PREENCHIMENTO, dtype=np.int8)
+    
+    # Colunas convertidas de uma vez para valores Python
+    colunas = [
+        df[col_name].astype(object).where(df[col_name].notna(), None).tolist()
+        for col_name in nomes_colunas
+    ]
+    return nome_aba, nomes_colunas, formatos, larguras, colunas, preenchimentos
+
+def escrever_relatorio_excel(caminho_relatorio, df_relatorio, df_problemas, correspondencias=None, nome_aba='Divergências'):
+    """
+    Grava o relatório de divergências em streaming: formatos por coluna,
+    preenchimentos vindos da matriz de mapear_preenchimentos_erros e larguras
+    calculadas a partir do DataFrame. As possíveis correspondências de notas,
+    se houver, vão para uma segunda aba. Usa o XlsxWriter quando instalado
+    (bem mais rápido) e o openpyxl em modo write-only caso contrário
+    """
+    abas = [_preparar_aba_excel(nome_aba, df_relatorio, mapear_preenchimentos_erros(df_relatorio, df_problemas))]
+    if correspondencias is not None and not correspondencias.empty:
+        abas.append(_preparar_aba_excel(NOME_ABA_CORRESPONDENCIAS, correspondencias))
+    
+    gravar = _gravar_xlsx_xlsxwriter if xlsxwriter is not None else _gravar_xlsx_openpyxl
+    gravar(caminho_relatorio, abas)
+
+# Saídas do relatório além do .xlsx formatado: formatos colunares para
+# painéis e outros programas, sem o limite de linhas do Excel. Cada formato é
+# uma função (caminho, df_relatorio, df_problemas, correspondencias) em
+# ESCRITORES_RELATORIO e uma execução grava todos os formatos pedidos
+LIMITE_LINHAS_EXCEL = 1048576
+
+def _coluna_uniforme(serie):
+    """
+    Coluna do relatório com um tipo só: números, datas ou texto (as colunas
+    da expedição misturam números, textos e o 'N/A' das notas só do CSV)
+    """
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        serie = serie.astype(object)
+    if serie.dtype != object:
+        return serie
+    tipo = pd.api.types.infer_dtype(serie, skipna=True)
+    if tipo in ('integer', 'floating', 'mixed-integer-float'):
+        return pd.to_numeric(serie)
+    if tipo in ('datetime', 'datetime64', 'date'):
+        return pd.to_datetime(serie)
+    return serie.astype('string')
+
+def tabela_relatorio(df_relatorio, df_problemas):
+    """
+    Relatório para os formatos colunares: LINHA (a mesma da tabela de
+    problemas), as colunas do relatório com tipo uniforme e PROBLEMAS com
+    os tipos de problema de cada linha
+    """
+    tabela = pd.DataFrame({'LINHA': np.arange(len(df_relatorio))})
+    for coluna in df_relatorio.columns:
+        tabela[coluna] = _coluna_uniforme(df_relatorio[coluna].reset_index(drop=True))
+    tipos = df_problemas.groupby('LINHA', sort=False)['TIPO'].agg(', '.join)
+    tabela['PROBLEMAS'] = tipos.reindex(tabela['LINHA']).to_numpy()
+    return tabela
+
+def _gravar_substituindo(caminho, gravar):
+    """
+    Grava em um arquivo temporário e troca pelo definitivo, para que quem lê
+    o relatório nunca encontre um arquivo pela metade
+    """
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    try:
+        gravar(temporario)
+        os.replace(temporario, caminho)
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+
+def _caminho_correspondencias(caminho_relatorio):
+    """
+    Arquivo das possíveis correspondências ao lado do relatório colunar
+    """
+    base, extensao = os.path.splitext(caminho_relatorio)
+    return f"{base}.correspondencias{extensao}"
+
+def escrever_relatorio_parquet(caminho_relatorio, df_relatorio, df_problemas, correspondencias=None):
+    """
+    Grava o relatório em Parquet (precisa do pyarrow)
+    """
+    if pyarrow is None:
+        raise RuntimeError("o formato parquet precisa do pyarrow")
+    tabela = tabela_relatorio(df_relatorio, df_problemas)
+    _gravar_substituindo(caminho_relatorio, lambda temporario: tabela.to_parquet(temporario, index=False))
+    if correspondencias is not None and not correspondencias.empty:
+        _gravar_substituindo(_caminho_correspondencias(caminho_relatorio),
+                             lambda temporario: correspondencias.to_parquet(temporario, index=False))
+
+def escrever_relatorio_csv(caminho_relatorio, df_relatorio, df_problemas, correspondencias=None):
+    """
+    Grava o relatório em CSV no padrão do fechamento (separador ; e vírgula
+    decimal), com datas AAAA-MM-DD
+    """
+    opcoes = {'sep': ';', 'decimal': ',', 'index': False, 'encoding': 'utf-8-sig', 'date_format': '%Y-%m-%d'}
+    tabela = tabela_relatorio(df_relatorio, df_problemas)
+    _gravar_substituindo(caminho_relatorio, lambda temporario: tabela.to_csv(temporario, **opcoes))
+    if correspondencias is not None and not correspondencias.empty:
+        _gravar_substituindo(_caminho_correspondencias(caminho_relatorio),
+                             lambda temporario: correspondencias.to_csv(temporario, **opcoes))
+
+def escrever_relatorio_sqlite(caminho_relatorio, df_relatorio, df_problemas, correspondencias=None):
+    """
+    Grava o relatório em um banco SQLite com as tabelas divergencias e
+    problemas (ligadas pela LINHA), indexadas pela NF e pelo tipo de problema,
+    e correspondencias com os pares de notas propostos
+    """
+    tabela = tabela_relatorio(df_relatorio, df_problemas)
+    
+    def gravar(temporario):
+        with contextlib.closing(sqlite3.connect(temporario)) as conexao:
+            tabela.to_sql('divergencias', conexao, index=False)
+            df_problemas[['LINHA', 'TIPO', 'DESCRICAO']].to_sql('problemas', conexao, index=False)
+            conexao.execute('CREATE INDEX divergencias_nf ON divergencias ("NF")')
+            conexao.execute('CREATE INDEX problemas_tipo ON problemas ("TIPO", "LINHA")')
+            if correspondencias is not None and not correspondencias.empty:
+                correspondencias.to_sql('correspondencias', conexao, index=False)
+                conexao.execute('CREATE INDEX correspondencias_nf ON correspondencias ("NF_EXPEDICAO", "NF_CSV")')
+            conexao.commit()
+    
+    _gravar_substituindo(caminho_relatorio, gravar)
+
+ESCRITORES_RELATORIO = {
+    'xlsx': escrever_relatorio_excel,
+    'parquet': escrever_relatorio_parquet,
+    'csv': escrever_relatorio_csv,
+    'sqlite': escrever_relatorio_sqlite
+}
+FORMATOS_SAIDA_PADRAO = ['xlsx']
+
+def escrever_relatorio(caminho_relatorio, df_relatorio, df_problemas, formatos=None, correspondencias=None):
+    """
+    Grava o relatório em cada formato pedido: o .xlsx no caminho informado e
+    os demais ao lado dele, com a extensão do formato. As possíveis
+    correspondências de notas vão junto, em cada formato. Um formato que falha
+    não impede os outros. Devolve {formato: caminho gravado}
+    """
+    base = os.path.splitext(caminho_relatorio)[0]
+    gravados = {}
+    for formato in dict.fromkeys(formatos or FORMATOS_SAIDA_PADRAO):
+        caminho = caminho_relatorio if formato == 'xlsx' else f"{base}.{formato}"
+        if formato == 'xlsx' and len(df_relatorio) >= LIMITE_LINHAS_EXCEL:
+            mostrar(f"   ⚠️ {len(df_relatorio)} linhas passam do limite do Excel: relatório .xlsx não gravado "
+                    f"(use --formato parquet, csv ou sqlite)", NIVEL_SILENCIOSO)
+            continue
+        try:
+            ESCRITORES_RELATORIO[formato](caminho, df_relatorio, df_problemas, correspondencias)
+            gravados[formato] = caminho
+        except Exception as e:
+            mostrar(f"   ⚠️ Não foi possível gravar o relatório {formato}: {e}", NIVEL_SILENCIOSO)
+    return gravados
+
+CAMINHO_EXPEDICAO_PADRAO = r"Z:\RODRIGO - LOGISTICA\Cópia de CONTROLE DE EXPEDIÇÃO NOVEMBRO.xlsx"
+CAMINHO_CSV_PADRAO = r"S:\hor\excel\fechamento-20251101-20251110.csv"
+NOME_RELATORIO = "RELATORIO_DIVERGENCIAS.xlsx"
+
+STATUS_VALIDOS = ['ENTREGUE', 'EM ROTA', 'DEVOLUÇÃO']
+OPERACOES_VOG = ['VOG', 'VOG 2ºSAIDA', 'VOG 2 SAIDA', 'VOG 2SAIDA', 'VOG 2º SAIDA']
+
+# Filtros de filtrar_expedicao que já podem ser aplicados na leitura da planilha
+FILTROS_LEITURA_EXPEDICAO = {'STATUS': STATUS_VALIDOS, 'OPERAÇÃO': OPERACOES_VOG}
+
+def filtrar_expedicao(df_expedicao, data_inicio=None, data_fim=None):
+    """
+    Aplica à planilha de expedição os filtros de status, operação VOG e período
+    e acrescenta as colunas limpas usadas na comparação
+    """
+    df_expedicao = df_expedicao.dropna(subset=['NF'])
+    
+    df_expedicao_filtrado = df_expedicao[df_expedicao['STATUS'].isin(STATUS_VALIDOS)].copy()
+    
+    df_expedicao_filtrado = df_expedicao_filtrado[
+        df_expedicao_filtrado['OPERAÇÃO'].isin(OPERACOES_VOG)
+    ]
+    
+    df_expedicao_filtrado['NF'] = formatar_serie_nota_fiscal(df_expedicao_filtrado['NF'])
+    chave = chave_nota_fiscal(df_expedicao_filtrado['NF'])
+    if chave is not None:
+        df_expedicao_filtrado['NF_CHAVE'] = chave
+    
+    if 'DATA' in df_expedicao_filtrado.columns:
+        df_expedicao_filtrado['DATA_EXPEDICAO'] = pd.to_datetime(df_expedicao_filtrado['DATA'], errors='coerce')
+        
+        if data_inicio or data_fim:
+            if data_inicio:
+                df_expedicao_filtrado = df_expedicao_filtrado[df_expedicao_filtrado['DATA_EXPEDICAO'] >= data_inicio]
+            if data_fim:
+                data_fim_ajustada = data_fim + pd.Timedelta(days=1)
+                df_expedicao_filtrado = df_expedicao_filtrado[df_expedicao_filtrado['DATA_EXPEDICAO'] < data_fim_ajustada]
+    else:
+        df_expedicao_filtrado['DATA_EXPEDICAO'] = None
+    
+    df_expedicao_filtrado['VOG_LIMPO'] = limpar_serie_numerica(df_expedicao_filtrado['VOG'])
+    df_expedicao_filtrado['VALOR_NF_LIMPO'] = limpar_serie_monetaria(df_expedicao_filtrado['R$ NF'])
+    if _DIAGNOSTICO is not None:
+        _DIAGNOSTICO.registrar_limpeza('Expedição VOG', df_expedicao_filtrado['VOG'], df_expedicao_filtrado['VOG_LIMPO'], limpar_valor_numerico, 100000)
+        _DIAGNOSTICO.registrar_limpeza('Expedição R$ NF', df_expedicao_filtrado['R$ NF'], df_expedicao_filtrado['VALOR_NF_LIMPO'], limpar_valor_monetario, 1000000)
+    return df_expedicao_filtrado
+
+def expandir_caminhos_csv(entradas):
+    """
+    Transforma a lista recebida (arquivos, pastas ou padrões glob) na lista
+    de CSVs a processar; pastas e padrões são expandidos em ordem alfabética,
+    que para os fechamentos (fechamento-AAAAMMDD-AAAAMMDD.csv) é a ordem das datas
+    """
+    if isinstance(entradas, (str, os.PathLike)):
+        entradas = [entradas]
+    
+    caminhos = []
+    for entrada in entradas:
+        entrada = str(entrada)
+        if os.path.isdir(entrada):
+            encontrados = sorted(
+                os.path.join(entrada, nome) for nome in os.listdir(entrada)
+                if nome.lower().endswith('.csv')
+            )
+        elif glob.has_magic(entrada):
+            encontrados = sorted(glob.glob(entrada))
+        else:
+            encontrados = [entrada]
+        
+        for caminho in encontrados:
+            if caminho not in caminhos:
+                caminhos.append(caminho)
+    return caminhos
+
+def carregar_linhas_csvs(caminhos_csv, data_inicio=None, data_fim=None, usar_cache=True, processos=None):
+    """
+    Lê um ou mais CSVs de fechamento e junta as linhas filtradas, na ordem
+    dos arquivos, antes do agrupamento por nota fiscal.
+    Os arquivos que não estão no cache são lidos em paralelo, um por processo.
+    Os processos devolvem as linhas filtradas (e não somas parciais) para que
+    o agrupamento final some na mesma ordem do arquivo concatenado
+    """
+    # No modo diagnóstico os CSVs são sempre lidos neste processo, para que as
+    # conversões passem pelo coletor
+    diagnosticando = _DIAGNOSTICO is not None
+    
+    partes = [None] * len(caminhos_csv)
+    pendentes = []
+    for posicao, caminho_csv in enumerate(caminhos_csv):
+        if not csv_no_periodo(caminho_csv, data_inicio, data_fim, usar_cache):
+            continue
+        if usar_cache and not diagnosticando:
+            partes[posicao] = buscar_linhas_csv_cache(caminho_csv, data_inicio, data_fim)
+        if partes[posicao] is None:
+            pendentes.append(posicao)
+    
+    if processos is None:
+        processos = os.cpu_count() or 1
+    processos = 1 if diagnosticando else max(1, min(processos, len(pendentes)))
+    
+    if processos > 1:
+        mostrar(f"   🚀 Lendo {len(pendentes)} CSVs em {processos} processos...")
+        with ProcessPoolExecutor(max_workers=processos, mp_context=CONTEXTO_PROCESSOS,
+                                 initializer=definir_verbosidade, initargs=(NIVEL_LOG,)) as executor:
+            futuros = {
+                posicao: executor.submit(ler_linhas_csv, caminhos_csv[posicao], data_inicio, data_fim)
+                for posicao in pendentes
+            }
+            lidos = {posicao: futuro.result() for posicao, futuro in futuros.items()}
+    else:
+        lidos = {
+            posicao: ler_linhas_csv(caminhos_csv[posicao], data_inicio, data_fim)
+            for posicao in pendentes
+        }
+    
+    # O cache é gravado só aqui, no processo principal, para o índice não
+    # ser disputado pelos processos
+    for posicao, (df_linhas, estado_origem, hash_conteudo, intervalo) in lidos.items():
+        partes[posicao] = df_linhas
+        if df_linhas is not None and usar_cache:
+            gravar_cache(
+                'csv_linhas', caminhos_csv[posicao], _parametros_linhas_csv(data_inicio, data_fim),
+                df_linhas, estado_origem, hash_conteudo
+            )
+            registrar_periodo_csv(caminhos_csv[posicao], estado_origem, intervalo)
+    
+    partes = [df_linhas for df_linhas in partes if df_linhas is not None and not df_linhas.empty]
+    if not partes:
+        return None
+    if len(partes) == 1:
+        return partes[0]
+    return pd.concat(partes, ignore_index=True)
+
+def comparar_expedicao_csv(df_expedicao_filtrado, df_agrupado):
+    """
+    Cruza a expedição com o CSV agrupado pela nota fiscal em um único outer
+    join e devolve a comparação (uma linha por linha da expedição, na ordem
+    da planilha) e as notas só do CSV (na ordem do agrupamento).
+    Notas repetidas na expedição (ex.: VOG e VOG 2ºSAIDA da mesma NF) entram
+    uma vez só no join, então as linhas não se multiplicam; LINHAS_NF diz
+    quantas linhas a nota tem na expedição.
+    Com a chave inteira nos dois lados o join é feito por ela
+    """
+    if 'NF_CHAVE' in df_expedicao_filtrado.columns and 'NF_CHAVE' in df_agrupado.columns:
+        chave_expedicao = chave_csv = 'NF_CHAVE'
+    else:
+        chave_expedicao, chave_csv = 'NF', 'NOTA FISCAL'
+    
+    # Uma linha por nota da expedição, na ordem em que aparece
+    codigos, notas = pd.factorize(df_expedicao_filtrado[chave_expedicao])
+    linhas_nf = np.bincount(codigos, minlength=len(notas))
+    df_notas = pd.DataFrame({'_CHAVE': notas, '_POSICAO_EXPEDICAO': np.arange(len(notas))})
+    df_csv = df_agrupado.assign(_POSICAO_CSV=np.arange(len(df_agrupado)))
+    
+    juncao = pd.merge(df_notas, df_csv, left_on='_CHAVE', right_on=chave_csv, how='outer', indicator=True)
+    
+    # O join sai ordenado pela chave; as posições devolvem a ordem de origem
+    na_expedicao = juncao['_merge'] != 'right_only'
+    linha_da_nota = np.empty(len(notas), dtype=np.int64)
+    linha_da_nota[juncao.loc[na_expedicao, '_POSICAO_EXPEDICAO'].to_numpy(dtype=np.int64)] = np.flatnonzero(na_expedicao.to_numpy())
+    
+    colunas_csv = [coluna for coluna in df_agrupado.columns if coluna not in df_expedicao_filtrado.columns]
+    dados_csv = juncao.iloc[linha_da_nota[codigos]]
+    df_comparacao = df_expedicao_filtrado.reset_index(drop=True)
+    for coluna in colunas_csv:
+        df_comparacao[coluna] = dados_csv[coluna].reset_index(drop=True)
+    df_comparacao['LINHAS_NF'] = linhas_nf[codigos]
+    df_comparacao['_merge'] = pd.Categorical(
+        dados_csv['_merge'].to_numpy(), categories=['left_only', 'right_only', 'both']
+    )
+    
+    so_csv = juncao[~na_expedicao].sort_values('_POSICAO_CSV')
+    nfs_csv_sem_expedicao = df_agrupado.iloc[so_csv['_POSICAO_CSV'].to_numpy(dtype=np.int64)]
+    return df_comparacao, nfs_csv_sem_expedicao
+
+def resolver_caminho_relatorio(caminho_relatorio=None):
+    """
+    Devolve o caminho do arquivo do relatório: o padrão é a pasta Downloads
+    e, se for informada uma pasta, o relatório é criado dentro dela
+    """
+    if caminho_relatorio is None:
+        return os.path.join(str(Path.home() / "Downloads"), NOME_RELATORIO)
+    if os.path.isdir(caminho_relatorio):
+        return os.path.join(caminho_relatorio, NOME_RELATORIO)
+    return str(caminho_relatorio)
+
+def reconciliar(caminho_expedicao, caminhos_csv, data_inicio=None, data_fim=None, aba=None,
+                caminho_relatorio=None, usar_cache=True, processos=None, incremental=False,
+                instrumentar=False, perfil_execucao=None, diagnostico=False, formatos=None):
+    """
+    Confere a planilha de expedição com o(s) CSV(s) de fechamento no período
+    informado e grava o relatório de divergências. caminhos_csv aceita
+    arquivos, pastas e padrões glob; processos limita a leitura em paralelo.
+    aba escolhe a(s) aba(s) da expedição; sem ela são lidas todas as abas
+    com o cabeçalho esperado que tenham datas no período.
+    Com incremental só as linhas alteradas desde a última execução com as
+    mesmas entradas são reavaliadas e o relatório mostra a situação de cada
+    divergência (nova, em aberto ou resolvida).
+    Com instrumentar (ou perfil_execucao 'cprofile'/'tracemalloc') o tempo,
+    a CPU, as linhas e o pico de memória de cada etapa são gravados em JSON
+    ao lado do relatório (RELATORIO_DIVERGENCIAS.execucao.json).
+    Com diagnostico a distribuição dos valores, as células não convertidas,
+    os valores reescalados e uma amostra do CSV agrupado vão para uma planilha
+    separada (RELATORIO_DIVERGENCIAS.diagnostico.xlsx).
+    formatos escolhe as saídas do relatório entre xlsx, parquet, csv e
+    sqlite (padrão: só o xlsx).
+    Devolve um dicionário com o relatório, a tabela de problemas, o caminho
+    gravado e as estatísticas, ou None se não foi possível processar
+    """
+    global _INSTRUMENTACAO, _DIAGNOSTICO
+    argumentos = (caminho_expedicao, caminhos_csv, data_inicio, data_fim, aba, caminho_relatorio, usar_cache, processos, incremental, formatos)
+    if not instrumentar and perfil_execucao is None and not diagnostico:
+        return _reconciliar(*argumentos)
+    
+    instrumentacao = Instrumentacao(perfil_execucao) if instrumentar or perfil_execucao else None
+    coletor = Diagnostico() if diagnostico else None
+    _INSTRUMENTACAO = instrumentacao
+    _DIAGNOSTICO = coletor
+    if instrumentacao is not None:
+        instrumentacao.iniciar()
+    try:
+        resultado = _reconciliar(*argumentos)
+    finally:
+        _INSTRUMENTACAO = None
+        _DIAGNOSTICO = None
+        if instrumentacao is not None:
+            instrumentacao.finalizar()
+    
+    base = os.path.splitext(resolver_caminho_relatorio(caminho_relatorio))[0]
+    if instrumentacao is not None:
+        caminho_execucao = base + '.execucao.json'
+        try:
+            instrumentacao.gravar(
+                caminho_execucao,
+                expedicao=os.path.abspath(caminho_expedicao),
+                csv=[os.path.abspath(caminho) for caminho in expandir_caminhos_csv(caminhos_csv)],
+                aba=aba,
+                data_inicio=_formatar_data_parametro(data_inicio),
+                data_fim=_formatar_data_parametro(data_fim),
+                concluida=resultado is not None,
+                estatisticas=resultado['estatisticas'] if resultado is not None else None,
+                pico_memoria_mb=max((medida['pico_memoria_mb'] or 0 for medida in instrumentacao.etapas), default=None)
+            )
+            mostrar(f"⏱️ Medição da execução salva em: {caminho_execucao}")
+        except OSError as e:
+            mostrar(f"   ⚠️ Não foi possível gravar a medição da execução: {e}", NIVEL_SILENCIOSO)
+        if resultado is not None:
+            resultado['execucao'] = instrumentacao.resumo()
+    
+    if coletor is not None:
+        caminho_diagnostico = base + '.diagnostico.xlsx'
+        try:
+            coletor.gravar(caminho_diagnostico)
+            mostrar(f"🩺 Diagnóstico salvo em: {caminho_diagnostico}")
+        except OSError as e:
+            mostrar(f"   ⚠️ Não foi possível gravar o diagnóstico: {e}", NIVEL_SILENCIOSO)
+        if resultado is not None:
+            resultado['diagnostico'] = coletor.tabelas()
+    
+    return resultado
+
+def _reconciliar(caminho_expedicao, caminhos_csv, data_inicio, data_fim, aba, caminho_relatorio, usar_cache, processos, incremental, formatos):
+    """
+    Processamento de reconciliar, com cada etapa medida pela instrumentação ativa
+    """
+    caminhos_csv = expandir_caminhos_csv(caminhos_csv)
+    if not caminhos_csv:
+        mostrar("❌ Nenhum arquivo CSV encontrado", NIVEL_SILENCIOSO)
+        return None
+    
+    for caminho in [caminho_expedicao, *caminhos_csv]:
+        if not os.path.exists(caminho):
+            mostrar(f"❌ Arquivo não encontrado: {caminho}", NIVEL_SILENCIOSO)
+            return None
+    
+    mostrar("\n📊 PROCESSANDO DADOS...")
+    
+    def ler_expedicao():
+        inicio = time.perf_counter()
+        with medir_etapa('ler_expedicao') as medida:
+            df = ler_planilha_expedicao(
+                caminho_expedicao, aba, usar_cache=usar_cache, usar_processo=(os.cpu_count() or 1) > 1,
+                filtros=FILTROS_LEITURA_EXPEDICAO, data_inicio=data_inicio, data_fim=data_fim
+            )
+            medida['linhas_saida'] = len(df)
+        return df, time.perf_counter() - inicio
+    
+    # A planilha (Z:) é lida em uma thread enquanto os CSVs (S:) são lidos
+    # aqui: a espera pela rede de um fica sobreposta ao processamento do
+    # outro. Com mais de um núcleo a conversão da planilha vai para outro
+    # processo, já que o openpyxl segura o GIL
+    inicio_leitura = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        leitura_expedicao = executor.submit(ler_expedicao)
+        
+        # Lê o arquivo CSV (AGORA APENAS COM HISTÓRICO 51 E QTDE REAL POSITIVA)
+        mostrar("   📋 Lendo arquivo CSV..." if len(caminhos_csv) == 1 else f"   📋 Lendo {len(caminhos_csv)} arquivos CSV...")
+        with medir_etapa('ler_csv') as medida:
+            df_linhas_csv = carregar_linhas_csvs(caminhos_csv, data_inicio, data_fim, usar_cache=usar_cache, processos=processos)
+            medida['linhas_saida'] = len(df_linhas_csv) if df_linhas_csv is not None else 0
+        segundos_csv = time.perf_counter() - inicio_leitura
+        
+        try:
+            # Lê a planilha de controle de expedição
+            df_expedicao, segundos_expedicao = leitura_expedicao.result()
+            with medir_etapa('filtrar_expedicao', len(df_expedicao)) as medida:
+                df_expedicao_filtrado = filtrar_expedicao(df_expedicao, data_inicio, data_fim)
+                medida['linhas_saida'] = len(df_expedicao_filtrado)
+            
+            # A aba de origem só vai para o relatório quando mais de uma aba contribuiu
+            if df_expedicao_filtrado['ABA'].nunique() <= 1:
+                df_expedicao_filtrado = df_expedicao_filtrado.drop(columns='ABA')
+            
+            mostrar(f"   ✅ Expedição processada: {len(df_expedicao_filtrado)} notas VOG")
+            
+        except Exception as e:
+            mostrar(f"❌ Erro ao ler planilha de expedição: {e}", NIVEL_SILENCIOSO)
+            return None
+    
+    mostrar(
+        f"   ⏱️ Leitura simultânea: expedição {segundos_expedicao:.1f}s, CSV {segundos_csv:.1f}s, "
+        f"total {time.perf_counter() - inicio_leitura:.1f}s",
+        NIVEL_DETALHADO
+    )
+    
+    if df_linhas_csv is None or df_linhas_csv.empty:
+        mostrar("❌ Não foi possível ler o arquivo CSV ou nenhum dado com histórico 51 e QTDE REAL positiva encontrado", NIVEL_SILENCIOSO)
+        return None
+    
+    with medir_etapa('agrupar', len(df_linhas_csv)) as medida:
+        df_agrupado = agrupar_por_nota_fiscal(df_linhas_csv)
+        medida['linhas_saida'] = len(df_agrupado)
+    
+    mostrar(f"   ✅ CSV agrupado: {len(df_agrupado)} notas únicas (histórico 51 + QTDE REAL positiva - valores somados)")
+    
+    # Amostra para conferir os valores somados (só no modo diagnóstico)
+    if _DIAGNOSTICO is not None:
+        _DIAGNOSTICO.registrar_amostra('CSV agrupado', df_agrupado)
+    
+    # Realiza o merge das planilhas
+    with medir_etapa('merge', len(df_expedicao_filtrado) + len(df_agrupado)) as medida:
+        df_comparacao, nfs_csv_sem_expedicao = comparar_expedicao_csv(df_expedicao_filtrado, df_agrupado)
+        medida['linhas_saida'] = len(df_comparacao) + len(nfs_csv_sem_expedicao)
+    
+    # Identifica divergências
+    variacao = None
+    if incremental:
+        caminho_estado = caminho_estado_conferencia(caminho_expedicao, caminhos_csv, aba, data_inicio, data_fim)
+        with medir_etapa('detectar', len(df_comparacao) + len(nfs_csv_sem_expedicao)) as medida:
+            df_relatorio, df_problemas, variacao = detectar_divergencias_incremental(
+                df_comparacao, nfs_csv_sem_expedicao, caminho_estado
+            )
+            medida['linhas_saida'] = len(df_relatorio)
+        total_divergencias = variacao['novas'] + variacao['em_aberto']
+        mostrar(f"   🔁 Incremental: {variacao['reavaliadas']} de {variacao['linhas']} linhas reavaliadas")
+    else:
+        with medir_etapa('detectar', len(df_comparacao) + len(nfs_csv_sem_expedicao)) as medida:
+            df_relatorio, df_problemas = detectar_divergencias(df_comparacao, nfs_csv_sem_expedicao)
+            medida['linhas_saida'] = len(df_relatorio)
+        total_divergencias = len(df_relatorio)
+    
+    # Notas sem par dos dois lados que parecem a mesma nota digitada errado
+    with medir_etapa('aproximar', int((df_comparacao['_merge'] == 'left_only').sum()) + len(nfs_csv_sem_expedicao)) as medida:
+        df_correspondencias = aproximar_notas_fiscais(df_comparacao, nfs_csv_sem_expedicao)
+        medida['linhas_saida'] = len(df_correspondencias)
+    
+    origem = {
+        'expedicao': os.path.abspath(caminho_expedicao),
+        'csv': [os.path.abspath(caminho) for caminho in caminhos_csv],
+        'aba': aba,
+        'data_inicio': _formatar_data_parametro(data_inicio),
+        'data_fim': _formatar_data_parametro(data_fim)
+    }
+    with medir_etapa('indexar', len(df_comparacao) + len(nfs_csv_sem_expedicao)):
+        registros_indice = gravar_indice_notas(df_comparacao, nfs_csv_sem_expedicao, **origem)
+    
+    # Cria relatório final
+    caminho_gravado = None
+    arquivos_relatorio = {}
+    if not df_relatorio.empty:
+        with medir_etapa('escrever_relatorio', len(df_relatorio)):
+            arquivos_relatorio = escrever_relatorio(
+                resolver_caminho_relatorio(caminho_relatorio), df_relatorio, df_problemas, formatos, df_correspondencias
+            )
+        caminho_gravado = next(iter(arquivos_relatorio.values()), None)
+        
+        # RESUMO FINAL SIMPLIFICADO
+        mostrar(f"\n✅ RELATÓRIO CONCLUÍDO")
+        for caminho in arquivos_relatorio.values():
+            mostrar(f"📁 Salvo em: {caminho}")
+        mostrar(f"📊 Total de divergências: {total_divergencias}")
+        if variacao is not None:
+            mostrar(f"   🆕 Novas: {variacao['novas']}  ⏳ Em aberto: {variacao['em_aberto']}  ✔️ Resolvidas: {variacao['resolvidas']}")
+        
+        tipos_problemas = df_problemas['TIPO'].value_counts().to_dict()
+        
+        mostrar("\n🔍 RESUMO DE PROBLEMAS:")
+        if 'nf_nao_encontrada' in tipos_problemas:
+            mostrar(f"   🔴 NFs não encontradas: {tipos_problemas['nf_nao_encontrada']}")
+        if 'peso_divergente' in tipos_problemas:
+            mostrar(f"   🔴 Divergências de PESO: {tipos_problemas['peso_divergente']}")
+        if 'valor_divergente' in tipos_problemas:
+            mostrar(f"   🔴 Divergências de VALOR: {tipos_problemas['valor_divergente']}")
+        if 'erro_digitacao_vog' in tipos_problemas:
+            mostrar(f"   🟡 Erros digitação VOG: {tipos_problemas['erro_digitacao_vog']}")
+        if 'erro_digitacao_valor' in tipos_problemas:
+            mostrar(f"   🟡 Erros digitação VALOR: {tipos_problemas['erro_digitacao_valor']}")
+        if 'nf_repetida_expedicao' in tipos_problemas:
+            mostrar(f"   🟡 NFs repetidas na expedição: {tipos_problemas['nf_repetida_expedicao']} linhas")
+        if not df_correspondencias.empty:
+            mostrar(f"   🔗 Possíveis correspondências de NF: {df_correspondencias['NF_EXPEDICAO'].nunique()} notas "
+                    f"da expedição ({len(df_correspondencias)} pares, aba '{NOME_ABA_CORRESPONDENCIAS}')")
+            
+    else:
+        mostrar("\n✅ Nenhuma divergência encontrada!")
+    
+    # Estatísticas rápidas
+    estatisticas = {
+        'notas_expedicao': len(df_expedicao_filtrado),
+        'notas_csv': len(df_agrupado),
+        'expedicao_sem_csv': int((df_comparacao['_merge'] == 'left_only').sum()),
+        'csv_sem_expedicao': len(nfs_csv_sem_expedicao),
+        'divergencias': total_divergencias
+    }
+    
+    mostrar(f"\n📈 ESTATÍSTICAS:")
+    mostrar(f"   📋 Notas expedição VOG: {estatisticas['notas_expedicao']}")
+    mostrar(f"   📋 Notas CSV (histórico 51 + QTDE REAL positiva): {estatisticas['notas_csv']}")
+    mostrar(f"   ❌ Expedição sem CSV (histórico 51 + QTDE REAL positiva): {estatisticas['expedicao_sem_csv']}")
+    mostrar(f"   ❌ CSV (histórico 51 + QTDE REAL positiva) sem expedição: {estatisticas['csv_sem_expedicao']}")
+    
+    if registros_indice is not None:
+        with medir_etapa('historico', len(registros_indice)):
+            registrar_historico(registros_indice, estatisticas, **origem)
+    
+    return {
+        'relatorio': df_relatorio,
+        'problemas': df_problemas,
+        'correspondencias': df_correspondencias,
+        'caminho_relatorio': caminho_gravado,
+        'arquivos_relatorio': arquivos_relatorio,
+        'estatisticas': estatisticas,
+        'variacao': variacao
+    }
+
+def processar_planilhas():
+    """
+    Modo interativo: usa os caminhos padrão e pergunta o período ao usuário
+    """
+    for caminho in [CAMINHO_EXPEDICAO_PADRAO, CAMINHO_CSV_PADRAO]:
+        if not os.path.exists(caminho):
+            mostrar(f"❌ Arquivo não encontrado: {caminho}", NIVEL_SILENCIOSO)
+            return None
+    
+    # Solicita o período ao usuário
+    data_inicio, data_fim = obter_periodo_usuario()
+    
+    return reconciliar(CAMINHO_EXPEDICAO_PADRAO, [CAMINHO_CSV_PADRAO], data_inicio, data_fim)
+
+def formatar_numero_brasileiro(valores, casas=2):
+    """
+    Formata números como texto no padrão brasileiro (1.234,56)
+    """
+    troca = str.maketrans(',.', '.,')
+    return np.array([f'{valor:,.{casas}f}'.translate(troca) for valor in valores], dtype=object)
+
+def _gravar_planilha_sintetica(caminho, aba, linhas):
+    """
+    Grava a planilha sintética com três linhas de título antes do cabeçalho,
+    como a planilha de controle de expedição
+    """
+    cabecalho = ['DATA', 'NF', 'CLIENTE', 'OPERAÇÃO', 'VOG', 'R$ NF', 'STATUS']
+    titulos = [['CONTROLE DE EXPEDIÇÃO'], ['LOGÍSTICA'], []]
+    
+    if xlsxwriter is not None:
+        workbook = xlsxwriter.Workbook(caminho, {'constant_memory': True})
+        worksheet = workbook.add_worksheet(aba)
+        formato_data = workbook.add_format({'num_format': 'dd/mm/yyyy'})
+        for numero, titulo in enumerate(titulos):
+            worksheet.write_row(numero, 0, titulo)
+        worksheet.write_row(3, 0, cabecalho)
+        for numero, linha in enumerate(linhas, start=4):
+            worksheet.write_datetime(numero, 0, linha[0], formato_data)
+            worksheet.write_row(numero, 1, linha[1:])
+        workbook.close()
+        return
+    
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet(aba)
+    for titulo in titulos + [cabecalho]:
+        worksheet.append(titulo)
+    for linha in linhas:
+        worksheet.append(linha)
+    workbook.save(caminho)
+
+def gerar_dados_sinteticos(pasta, linhas=1000, semente=0):
+    """
+    Gera uma planilha de expedição e um CSV de fechamento sintéticos e
+    reproduzíveis (mesma semente, mesmos arquivos) para o benchmark.
+    A planilha tem o cabeçalho na linha 4, operações VOG e outras, status
+    válidos e inválidos, VOG/R$ NF como número ou texto e alguns erros de
+    digitação. O CSV usa ';', números no formato brasileiro, vários códigos
+    de histórico, QTDE REAL negativa e notas divididas em várias linhas.
+    Arquivos já gerados com o mesmo tamanho e semente são reaproveitados.
+    Devolve (caminho_expedicao, caminho_csv)
+    """
+    os.makedirs(pasta, exist_ok=True)
+    caminho_expedicao = os.path.join(pasta, f'expedicao-{linhas}-{semente}.xlsx')
+    caminho_csv = os.path.join(pasta, f'fechamento-{linhas}-{semente}.csv')
+    if os.path.exists(caminho_expedicao) and os.path.exists(caminho_csv):
+        return caminho_expedicao, caminho_csv
+    
+    rng = np.random.default_rng(semente)
+    nfs = 100000 + rng.permutation(linhas * 2)[:linhas]
+    dias = pd.Timestamp('2025-01-01') + pd.to_timedelta(rng.integers(0, 180, linhas), unit='D')
+    pesos = np.round(rng.uniform(1, 900, linhas), 2)
+    valores = np.round(rng.uniform(10, 90000, linhas), 2)
+    operacoes = rng.choice(OPERACOES_VOG + ['TRANSFERÊNCIA', 'RETIRA'], linhas, p=[.6, .05, .05, .05, .05, .1, .1])
+    status = rng.choice(STATUS_VALIDOS + ['CANCELADO', 'AGUARDANDO'], linhas, p=[.55, .15, .1, .1, .1])
+    
+    # VOG e R$ NF como foram digitados: número, texto no formato brasileiro,
+    # valores divergentes e erros de digitação
+    sorteio = rng.random((4, linhas))
+    vog = pesos.astype(object)
+    texto = sorteio[0] < 0.15
+    vog[texto] = formatar_numero_brasileiro(pesos[texto])
+    divergente = sorteio[1] < 0.03
+    vog[divergente] = pesos[divergente] + 5
+    r_nf = valores.astype(object)
+    texto = sorteio[2] < 0.2
+    r_nf[texto] = formatar_numero_brasileiro(valores[texto])
+    erro = sorteio[3] < 0.01
+    r_nf[erro] = [f'{int(valor)},{indice % 10},5' for indice, valor in zip(np.flatnonzero(erro), valores[erro])]
+    
+    nf_planilha = nfs.astype(str).astype(object)
+    numerica = rng.random(linhas) < 0.1
+    nf_planilha[numerica] = nfs[numerica].tolist()
+    
+    _gravar_planilha_sintetica(caminho_expedicao, ABA_EXPEDICAO, zip(
+        dias.to_pydatetime(), nf_planilha, [f'CLIENTE {indice % 997}' for indice in range(linhas)],
+        operacoes, vog, r_nf, status
+    ))
+    
+    # CSV: 95% das notas, cada uma dividida em 1 a 3 linhas de histórico 51,
+    # mais devoluções (QTDE REAL negativa), outros históricos e notas só do CSV
+    no_csv = rng.random(linhas) < 0.95
+    partes = rng.integers(1, 4, linhas) * no_csv
+    indice_linha = np.repeat(np.arange(linhas), partes)
+    quantidade = len(indice_linha)
+    peso_parte = pesos[indice_linha] / partes[indice_linha]
+    valor_parte = valores[indice_linha] / partes[indice_linha]
+    historico = np.full(quantidade, HISTORICO_CONFERENCIA)
+    
+    extras = max(linhas // 20, 1)
+    indice_extra = rng.integers(0, linhas, extras)
+    devolucao = np.arange(extras) % 2 == 0
+    peso_extra = np.where(devolucao, -pesos[indice_extra], pesos[indice_extra])
+    historico_extra = np.where(devolucao, HISTORICO_CONFERENCIA, rng.choice([1, 52, 60, 99], extras))
+    nfs_so_csv = 100000 + linhas * 2 + np.arange(extras)
+    
+    df_csv = pd.DataFrame({
+        'DATA': np.concatenate([dias[indice_linha], dias[indice_extra], dias[indice_extra]]).astype('datetime64[ns]'),
+        'NF-E': np.concatenate([nfs[indice_linha], nfs[indice_extra], nfs_so_csv]),
+        'CLIENTE': 'CLIENTE',
+        'QTDE REAL': np.concatenate([peso_parte, peso_extra, pesos[indice_extra]]),
+        'FAT BRUTO': np.concatenate([valor_parte, valores[indice_extra], valores[indice_extra]]),
+        'HISTÓRICO': np.concatenate([historico, historico_extra, np.full(extras, HISTORICO_CONFERENCIA)])
+    })
+    df_csv = df_csv.iloc[rng.permutation(len(df_csv))]
+    df_csv['DATA'] = df_csv['DATA'].dt.strftime('%d/%m/%Y')
+    df_csv['QTDE REAL'] = formatar_numero_brasileiro(df_csv['QTDE REAL'], casas=3)
+    df_csv['FAT BRUTO'] = formatar_numero_brasileiro(df_csv['FAT BRUTO'])
+    df_csv.to_csv(caminho_csv, sep=';', index=False, encoding='latin-1')
+    
+    return caminho_expedicao, caminho_csv
+
+def comparar_leitores_planilha(caminho_expedicao):
+    """
+    Mede a leitura da planilha pelo pd.read_excel, pelo leitor rápido e pelo
+    leitor rápido com os filtros na leitura, e confere se os dois primeiros
+    devolvem o mesmo DataFrame
+    """
+    leituras = {}
+    lidos = {}
+    instrumentacao = Instrumentacao()
+    for nome, leitor, filtros in [('pandas', 'pandas', None), ('rapido', 'rapido', None), ('rapido_filtrado', 'rapido', FILTROS_LEITURA_EXPEDICAO)]:
+        with instrumentacao.etapa(nome) as medida, verbosidade(NIVEL_SILENCIOSO):
+            lidos[nome] = ler_planilha_expedicao(caminho_expedicao, usar_cache=False, filtros=filtros, leitor=leitor)
+        leituras[nome] = {
+            'segundos': medida['segundos'],
+            'pico_memoria_mb': medida['pico_memoria_mb'],
+            'linhas': len(lidos[nome])
+        }
+        mostrar(f"   📖 {nome:<15} {medida['segundos']:8.3f}s  {_texto_memoria(medida['pico_memoria_mb'])}")
+    leituras['rapido_igual_pandas'] = bool(lidos['rapido'].equals(lidos['pandas']))
+    if not leituras['rapido_igual_pandas']:
+        mostrar("   ⚠️ O leitor rápido devolveu um resultado diferente do pd.read_excel", NIVEL_SILENCIOSO)
+    return leituras
+
+def executar_benchmark(tamanhos=(1000, 100000, 1000000), pasta='benchmark', semente=0, caminho_resultado=None,
+                       comparar_leitores=False):
+    """
+    Gera (ou reaproveita) os dados sintéticos de cada tamanho e mede o tempo
+    e o pico de memória de cada etapa da conferência, sem cache.
+    Com comparar_leitores mede também a leitura da planilha pelo pd.read_excel
+    contra o leitor rápido.
+    Grava o resultado em JSON para comparar uma versão com a outra
+    """
+    resultados = []
+    for linhas in tamanhos:
+        mostrar(f"\n🧪 BENCHMARK: {linhas} linhas")
+        inicio = time.perf_counter()
+        caminho_expedicao, caminho_csv = gerar_dados_sinteticos(pasta, linhas, semente)
+        mostrar(f"   📦 Dados prontos em {time.perf_counter() - inicio:.1f}s")
+        
+        etapas = [
+            ('ler_excel', lambda dados: ler_planilha_expedicao(caminho_expedicao, usar_cache=False)),
+            ('ler_csv', lambda dados: ler_csv_com_cabecalho(caminho_csv, tamanho_bloco=TAMANHO_BLOCO_CSV)),
+            ('limpar', lambda dados: (filtrar_expedicao(dados['ler_excel']), preparar_linhas_csv(dados['ler_csv']))),
+            ('agrupar', lambda dados: agrupar_por_nota_fiscal(dados['limpar'][1])),
+            ('merge', lambda dados: comparar_expedicao_csv(dados['limpar'][0], dados['agrupar'])),
+            ('detectar', lambda dados: detectar_divergencias(*dados['merge'])),
+            ('escrever', lambda dados: escrever_relatorio_excel(
+                os.path.join(pasta, f'relatorio-{linhas}-{semente}.xlsx'), *dados['detectar']
+            ))
+        ]
+        
+        dados = {}
+        medidas = {}
+        instrumentacao = Instrumentacao()
+        for nome, etapa in etapas:
+            # As mensagens de progresso das etapas não entram no resultado
+            with instrumentacao.etapa(nome) as medida, verbosidade(NIVEL_SILENCIOSO):
+                dados[nome] = etapa(dados)
+            medidas[nome] = {chave: medida[chave] for chave in ('segundos', 'cpu_segundos', 'pico_memoria_mb')}
+            mostrar(f"   ⏱️ {nome:<10} {medida['segundos']:8.3f}s  {_texto_memoria(medida['pico_memoria_mb'])}")
+        
+        with open(caminho_csv, 'rb') as arquivo:
+            linhas_csv = sum(1 for _ in arquivo) - 1
+        resultados.append({
+            'linhas_expedicao': linhas,
+            'linhas_csv': linhas_csv,
+            'total_segundos': round(sum(medida['segundos'] for medida in medidas.values()), 4),
+            'etapas': medidas
+        })
+        mostrar(f"   ✅ Total: {resultados[-1]['total_segundos']:.3f}s")
+        
+        if comparar_leitores:
+            resultados[-1]['leitura_planilha'] = comparar_leitores_planilha(caminho_expedicao)
+    
+    relatorio = {
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'semente': semente,
+        'python': sys.version.split()[0],
+        'pandas': pd.__version__,
+        'plataforma': sys.platform,
+        'resultados': resultados
+    }
+    if caminho_resultado is None:
+        caminho_resultado = os.path.join(pasta, f"benchmark-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(caminho_resultado, 'w', encoding='utf-8') as arquivo:
+        json.dump(relatorio, arquivo, ensure_ascii=False, indent=2)
+    mostrar(f"\n📁 Resultado do benchmark salvo em: {caminho_resultado}")
+    return relatorio
+
+def converter_data_argumento(texto):
+    """
+    Converte a data recebida na linha de comando (DD/MM/AAAA ou AAAA-MM-DD)
+    """
+    if texto is None or texto == '':
+        return None
+    for formato in ('%d/%m/%Y', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(texto, formato)
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError(f"data inválida: {texto!r} (use DD/MM/AAAA)")
+
+def ler_trabalhos_lote(caminho):
+    """
+    Lê o arquivo JSON do modo lote: uma lista de trabalhos com as chaves
+    expedicao, csv (caminho ou lista), inicio, fim, aba, saida e formatos
+    """
+    with open(caminho, encoding='utf-8') as arquivo:
+        trabalhos = json.load(arquivo)
+    if isinstance(trabalhos, dict):
+        trabalhos = trabalhos.get('trabalhos', [])
+    
+    pasta_base = os.path.dirname(os.path.abspath(caminho))
+    resolvidos = []
+    for numero, trabalho in enumerate(trabalhos, start=1):
+        if 'expedicao' not in trabalho or 'csv' not in trabalho:
+            raise ValueError(f"trabalho {numero} sem 'expedicao' ou 'csv'")
+        
+        caminhos_csv = trabalho['csv'] if isinstance(trabalho['csv'], list) else [trabalho['csv']]
+        # Pastas e padrões glob são expandidos depois, em reconciliar
+        saida = trabalho.get('saida')
+        if saida is None:
+            saida = os.path.join(str(Path.home() / "Downloads"), f"RELATORIO_DIVERGENCIAS_{numero}.xlsx")
+        
+        resolvidos.append({
+            'expedicao': os.path.join(pasta_base, trabalho['expedicao']),
+            'csv': [os.path.join(pasta_base, caminho_csv) for caminho_csv in caminhos_csv],
+            'inicio': converter_data_argumento(trabalho.get('inicio')),
+            'fim': converter_data_argumento(trabalho.get('fim')),
+            'aba': trabalho.get('aba'),
+            'saida': os.path.join(pasta_base, saida),
+            'formatos': trabalho.get('formatos')
+        })
+    return resolvidos
+
+def processar_lote(trabalhos, usar_cache=True, processos=None, incremental=False, instrumentar=False, perfil_execucao=None,
+                   diagnostico=False, formatos=None):
+    """
+    Executa vários trabalhos no mesmo processo; as entradas já lidas ficam no
+    cache em memória e são reaproveitadas pelos trabalhos seguintes.
+    formatos vale para os trabalhos que não escolhem os seus.
+    Devolve a lista de resultados (None para os que falharam)
+    """
+    resultados = []
+    for numero, trabalho in enumerate(trabalhos, start=1):
+        mostrar(f"\n===== TRABALHO {numero}/{len(trabalhos)} =====")
+        try:
+            resultado = reconciliar(
+                trabalho['expedicao'], trabalho['csv'], trabalho['inicio'], trabalho['fim'],
+                aba=trabalho['aba'], caminho_relatorio=trabalho['saida'], usar_cache=usar_cache,
+                processos=processos, incremental=incremental,
+                instrumentar=instrumentar, perfil_execucao=perfil_execucao, diagnostico=diagnostico,
+                formatos=trabalho.get('formatos') or formatos
+            )
+        except Exception as e:
+            mostrar(f"❌ Erro no trabalho {numero}: {e}", NIVEL_SILENCIOSO)
+            resultado = None
+        resultados.append(resultado)
+    
+    falhas = sum(resultado is None for resultado in resultados)
+    mostrar(f"\n📦 LOTE CONCLUÍDO: {len(resultados) - falhas} de {len(resultados)} trabalhos processados")
+    return resultados
+
+# Modo vigia: as entradas ficam em compartilhamentos de rede, onde avisos do
+# sistema de arquivos não são confiáveis, então os arquivos são consultados
+# a cada INTERVALO_VIGIA segundos. Uma mudança só dispara a conferência
+# depois de ESPERA_VIGIA segundos sem novas mudanças, para que salvamentos
+# seguidos (ou um CSV ainda sendo copiado) gerem uma execução só
+INTERVALO_VIGIA = 2.0
+ESPERA_VIGIA = 3.0
+
+def estado_entradas(caminho_expedicao, caminhos_csv):
+    """
+    Tamanho e data de modificação da planilha e de cada CSV (pastas e padrões
+    glob expandidos de novo, para pegar os CSVs novos); arquivos inacessíveis
+    no momento ficam de fora
+    """
+    estado = {}
+    for caminho in [caminho_expedicao, *expandir_caminhos_csv(caminhos_csv)]:
+        try:
+            informacoes = os.stat(caminho)
+        except OSError:
+            continue
+        estado[os.path.abspath(caminho)] = (informacoes.st_size, informacoes.st_mtime_ns)
+    return estado
+
+def descrever_mudancas(anterior, atual):
+    """
+    Texto curto com os arquivos novos, alterados e removidos entre dois estados
+    """
+    partes = []
+    for rotulo, caminhos in (
+        ('novo', [caminho for caminho in atual if caminho not in anterior]),
+        ('alterado', [caminho for caminho in atual if caminho in anterior and atual[caminho] != anterior[caminho]]),
+        ('removido', [caminho for caminho in anterior if caminho not in atual])
+    ):
+        if caminhos:
+            nomes = ', '.join(os.path.basename(caminho) for caminho in caminhos[:3])
+            partes.append(f"{rotulo}: {nomes}{', ...' if len(caminhos) > 3 else ''}")
+    return '; '.join(partes)
+
+def periodo_vigia(data_inicio=None, data_fim=None, dias=None):
+    """
+    Período de cada conferência da vigia: o informado ou, com dias, os
+    últimos dias até hoje, recalculado a cada execução
+    """
+    if dias is None:
+        return data_inicio, data_fim
+    hoje = pd.Timestamp.now().normalize().to_pydatetime()
+    return hoje - pd.Timedelta(days=dias - 1).to_pytimedelta(), hoje
+
+def vigiar(caminho_expedicao, caminhos_csv, data_inicio=None, data_fim=None, dias=None, aba=None,
+           caminho_relatorio=None, processos=None, incremental=False, formatos=None,
+           intervalo=INTERVALO_VIGIA, espera=ESPERA_VIGIA, max_execucoes=None):
+    """
+    Fica em execução conferindo de novo sempre que a planilha de expedição
+    muda ou um CSV aparece, muda ou some na pasta vigiada. As entradas já
+    lidas ficam num cache em memória próprio da vigia entre as execuções,
+    então só os arquivos alterados são lidos de novo; com incremental só as
+    linhas alteradas são reavaliadas. Para com Ctrl+C ou depois de max_execucoes conferências.
+    Devolve o número de conferências feitas
+    """
+    mostrar(f"👀 Vigiando {caminho_expedicao} e {', '.join(str(caminho) for caminho in caminhos_csv)} "
+            f"(a cada {intervalo:g}s; Ctrl+C para sair)")
+    
+    processado = None
+    execucoes = 0
+    # O cache em memória da vigia é só dela: o limite maior não sobra para depois
+    with cache_memoria_proprio() as cache:
+        try:
+            while max_execucoes is None or execucoes < max_execucoes:
+                atual = estado_entradas(caminho_expedicao, caminhos_csv)
+                if atual == processado:
+                    time.sleep(intervalo)
+                    continue
+                
+                # Espera os salvamentos pararem antes de conferir
+                while True:
+                    time.sleep(espera)
+                    seguinte = estado_entradas(caminho_expedicao, caminhos_csv)
+                    if seguinte == atual:
+                        break
+                    atual = seguinte
+                
+                if processado is not None:
+                    mostrar(f"\n🔔 Mudança detectada ({descrever_mudancas(processado, atual)})")
+                processado = atual
+                if os.path.abspath(caminho_expedicao) not in atual:
+                    mostrar(f"   ⚠️ Planilha de expedição inacessível: {caminho_expedicao}", NIVEL_SILENCIOSO)
+                    continue
+                
+                # Todas as entradas cabem no cache em memória da vigia, para nenhuma
+                # ser lida de novo sem ter mudado
+                cache['limite'] = max(cache['limite'], 2 * len(atual) + MAX_ENTRADAS_MEMORIA)
+                inicio_periodo, fim_periodo = periodo_vigia(data_inicio, data_fim, dias)
+                inicio = time.perf_counter()
+                try:
+                    resultado = reconciliar(
+                        caminho_expedicao, caminhos_csv, inicio_periodo, fim_periodo, aba=aba,
+                        caminho_relatorio=caminho_relatorio, processos=processos, incremental=incremental,
+                        formatos=formatos
+                    )
+                except Exception as e:
+                    mostrar(f"❌ Erro na conferência: {e}", NIVEL_SILENCIOSO)
+                    resultado = None
+                execucoes += 1
+                
+                if resultado is not None:
+                    mostrar(f"🔄 Conferência {execucoes} concluída em {time.perf_counter() - inicio:.1f}s "
+                            f"({datetime.now():%d/%m/%Y %H:%M:%S}); aguardando mudanças...")
+        except KeyboardInterrupt:
+            mostrar("\n⏹️ Vigia encerrada")
+    return execucoes
+
+def criar_parser():
+    """
+    Monta os argumentos da linha de comando
+    """
+    parser = argparse.ArgumentParser(
+        description="Confere a planilha de controle de expedição com o CSV de fechamento"
+    )
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+    
+    # Opções comuns a todos os comandos
+    comum = argparse.ArgumentParser(add_help=False)
+    grupo_verbosidade = comum.add_mutually_exclusive_group()
+    grupo_verbosidade.add_argument('-q', '--silencioso', action='store_const', const=NIVEL_SILENCIOSO, dest='verbosidade',
+                                   help="mostra só erros e avisos")
+    grupo_verbosidade.add_argument('-v', '--detalhado', action='store_const', const=NIVEL_DETALHADO, dest='verbosidade',
+                                   help="mostra também colunas, amostras, blocos e tempo das etapas")
+    
+    # Opções de medição da conferência
+    medicao = argparse.ArgumentParser(add_help=False)
+    medicao.add_argument('--instrumentar', action='store_true', help="grava tempo e memória de cada etapa em JSON ao lado do relatório")
+    medicao.add_argument('--perfil-execucao', choices=['cprofile', 'tracemalloc'], help="captura também um cProfile ou tracemalloc")
+    medicao.add_argument('--diagnostico', action='store_true', help="grava distribuições, células não convertidas e reescaladas em planilha separada")
+    
+    # Formatos do relatório
+    saida = argparse.ArgumentParser(add_help=False)
+    saida.add_argument('--formato', nargs='+', choices=list(ESCRITORES_RELATORIO), dest='formatos',
+                       help="formato(s) do relatório: xlsx, parquet, csv, sqlite (padrão: xlsx)")
+    
+    parser_reconciliar = subparsers.add_parser('reconciliar', parents=[comum, medicao, saida], help="processa uma planilha e um ou mais CSVs")
+    parser_reconciliar.add_argument('--expedicao', required=True, help="planilha de controle de expedição (.xlsx)")
+    parser_reconciliar.add_argument('--csv', required=True, nargs='+', help="CSV(s) de fechamento, pastas ou padrões glob")
+    parser_reconciliar.add_argument('--aba', nargs='+', default=None,
+                                    help="aba(s) da planilha de expedição (padrão: todas com o cabeçalho esperado e datas no período)")
+    parser_reconciliar.add_argument('--inicio', type=converter_data_argumento, help="data de início (DD/MM/AAAA)")
+    parser_reconciliar.add_argument('--fim', type=converter_data_argumento, help="data de fim (DD/MM/AAAA)")
+    parser_reconciliar.add_argument('--saida', help="arquivo ou pasta do relatório (padrão: Downloads)")
+    parser_reconciliar.add_argument('--sem-cache', action='store_true', help="não usa o cache local")
+    parser_reconciliar.add_argument('--processos', type=int, help="processos para ler os CSVs (padrão: núcleos da máquina)")
+    parser_reconciliar.add_argument('--incremental', action='store_true', help="reavalia só o que mudou desde a última execução")
+    
+    parser_benchmark = subparsers.add_parser('benchmark', parents=[comum], help="mede cada etapa com dados sintéticos")
+    parser_benchmark.add_argument('--tamanhos', type=int, nargs='+', default=[1000, 100000, 1000000], help="linhas da planilha sintética")
+    parser_benchmark.add_argument('--pasta', default='benchmark', help="pasta dos dados gerados e dos resultados")
+    parser_benchmark.add_argument('--semente', type=int, default=0, help="semente do gerador")
+    parser_benchmark.add_argument('--saida', help="arquivo JSON do resultado")
+    parser_benchmark.add_argument('--comparar-leitores', action='store_true', help="mede também a leitura da planilha pelo pd.read_excel")
+    
+    parser_lote = subparsers.add_parser('lote', parents=[comum, medicao, saida], help="executa os trabalhos listados em um arquivo JSON")
+    parser_lote.add_argument('arquivo', help="JSON com a lista de trabalhos")
+    parser_lote.add_argument('--sem-cache', action='store_true', help="não usa o cache local")
+    parser_lote.add_argument('--processos', type=int, help="processos para ler os CSVs (padrão: núcleos da máquina)")
+    parser_lote.add_argument('--incremental', action='store_true', help="reavalia só o que mudou desde a última execução")
+    
+    parser_vigiar = subparsers.add_parser('vigiar', parents=[comum, saida],
+                                          help="confere de novo sempre que a planilha ou os CSVs mudam")
+    parser_vigiar.add_argument('--expedicao', default=CAMINHO_EXPEDICAO_PADRAO, help="planilha de controle de expedição (.xlsx)")
+    parser_vigiar.add_argument('--csv', nargs='+', default=[os.path.dirname(CAMINHO_CSV_PADRAO)],
+                               help="CSV(s) de fechamento, pastas ou padrões glob (padrão: a pasta dos fechamentos)")
+    parser_vigiar.add_argument('--aba', nargs='+', default=None, help="aba(s) da planilha de expedição")
+    grupo_periodo = parser_vigiar.add_mutually_exclusive_group()
+    grupo_periodo.add_argument('--inicio', type=converter_data_argumento, help="data de início (DD/MM/AAAA)")
+    grupo_periodo.add_argument('--dias', type=int, help="confere os últimos N dias até hoje, recalculados a cada execução")
+    parser_vigiar.add_argument('--fim', type=converter_data_argumento, help="data de fim (DD/MM/AAAA)")
+    parser_vigiar.add_argument('--saida', help="arquivo ou pasta do relatório (padrão: Downloads)")
+    parser_vigiar.add_argument('--processos', type=int, help="processos para ler os CSVs (padrão: núcleos da máquina)")
+    parser_vigiar.add_argument('--incremental', action='store_true', help="reavalia só o que mudou desde a última execução")
+    parser_vigiar.add_argument('--intervalo', type=float, default=INTERVALO_VIGIA, help="segundos entre as consultas aos arquivos")
+    parser_vigiar.add_argument('--espera', type=float, default=ESPERA_VIGIA,
+                               help="segundos sem mudanças antes de conferir (agrupa salvamentos seguidos)")
+    
+    parser_consultar = subparsers.add_parser('consultar', parents=[comum], help="consulta notas no índice da última conferência")
+    parser_consultar.add_argument('notas', nargs='+', help="número(s) da nota fiscal")
+    parser_consultar.add_argument('--indice', help="pasta do índice (padrão: índice da última conferência no cache)")
+    parser_consultar.add_argument('--json', action='store_true', help="mostra o resultado em JSON")
+    
+    parser_historico = subparsers.add_parser('historico', parents=[comum], help="consulta o histórico das conferências")
+    parser_historico.add_argument('consulta', choices=['tendencia', 'nf', 'execucoes'],
+                                  help="problemas por período, histórico de notas ou execuções registradas")
+    parser_historico.add_argument('notas', nargs='*', help="número(s) da nota fiscal (consulta nf)")
+    parser_historico.add_argument('--por', choices=list(AGRUPAMENTOS_HISTORICO), default='semana', help="agrupamento da tendência")
+    parser_historico.add_argument('--tipo', nargs='+', choices=TIPOS_PROBLEMA, help="tipos de problema da tendência")
+    parser_historico.add_argument('--inicio', type=converter_data_argumento, help="data de início (DD/MM/AAAA)")
+    parser_historico.add_argument('--fim', type=converter_data_argumento, help="data de fim (DD/MM/AAAA)")
+    parser_historico.add_argument('--banco', help="arquivo do histórico (padrão: historico.sqlite no cache)")
+    parser_historico.add_argument('--json', action='store_true', help="mostra o resultado em JSON")
+    
+    return parser
+
+def mostrar_consulta_nota(nota, linhas):
+    """
+    Mostra o resultado da consulta de uma nota
+    """
+    if not linhas:
+        mostrar(f"❌ NF {nota}: não está no índice da última conferência")
+        return
+    for linha in linhas:
+        problemas = ', '.join(linha['PROBLEMAS']) or 'nenhum'
+        mostrar(f"\n📄 NF {linha['NF']} ({linha['ORIGEM']})")
+        mostrar(f"   📅 Expedição: {linha['DATA_EXPEDICAO'] or '-'}  CSV: {linha['DATA_CSV'] or '-'}")
+        mostrar(f"   🚚 Status: {linha['STATUS'] or '-'}  Operação: {linha['OPERAÇÃO'] or '-'}")
+        mostrar(f"   ⚖️ VOG: {linha['VOG_Expedição']}  PESO CSV: {linha['PESO_CSV']}")
+        mostrar(f"   💰 R$ NF: {linha['R$ NF_Expedição']}  TOTAL CSV: {linha['TOTAL_CSV']}")
+        mostrar(f"   🔍 Problemas: {problemas}")
+
+def main(argv=None):
+    """
+    Ponto de entrada da linha de comando; devolve o código de saída
+    """
+    args = criar_parser().parse_args(argv)
+    if args.verbosidade is not None:
+        definir_verbosidade(args.verbosidade)
+    
+    if args.comando == 'reconciliar':
+        if args.inicio and args.fim and args.inicio > args.fim:
+            mostrar("❌ Data de início não pode ser maior que data de fim!", NIVEL_SILENCIOSO)
+            return 2
+        resultado = reconciliar(
+            args.expedicao, args.csv, args.inicio, args.fim,
+            aba=args.aba, caminho_relatorio=args.saida, usar_cache=not args.sem_cache,
+            processos=args.processos, incremental=args.incremental,
+            instrumentar=args.instrumentar, perfil_execucao=args.perfil_execucao, diagnostico=args.diagnostico,
+            formatos=args.formatos
+        )
+        return 0 if resultado is not None else 1
+    
+    if args.comando == 'lote':
+        try:
+            trabalhos = ler_trabalhos_lote(args.arquivo)
+        except (OSError, ValueError, argparse.ArgumentTypeError) as e:
+            mostrar(f"❌ Erro ao ler o arquivo de lote: {e}", NIVEL_SILENCIOSO)
+            return 2
+        resultados = processar_lote(
+            trabalhos, usar_cache=not args.sem_cache, processos=args.processos, incremental=args.incremental,
+            instrumentar=args.instrumentar, perfil_execucao=args.perfil_execucao, diagnostico=args.diagnostico,
+            formatos=args.formatos
+        )
+        return 0 if all(resultado is not None for resultado in resultados) else 1
+    
+    if args.comando == 'vigiar':
+        if args.dias is not None and (args.dias < 1 or args.fim):
+            mostrar("❌ --dias precisa ser positivo e não combina com --fim", NIVEL_SILENCIOSO)
+            return 2
+        if args.inicio and args.fim and args.inicio > args.fim:
+            mostrar("❌ Data de início não pode ser maior que data de fim!", NIVEL_SILENCIOSO)
+            return 2
+        vigiar(
+            args.expedicao, args.csv, args.inicio, args.fim, dias=args.dias, aba=args.aba,
+            caminho_relatorio=args.saida, processos=args.processos, incremental=args.incremental,
+            formatos=args.formatos, intervalo=args.intervalo, espera=args.espera
+        )
+        return 0
+    
+    if args.comando == 'benchmark':
+        executar_benchmark(args.tamanhos, args.pasta, args.semente, args.saida, comparar_leitores=args.comparar_leitores)
+        return 0
+    
+    if args.comando == 'consultar':
+        indice = abrir_indice_notas(args.indice)
+        if indice is None:
+            mostrar("❌ Índice de consulta não encontrado; execute uma conferência primeiro", NIVEL_SILENCIOSO)
+            return 1
+        resultados = {nota: consultar_nota_fiscal(nota, indice=indice) for nota in args.notas}
+        if args.json:
+            print(json.dumps(resultados, ensure_ascii=False, indent=1))
+        else:
+            mostrar(f"🔎 Índice gerado em {indice[2]['gerado_em']}", NIVEL_DETALHADO)
+            for nota, linhas in resultados.items():
+                mostrar_consulta_nota(nota, linhas)
+        return 0 if all(resultados.values()) else 1
+    
+    if args.comando == 'historico':
+        if args.consulta == 'nf' and not args.notas:
+            mostrar("❌ Informe a(s) nota(s) fiscal(is) da consulta", NIVEL_SILENCIOSO)
+            return 2
+        if args.consulta == 'tendencia':
+            resultados = {f'Problemas por {args.por}': consultar_tendencia(args.por, args.tipo, args.inicio, args.fim, args.banco)}
+        elif args.consulta == 'nf':
+            resultados = {nota: historico_nota_fiscal(nota, args.banco) for nota in args.notas}
+        else:
+            resultados = {'Execuções registradas': listar_execucoes_historico(args.banco)}
+        
+        if args.json:
+            print(json.dumps(
+                {nome: json.loads(df.to_json(orient='records', force_ascii=False)) for nome, df in resultados.items()},
+                ensure_ascii=False, indent=1
+            ))
+            return 0
+        for nome, df in resultados.items():
+            if args.consulta == 'tendencia' and not df.empty:
+                df = df.pivot_table(index='periodo', columns='tipo', values='quantidade', fill_value=0, aggfunc='sum')
+            mostrar(f"\n🗃️ {'NF ' + nome if args.consulta == 'nf' else nome}")
+            mostrar(df.to_string() if not df.empty else "   (nada registrado)")
+        return 0
     
-    print(f"\n📈 ESTATÍSTICAS:")
-    print(f"   📋 Notas expedição VOG: {len(df_expedicao_filtrado)}")
-    print(f"   📋 Notas CSV (histórico 51 + QTDE REAL positiva): {len(df_agrupado)}")
-    print(f"   ❌ Expedição sem CSV (histórico 51 + QTDE REAL positiva): {nfs_sem_match_expedicao}")
-    print(f"   ❌ CSV (histórico 51 + QTDE REAL positiva) sem expedição: {nfs_sem_match_csv}")
+    return 2
 
 if __name__ == "__main__":
+    # Sem argumentos mantém o modo interativo de sempre
+    if len(sys.argv) > 1:
+        sys.exit(main())
     processar_planilhas()
-    input("\nPressione Enter para sair...")
\ No newline at end of file
+    input("\nPressione Enter para sair...")
@@ -0,0 +1,22 @@
+import importlib.util
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+CAMINHO_SCRIPT = Path(__file__).resolve().parent.parent / 'averiguar_expedição.py'
+
+
+@pytest.fixture(scope='session')
+def averiguar(tmp_path_factory):
+    """
+    O script carregado como módulo, com o cache numa pasta temporária
+    """
+    os.environ['AVERIGUAR_CACHE_DIR'] = str(tmp_path_factory.mktemp('cache'))
+    spec = importlib.util.spec_from_file_location('averiguar_expedicao', CAMINHO_SCRIPT)
+    modulo = importlib.util.module_from_spec(spec)
+    # Registrado antes de executar para que os processos filhos o encontrem
+    sys.modules[spec.name] = modulo
+    spec.loader.exec_module(modulo)
+    return modulo
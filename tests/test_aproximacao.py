@@ -0,0 +1,101 @@
+"""
+Aproximação de notas: pares a um dígito de distância entre as notas sem par
+dos dois lados, filtrados e ordenados pela concordância de PESO e TOTAL
+"""
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+
+def conferencia(averiguar, expedicao, csv):
+    """
+    Comparação e notas só do CSV como na conferência: expedicao é uma lista
+    de (NF, VOG, R$ NF) e csv de linhas (NOTA FISCAL, PESO, TOTAL)
+    """
+    df_expedicao = pd.DataFrame(expedicao, columns=['NF', 'VOG', 'R$ NF']).assign(
+        STATUS='ENTREGUE', DATA=datetime(2025, 11, 3), **{'OPERAÇÃO': 'VOG'}
+    )
+    df_linhas = averiguar.preparar_linhas_csv(
+        pd.DataFrame(csv, columns=['NOTA FISCAL', 'PESO', 'TOTAL']).assign(DATA='04/11/2025')
+    )
+    return averiguar.comparar_expedicao_csv(
+        averiguar.filtrar_expedicao(df_expedicao), averiguar.agrupar_por_nota_fiscal(df_linhas)
+    )
+
+
+def aproximar(averiguar, expedicao, csv):
+    df_pares = averiguar.aproximar_notas_fiscais(*conferencia(averiguar, expedicao, csv))
+    return [(str(a), str(b), diferenca) for a, b, diferenca in df_pares[['NF_EXPEDICAO', 'NF_CSV', 'DIFERENCA']].itertuples(index=False)]
+
+
+@pytest.mark.parametrize('nota_expedicao, nota_csv, esperado', [
+    ('123456', '123457', 'dígito trocado'),
+    ('123456', '124356', 'dígitos invertidos'),
+    ('1234567', '123467', 'dígito a mais na expedição'),
+    ('123467', '1234567', 'dígito a menos na expedição'),
+    ('1123', '123', 'dígito a mais na expedição'),
+    ('123456', '654321', None),
+    ('123456', '123465', 'dígitos invertidos'),
+    ('123456', '132465', None),
+    ('1234', '123456', None),
+])
+def test_classificar_diferenca_nota(averiguar, nota_expedicao, nota_csv, esperado):
+    assert averiguar.classificar_diferenca_nota(nota_expedicao, nota_csv) == esperado
+
+
+def test_chaves_remocao_sem_repeticao_para_digitos_repetidos(averiguar):
+    chaves = averiguar.chaves_remocao(['1123'])
+    assert sorted(chaves['CHAVE']) == ['112', '1123', '113', '123']
+    assert not chaves.duplicated().any()
+
+
+@pytest.mark.parametrize('nota_expedicao, nota_csv, diferenca', [
+    ('11234', '1234', 'dígito a mais na expedição'),
+    ('1234', '11234', 'dígito a menos na expedição'),
+    ('112345', '112355', 'dígito trocado'),
+    ('112345', '121345', 'dígitos invertidos'),
+])
+def test_candidatos_com_digitos_repetidos(averiguar, nota_expedicao, nota_csv, diferenca):
+    pares = aproximar(averiguar, [(nota_expedicao, '100', '1000')], [(nota_csv, '100', '1000')])
+    assert pares == [(nota_expedicao, nota_csv, diferenca)]
+
+
+def test_notas_curtas_ficam_de_fora(averiguar):
+    assert averiguar.MIN_DIGITOS_APROXIMACAO == 4
+    assert aproximar(averiguar, [('123', '100', '1000')], [('124', '100', '1000')]) == []
+    assert aproximar(averiguar, [('1234', '100', '1000')], [('1235', '100', '1000')]) == [('1234', '1235', 'dígito trocado')]
+
+
+def test_sem_concordancia_de_valores_nao_ha_par(averiguar):
+    assert aproximar(averiguar, [('123456', '100', '1000')], [('123457', '500', '5000')]) == []
+
+
+def test_ordem_e_limite_de_candidatos(averiguar):
+    csv = [
+        ('123450', '100,5', '2000'),   # peso a 1%: 1 ponto
+        ('123459', '100', '2000'),     # peso exato: 2 pontos
+        ('123458', '100,5', '1000'),   # total exato e peso a 1%: 3 pontos
+        ('1234567', '100', '1000'),    # os dois exatos: 4 pontos
+        ('123457', '100', '1000'),     # os dois exatos: 4 pontos
+        ('123451', '500', '5000'),     # nenhum valor bate
+    ]
+    pares = aproximar(averiguar, [('123456', '100', '1000')], csv)
+    assert averiguar.MAX_CANDIDATOS_APROXIMACAO == 3
+    assert [nota_csv for _, nota_csv, _ in pares] == ['123457', '1234567', '123458']
+    
+    df_pares = averiguar.aproximar_notas_fiscais(*conferencia(averiguar, [('123456', '100', '1000')], csv))
+    assert df_pares['CONFIANCA'].tolist() == ['alta', 'alta', 'média']
+
+
+def test_nota_do_csv_em_varias_linhas_usa_os_totais(averiguar):
+    csv = [('123457', '60,0', '600,00'), ('123457', '40,0', '400,00')]
+    df_pares = averiguar.aproximar_notas_fiscais(*conferencia(averiguar, [('123456', '100', '1000')], csv))
+    assert df_pares[['PESO_CSV', 'TOTAL_CSV', 'CONFIANCA']].values.tolist() == [[100.0, 1000.0, 'alta']]
+    assert df_pares['DIFERENCA'].tolist() == ['dígito trocado']
+
+
+def test_notas_com_par_nao_sao_aproximadas(averiguar):
+    pares = aproximar(averiguar, [('123456', '100', '1000'), ('223456', '50', '500')],
+                      [('123456', '100', '1000'), ('223457', '50', '500')])
+    assert pares == [('223456', '223457', 'dígito trocado')]
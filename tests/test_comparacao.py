@@ -0,0 +1,83 @@
+"""
+O cruzamento da expedição com o CSV agrupado deve dar o mesmo resultado dos
+dois merges à esquerda do script original, sem multiplicar as NFs repetidas
+"""
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+# NF, VOG, R$ NF, OPERAÇÃO; 300 e 100 repetidas (VOG e VOG 2ºSAIDA)
+EXPEDICAO = [
+    ('300', '10', '100', 'VOG'),
+    ('100', '5', '50', 'VOG'),
+    ('300', '7', '70', 'VOG 2ºSAIDA'),
+    ('999', '1', '1', 'VOG'),
+    ('100', '5', '50', 'VOG 2ºSAIDA'),
+    ('300', '3', '30', 'VOG'),
+    ('20', '2', '20', 'VOG'),
+]
+# NOTA FISCAL, PESO, TOTAL
+CSV = [
+    ('4444', '1', '1'),
+    ('300', '12', '120'),
+    ('300', '8', '80'),
+    ('100', '10', '100'),
+    ('555', '3', '3'),
+    ('20', '2', '20'),
+    ('10', '9', '9'),
+]
+
+
+def montar(averiguar, nota_longa):
+    """
+    Expedição filtrada e CSV agrupado; com nota_longa uma NF longa demais
+    para a chave inteira entra dos dois lados e o cruzamento é pelo texto
+    """
+    expedicao, csv = list(EXPEDICAO), list(CSV)
+    if nota_longa:
+        expedicao.insert(1, (nota_longa, '4', '40', 'VOG'))
+        csv.insert(0, (nota_longa, '4', '40'))
+    df_expedicao = pd.DataFrame(expedicao, columns=['NF', 'VOG', 'R$ NF', 'OPERAÇÃO']).assign(
+        STATUS='ENTREGUE', DATA=datetime(2025, 11, 3)
+    )
+    df_linhas = averiguar.preparar_linhas_csv(
+        pd.DataFrame(csv, columns=['NOTA FISCAL', 'PESO', 'TOTAL']).assign(DATA='04/11/2025')
+    )
+    return averiguar.filtrar_expedicao(df_expedicao), averiguar.agrupar_por_nota_fiscal(df_linhas)
+
+
+@pytest.mark.parametrize('nota_longa', [None, '1' * 20], ids=['chave_inteira', 'chave_texto'])
+def test_cruzamento_igual_aos_merges_originais(averiguar, nota_longa):
+    df_expedicao, df_agrupado = montar(averiguar, nota_longa)
+    assert ('NF_CHAVE' in df_agrupado.columns) == (nota_longa is None)
+    df_comparacao, so_csv = averiguar.comparar_expedicao_csv(df_expedicao, df_agrupado)
+    
+    agrupado = df_agrupado.drop(columns='NF_CHAVE', errors='ignore')
+    esperado = pd.merge(df_expedicao, agrupado, left_on='NF', right_on='NOTA FISCAL', how='left', indicator=True)
+    obtido = df_comparacao[esperado.columns].drop(columns='_merge')
+    pd.testing.assert_frame_equal(obtido, esperado.drop(columns='_merge'), check_dtype=False)
+    assert df_comparacao['_merge'].astype(str).tolist() == esperado['_merge'].astype(str).tolist()
+    
+    reverso = pd.merge(agrupado, df_expedicao, left_on='NOTA FISCAL', right_on='NF', how='left', indicator=True)
+    esperado_so_csv = reverso.loc[reverso['_merge'] == 'left_only', 'NOTA FISCAL'].tolist()
+    assert so_csv['NOTA FISCAL'].tolist() == esperado_so_csv == sorted(esperado_so_csv)
+    assert so_csv.columns.tolist() == df_agrupado.columns.tolist()
+
+
+def test_nfs_repetidas_ficam_em_linhas_separadas(averiguar):
+    df_expedicao, df_agrupado = montar(averiguar, None)
+    df_comparacao, so_csv = averiguar.comparar_expedicao_csv(df_expedicao, df_agrupado)
+    
+    assert df_comparacao['NF'].tolist() == ['300', '100', '300', '999', '100', '300', '20']
+    assert df_comparacao['OPERAÇÃO'].tolist() == [operacao for *_, operacao in EXPEDICAO]
+    assert df_comparacao['LINHAS_NF'].tolist() == [3, 2, 3, 1, 2, 3, 1]
+    # Cada linha repetida leva o total da nota no CSV
+    assert df_comparacao['PESO_COMPARACAO'].tolist()[:3] == [20.0, 10.0, 20.0]
+    
+    marcas, *_ = averiguar.marcar_divergencias(df_comparacao)
+    assert marcas['nf_repetida_expedicao'].tolist() == [True, True, True, False, True, True, False]
+    assert marcas['nf_nao_encontrada'].tolist() == [False, False, False, True, False, False, False]
+    
+    _, df_problemas = averiguar.detectar_divergencias(df_comparacao, so_csv)
+    assert (df_problemas['TIPO'] == 'nf_repetida_expedicao').sum() == 5
@@ -0,0 +1,88 @@
+"""
+Conferência incremental: a situação de cada divergência entre execuções e o
+mesmo conjunto de divergências em aberto da conferência completa
+"""
+import os
+from datetime import datetime
+
+import pandas as pd
+from openpyxl import Workbook
+
+CABECALHO_CSV = 'NF-E;QTDE REAL;FAT BRUTO;DATA;HISTÓRICO'
+CSV = ['1001;10;100;03/11/2025;51', '1002;25;200;03/11/2025;51', '1004;40;400;04/11/2025;51', '2001;5;50;04/11/2025;51']
+
+
+def gravar_expedicao(caminho, linhas, segundos):
+    """
+    Planilha de expedição com o cabeçalho na linha 4 e as linhas (NF, VOG, R$ NF);
+    segundos avança a data de modificação para a mudança ser percebida
+    """
+    livro = Workbook()
+    planilha = livro.active
+    planilha.title = 'EXPEDICAO'
+    for coluna, nome in enumerate(['OBS', 'NF', 'VOG', 'R$ NF', 'STATUS', 'DATA', 'OPERAÇÃO'], start=1):
+        planilha.cell(row=4, column=coluna, value=nome)
+    for numero, (nf, vog, valor) in enumerate(linhas, start=5):
+        for coluna, conteudo in enumerate([None, nf, vog, valor, 'ENTREGUE', datetime(2025, 11, 3), 'VOG'], start=1):
+            planilha.cell(row=numero, column=coluna, value=conteudo)
+    livro.save(caminho)
+    os.utime(caminho, (segundos, segundos))
+
+
+def conferir(averiguar, caminho_expedicao, caminho_csv, pasta, incremental):
+    return averiguar.reconciliar(
+        str(caminho_expedicao), str(caminho_csv), caminho_relatorio=str(pasta), incremental=incremental
+    )
+
+
+def situacoes(resultado):
+    relatorio = resultado['relatorio']
+    return list(zip(relatorio['NF'].tolist(), relatorio['SITUACAO'].tolist()))
+
+
+def conferir_com_completa(averiguar, caminho_expedicao, caminho_csv, pasta):
+    """
+    Roda a incremental e a completa e confere que as divergências em aberto batem
+    """
+    incremental = conferir(averiguar, caminho_expedicao, caminho_csv, pasta, True)
+    completa = conferir(averiguar, caminho_expedicao, caminho_csv, pasta, False)
+    relatorio = incremental['relatorio']
+    em_aberto = relatorio[relatorio['SITUACAO'] != 'RESOLVIDA'].drop(columns='SITUACAO').reset_index(drop=True)
+    pd.testing.assert_frame_equal(em_aberto, completa['relatorio'], check_dtype=False)
+    pd.testing.assert_frame_equal(incremental['problemas'], completa['problemas'], check_dtype=False)
+    return incremental
+
+
+def test_situacao_das_divergencias_entre_execucoes(averiguar, tmp_path):
+    caminho_csv = tmp_path / 'fechamento.csv'
+    caminho_csv.write_text('\n'.join([CABECALHO_CSV, *CSV]) + '\n', encoding='utf-8')
+    caminho_expedicao = tmp_path / 'expedicao.xlsx'
+    
+    # 1002 com peso divergente, 1003 fora do CSV, 1006 repetida e fora do CSV
+    # (as duas linhas são identificadas pela ocorrência) e 2001 só no CSV
+    gravar_expedicao(
+        caminho_expedicao,
+        [(1001, 10, 100), (1002, 20, 200), (1006, 60, 600), (1003, 30, 300), (1006, 61, 610), (1004, 40, 400)],
+        1_700_000_000
+    )
+    primeira = conferir_com_completa(averiguar, caminho_expedicao, caminho_csv, tmp_path)
+    assert situacoes(primeira) == [(1002, 'NOVA'), (1006, 'NOVA'), (1003, 'NOVA'), (1006, 'NOVA'), (2001, 'NOVA')]
+    
+    # 1002 corrigida, 1004 passa a divergir e 1005 é nova
+    gravar_expedicao(
+        caminho_expedicao,
+        [(1001, 10, 100), (1002, 25, 200), (1006, 60, 600), (1003, 30, 300), (1006, 61, 610), (1004, 41, 400), (1005, 50, 500)],
+        1_700_000_100
+    )
+    segunda = conferir_com_completa(averiguar, caminho_expedicao, caminho_csv, tmp_path)
+    assert situacoes(segunda) == [
+        (1006, 'EM ABERTO'), (1003, 'EM ABERTO'), (1006, 'EM ABERTO'), (1004, 'NOVA'), (1005, 'NOVA'),
+        (2001, 'EM ABERTO'), (1002, 'RESOLVIDA')
+    ]
+    assert segunda['relatorio']['SITUACAO'].value_counts().to_dict() == {'EM ABERTO': 4, 'NOVA': 2, 'RESOLVIDA': 1}
+    assert segunda['variacao']['resolvidas'] == 1
+    
+    # Sem mudanças nada é reavaliado e tudo continua em aberto
+    terceira = conferir_com_completa(averiguar, caminho_expedicao, caminho_csv, tmp_path)
+    assert {situacao for _, situacao in situacoes(terceira)} == {'EM ABERTO'}
+    assert terceira['variacao']['reavaliadas'] == 0
@@ -0,0 +1,55 @@
+"""
+A leitura em blocos (padrão) deve dar as mesmas linhas que a leitura do CSV
+inteiro, que segue a inferência de tipos do pandas como o script original
+"""
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+CABECALHO = 'NF-E;QTDE REAL;FAT BRUTO;DATA;HISTÓRICO'
+
+CASOS = {
+    'nf_com_zeros': ['000123456;10;100;03/11/2025;51', '000654321;5;50;04/11/2025;51'],
+    'nf_com_vazio': ['000123456;10;100;03/11/2025;51', ';7;8;03/11/2025;51', '1234560;5;50;04/11/2025;51'],
+    'nf_texto': ['000123456;10;100;03/11/2025;51', 'NF 77;5;50;04/11/2025;51'],
+    'valores_inteiros_grandes': ['123456;1234567;12345678;03/11/2025;51', '654321;3;4;04/11/2025;51'],
+    'valores_com_ponto': ['123456;12.50;1000.5;03/11/2025;51', '654321;150000.5;2.675;04/11/2025;51'],
+    'valores_brasileiros': ['123456;1.234,56;R$ 1.500.000,00;03/11/2025;51', '654321;12,5;10;04/11/2025;51'],
+    'valores_com_vazio': ['123456;10;;03/11/2025;51', '654321;;50;04/11/2025;51', '111111;1234567;9;04/11/2025;51'],
+    'historico_filtrado': ['000123456;10;100;03/11/2025;52', '654321;5;50;04/11/2025;51', ';1;1;04/11/2025;52'],
+}
+
+
+def gravar_csv(pasta, nome, linhas):
+    caminho = pasta / f'{nome}.csv'
+    caminho.write_text('\n'.join([CABECALHO, *linhas]) + '\n', encoding='utf-8')
+    return str(caminho)
+
+
+def ler(averiguar, caminho, tamanho_bloco, data_inicio=None, data_fim=None):
+    df = averiguar.ler_csv_com_cabecalho(caminho, data_inicio, data_fim, tamanho_bloco=tamanho_bloco)
+    return averiguar.preparar_linhas_csv(df).reset_index(drop=True)
+
+
+@pytest.mark.parametrize('nome', list(CASOS))
+@pytest.mark.parametrize('tamanho_bloco', [1, 2, 1000])
+def test_blocos_igual_a_leitura_inteira(averiguar, tmp_path, nome, tamanho_bloco):
+    caminho = gravar_csv(tmp_path, nome, CASOS[nome])
+    inteiro = ler(averiguar, caminho, None)
+    em_blocos = ler(averiguar, caminho, tamanho_bloco)
+    pd.testing.assert_frame_equal(em_blocos, inteiro, check_dtype=False)
+
+
+def test_blocos_com_periodo(averiguar, tmp_path):
+    caminho = gravar_csv(tmp_path, 'periodo', CASOS['nf_com_vazio'] + ['000999999;3;3;10/11/2025;51'])
+    periodo = (datetime(2025, 11, 3), datetime(2025, 11, 4))
+    inteiro = ler(averiguar, caminho, None, *periodo)
+    em_blocos = ler(averiguar, caminho, 1, *periodo)
+    pd.testing.assert_frame_equal(em_blocos, inteiro, check_dtype=False)
+
+
+def test_nf_com_zeros_a_esquerda_casa_com_a_expedicao(averiguar, tmp_path):
+    caminho = gravar_csv(tmp_path, 'zeros', CASOS['nf_com_zeros'])
+    linhas = ler(averiguar, caminho, averiguar.TAMANHO_BLOCO_CSV)
+    assert linhas['NOTA FISCAL'].tolist() == ['123456', '654321']
@@ -0,0 +1,84 @@
+"""
+Teste diferencial: as versões colunares da limpeza de valores devem dar,
+bit a bit, o mesmo resultado das funções escalares originais
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+VALORES_FIXOS = [
+    None, np.nan, '', ' ', '-', ',', '.', 'R$', 'R$ -5', '--5', '- 5', '-R$ 1.234,56',
+    'R$ 1.500.000,00', '-1.500.000,00', '1.234.567', '1.234,5', '1,234,56', '1.234,56,78',
+    '12,', ',5', '5,3', '0,00', '-0', '1e5', '1e-05', 'inf', 'nan', '1_000', '12 kg', '\t7,5\n',
+    '٣,5', '²', 'abc', True, 0, -0.0, 7, -12, 1234567.0, 1e16, 1e-05, 0.1 + 0.2, 150000.5,
+    np.float64(2.675), np.int64(1000001), pd.NaT, '99999,99', '100000,01', '1000000,01',
+    '1,234.5', '12,345.67', '1,2.3', '1.234,5.6', '-1,2.3', 'R$ 1,234.56', '1,.5', '1.,5',
+]
+
+
+def gerar_valores(quantidade=20000, semente=0):
+    """
+    Valores no estilo das planilhas: R$, milhar, vírgulas repetidas, formato
+    americano, sinais e lixo
+    """
+    rng = np.random.default_rng(semente)
+    inteiros = rng.integers(0, 10 ** rng.integers(1, 9, quantidade))
+    centavos = rng.integers(0, 100, quantidade)
+    valores = []
+    for inteiro, centavo, estilo in zip(inteiros, centavos, rng.integers(0, 11, quantidade)):
+        milhar = f'{inteiro:,}'.replace(',', '.')
+        if estilo == 0:
+            texto = f'{milhar},{centavo:02d}'
+        elif estilo == 1:
+            texto = f'R$ {milhar},{centavo:02d}'
+        elif estilo == 2:
+            texto = f'-{milhar},{centavo % 10}'
+        elif estilo == 3:
+            texto = f'{inteiro}.{centavo:02d}'
+        elif estilo == 4:
+            texto = f'{inteiro:,},{centavo:02d}'
+        elif estilo == 5:
+            texto = milhar
+        elif estilo == 6:
+            texto = float(f'{inteiro}.{centavo:02d}')
+        elif estilo == 7:
+            texto = f' - R$ {milhar},{centavo:02d} '
+        elif estilo == 8:
+            texto = f'{milhar},{centavo:02d},{centavo % 7}'
+        elif estilo == 9:
+            texto = f'{inteiro:,}.{centavo:02d}'
+        else:
+            texto = int(inteiro) * (-1 if centavo % 2 else 1)
+        valores.append(texto)
+    return VALORES_FIXOS + valores
+
+
+@pytest.fixture(scope='module')
+def objetos():
+    valores = gerar_valores()
+    objetos = np.empty(len(valores), dtype=object)
+    objetos[:] = valores
+    return objetos
+
+
+@pytest.mark.parametrize('funcao_escalar, funcao_vetorizada', [
+    ('limpar_valor_monetario', 'limpar_serie_monetaria'),
+    ('limpar_valor_numerico', 'limpar_serie_numerica'),
+])
+@pytest.mark.parametrize('como_serie', [True, False], ids=['series', 'array'])
+def test_limpeza_vetorizada_igual_a_escalar(averiguar, objetos, funcao_escalar, funcao_vetorizada, como_serie):
+    escalar = getattr(averiguar, funcao_escalar)
+    esperado = np.array([escalar(valor) for valor in objetos], dtype=np.float64)
+    entrada = pd.Series(objetos) if como_serie else objetos
+    obtido = np.asarray(getattr(averiguar, funcao_vetorizada)(entrada), dtype=np.float64)
+    
+    diferentes = np.flatnonzero(esperado.view(np.int64) != obtido.view(np.int64))
+    assert not len(diferentes), [(objetos[i], esperado[i], obtido[i]) for i in diferentes[:10]]
+
+
+def test_limpeza_vetorizada_preserva_indice(averiguar):
+    valores = pd.Series(['1.234,56', None, 'R$ 10'], index=[5, 7, 9], name='TOTAL')
+    resultado = averiguar.limpar_serie_monetaria(valores)
+    assert resultado.index.tolist() == [5, 7, 9]
+    assert resultado.name == 'TOTAL'
+    assert resultado.tolist() == [1234.56, 0.0, 10.0]
@@ -0,0 +1,69 @@
+"""
+O leitor próprio da aba deve dar o mesmo DataFrame do pd.read_excel
+"""
+import io
+from datetime import datetime
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+COLUNAS = ['NF', 'VOG', 'R$ NF', 'STATUS', 'DATA', 'OPERAÇÃO']
+
+
+def montar_planilha(linhas_dados, aba='EXPEDICAO'):
+    """
+    Planilha com o cabeçalho na linha 4 e as linhas {numero: valores}
+    """
+    livro = Workbook()
+    planilha = livro.active
+    planilha.title = aba
+    planilha['A1'] = 'CONTROLE DE EXPEDIÇÃO'
+    for coluna, nome in enumerate(['OBS', *COLUNAS], start=1):
+        planilha.cell(row=4, column=coluna, value=nome)
+    for numero, valores in linhas_dados.items():
+        for coluna, valor in enumerate(valores, start=1):
+            planilha.cell(row=numero, column=coluna, value=valor)
+    # Região formatada e vazia no fim, como nas planilhas reais
+    for numero in range(max(linhas_dados) + 1, max(linhas_dados) + 50):
+        planilha.cell(row=numero, column=2).number_format = '0.00'
+    arquivo = io.BytesIO()
+    livro.save(arquivo)
+    return arquivo.getvalue()
+
+
+def linha(nf, dia):
+    return [None, nf, '1.234,5', 100.25, 'ENTREGUE', datetime(2025, 11, dia), 'VOG']
+
+
+def ler_pandas(dados, aba='EXPEDICAO'):
+    return pd.read_excel(io.BytesIO(dados), sheet_name=aba, header=3, usecols=COLUNAS, dtype={'NF': str})
+
+
+def test_le_dados_depois_de_um_intervalo_grande_de_linhas_vazias(averiguar):
+    dados = montar_planilha({5: linha(123456, 3), 6: linha(123457, 4), 3500: linha(654321, 5)})
+    lido = averiguar.ler_aba_xlsx(dados, 'EXPEDICAO', 3, COLUNAS, dtype={'NF': str})
+    assert lido['NF'].dropna().tolist() == ['123456', '123457', '654321']
+    pd.testing.assert_frame_equal(lido, ler_pandas(dados))
+
+
+def test_filtros_equivalem_a_isin(averiguar):
+    linhas = {5: linha(1, 3), 7: linha(2, 4), 2000: linha(3, 5)}
+    linhas[7][4] = 'CANCELADA'
+    dados = montar_planilha(linhas)
+    filtros = {'STATUS': ['ENTREGUE']}
+    lido = averiguar.ler_aba_xlsx(dados, 'EXPEDICAO', 3, COLUNAS, dtype={'NF': str}, filtros=filtros)
+    esperado = ler_pandas(dados)
+    esperado = esperado[esperado['STATUS'].isin(filtros['STATUS'])].reset_index(drop=True)
+    pd.testing.assert_frame_equal(lido, esperado)
+
+
+def test_versao_nao_testada_do_openpyxl_usa_o_read_excel(averiguar, monkeypatch):
+    dados = montar_planilha({5: linha(123456, 3), 1500: linha(654321, 5)})
+    monkeypatch.setattr(averiguar, 'LEITOR_RAPIDO_DISPONIVEL', False)
+    with pytest.raises(RuntimeError):
+        averiguar.ler_aba_xlsx(dados, 'EXPEDICAO', 3, COLUNAS)
+    pd.testing.assert_frame_equal(averiguar._converter_planilha_expedicao(dados, 'EXPEDICAO'), ler_pandas(dados))
+    
+    abas = averiguar.listar_abas_expedicao(dados)
+    assert [(aba['aba'], aba['cabecalho'], aba['crc']) for aba in abas] == [('EXPEDICAO', True, None)]
@@ -0,0 +1,29 @@
+"""
+O modo vigia aumenta o limite só do seu próprio cache em memória
+"""
+
+
+def test_vigia_nao_altera_o_cache_em_memoria_global(averiguar, monkeypatch, tmp_path):
+    expedicao = tmp_path / 'expedicao.xlsx'
+    expedicao.write_bytes(b'')
+    pasta_csv = tmp_path / 'csv'
+    pasta_csv.mkdir()
+    for numero in range(12):
+        (pasta_csv / f'fechamento-{numero}.csv').write_text('')
+    
+    global_antes = averiguar._CACHE_MEMORIA
+    limite_antes = global_antes['limite']
+    limites = []
+    
+    def reconciliar(*args, **kwargs):
+        limites.append(averiguar._CACHE_MEMORIA['limite'])
+        assert averiguar._CACHE_MEMORIA is not global_antes
+        return {}
+    
+    monkeypatch.setattr(averiguar, 'reconciliar', reconciliar)
+    execucoes = averiguar.vigiar(str(expedicao), [str(pasta_csv)], intervalo=0, espera=0, max_execucoes=1)
+    
+    assert execucoes == 1
+    assert limites[0] >= 2 * 13
+    assert averiguar._CACHE_MEMORIA is global_antes
+    assert averiguar._CACHE_MEMORIA['limite'] == limite_antes